@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 
 import os
 import importlib.util
+import tempfile
 import dj_database_url
 from pathlib import Path
 
@@ -57,7 +58,7 @@ SESSION_COOKIE_SECURE = False  # Set to True in production
 # Application definition
 
 INSTALLED_APPS = [
-    'django.contrib.admin',
+    'core.apps.CoreAdminConfig',  # django.contrib.admin with the profiler pages
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
@@ -128,18 +129,74 @@ SOCIALACCOUNT_PROVIDERS = {
 }
 
 MIDDLEWARE = [
+    'core.middleware.ServerTimingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'core.middleware.StaticFilesMiddleware',
+    'core.middleware.CompressionMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
+    'core.middleware.SlowQueryLogMiddleware',
+    'core.middleware.HttpCachePolicyMiddleware',
+    'core.middleware.PreloadMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.ProfilerMiddleware',
+    'core.middleware.ReplicaPinningMiddleware',
     'allauth.account.middleware.AccountMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Response compression for dynamic responses (WhiteNoise handles static files).
+# Gzip goes through Django's GZipMiddleware (BREACH padding); HTML is never brotli-compressed
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '512'))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', '4'))
+COMPRESSION_CONTENT_TYPES = [
+    'text/*',
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+]
+
+# Link: rel=preload headers from {% preload %}, also sent as 103 Early Hints
+# when the server provides wsgi.early_hints (gunicorn 25+)
+EARLY_HINTS_ENABLED = os.environ.get('EARLY_HINTS_ENABLED', 'True') == 'True'
+
+# Per-request query budget / N+1 detector (opt-in, sampled)
+QUERY_BUDGET_ENABLED = os.environ.get('QUERY_BUDGET_ENABLED', 'False') == 'True'
+QUERY_BUDGET_SAMPLE_RATE = float(os.environ.get('QUERY_BUDGET_SAMPLE_RATE', '0.05'))
+QUERY_BUDGET_DEFAULT = int(os.environ.get('QUERY_BUDGET_DEFAULT', '50'))
+QUERY_BUDGET_REPEAT_THRESHOLD = int(os.environ.get('QUERY_BUDGET_REPEAT_THRESHOLD', '5'))
+QUERY_BUDGETS = {
+    'api_current_user': 5,
+    'api_kindlewick_progress': 5,
+    'api_kindlewick_sessions': 5,
+    'api_kindlewick_session_detail': 8,
+    'api_kindlewick_teacher_progress': 5,
+    'api_kindlewick_teacher_sessions': 5,
+    'api_kindlewick_school_admin_progress': 5,
+    'api_kindlewick_school_admin_sessions': 5,
+}
+
+# Slow query log with EXPLAIN capture (browse under Admin > Slow Queries)
+SLOW_QUERY_LOG_ENABLED = os.environ.get('SLOW_QUERY_LOG_ENABLED', 'False') == 'True'
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', '200'))
+SLOW_QUERY_EXPLAIN_ANALYZE_RATE = float(os.environ.get('SLOW_QUERY_EXPLAIN_ANALYZE_RATE', '0.0'))
+SLOW_QUERY_LOG_MAX_ROWS = int(os.environ.get('SLOW_QUERY_LOG_MAX_ROWS', '1000'))
+
+# Server-Timing header (db/cache/template/serialize/total) for staff users
+SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING_ENABLED', 'False') == 'True'
+
+# On-demand request profiler for superusers (X-Profile header or ?__profile=1)
+PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', 'True') == 'True'
+PROFILER_HEADER = 'X-Profile'
+PROFILER_QUERY_PARAM = '__profile'
+PROFILER_DIR = Path(os.environ.get('PROFILER_DIR', BASE_DIR / 'profiles'))
+PROFILER_MAX_FILES = int(os.environ.get('PROFILER_MAX_FILES', '50'))
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
 ]
@@ -148,10 +205,18 @@ ROOT_URLCONF = 'backend.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.timing.TimedDjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Always cached (templates are re-read on change by the dev server's
+            # autoreloader); core.E001 fails the system check in production
+            # if this is ever removed
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -163,8 +228,121 @@ TEMPLATES = [
     },
 ]
 
+# Optional Jinja2 engine (core.jinja2_env) for the hottest list and dashboard
+# templates. Only the names listed here are rendered with Jinja2, e.g.
+# JINJA2_TEMPLATES=core/school_admin_staff.html,core/teacher_resources_list.html
+JINJA2_TEMPLATES = [name for name in os.environ.get('JINJA2_TEMPLATES', '').split(',') if name]
+if importlib.util.find_spec('jinja2'):
+    TEMPLATES.insert(0, {
+        'BACKEND': 'core.jinja2_env.SelectiveJinja2',
+        'NAME': 'jinja2',
+        'DIRS': [],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'environment': 'core.jinja2_env.environment',
+            'context_processors': TEMPLATES[0]['OPTIONS']['context_processors'],
+        },
+    })
+
 WSGI_APPLICATION = 'backend.wsgi.application'
 
+# Compile every core template when a worker boots (backend/wsgi.py)
+TEMPLATE_WARMUP = os.environ.get('TEMPLATE_WARMUP', str(not DEBUG)) == 'True'
+
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.timing.TimedJSONRenderer',
+        'core.timing.TimedBrowsableAPIRenderer',
+    ],
+}
+
+# Two-tier cache: a small per-process LRU (core.cache.TwoTierCache) in front
+# of a backend shared by every worker. Redis when REDIS_URL is set, otherwise
+# a file-based cache on local disk.
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    SHARED_CACHE = {
+        'BACKEND': 'core.timing.TimedRedisCache',
+        'LOCATION': REDIS_URL,
+    }
+else:
+    SHARED_CACHE = {
+        'BACKEND': 'core.timing.TimedFileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', os.path.join(tempfile.gettempdir(), 'inq-ed-cache')),
+    }
+
+CACHES = {
+    'default': {
+        'BACKEND': 'core.timing.TimedTwoTierCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'LOCAL_MAX_ENTRIES': int(os.environ.get('CACHE_LOCAL_MAX_ENTRIES', '1000')),
+            # Upper bound on how long a worker can serve a value another worker changed
+            'LOCAL_TIMEOUT': int(os.environ.get('CACHE_LOCAL_TIMEOUT', '5')),
+        },
+    },
+    'shared': SHARED_CACHE,
+}
+
+# Analytics pages are served from cache for ANALYTICS_CACHE_SOFT_TTL seconds,
+# then re-rendered in the background while the stale copy is still served, up
+# to ANALYTICS_CACHE_HARD_TTL (see core.cache.stale_while_revalidate). Its
+# render lock only excludes other workers on Redis; with the file-based cache
+# two workers may occasionally re-render the same page.
+ANALYTICS_CACHE_SOFT_TTL = int(os.environ.get('ANALYTICS_CACHE_SOFT_TTL', '120'))
+ANALYTICS_CACHE_HARD_TTL = int(os.environ.get('ANALYTICS_CACHE_HARD_TTL', '900'))
+
+# Full-page cache lifetimes (seconds) for anonymous visitors, by URL name
+# (see core.cache.cache_anonymous_page). Purge or warm with `manage.py page_cache`.
+ANONYMOUS_PAGE_CACHE_TTLS = {
+    'home': 600,
+    'about': 3600,
+    'pricing': 900,
+    'kindlewick': 3600,
+    'questopia': 3600,
+    'wonderworld': 3600,
+    'teacher_hub': 1800,
+    'contact': 3600,
+}
+
+# HTTP caching for edge caches/reverse proxies (core.middleware.HttpCachePolicyMiddleware).
+# Policies are patch_cache_control() arguments; anonymous_only (default True)
+# makes the response public only for visitors without a session cookie.
+HTTP_CACHE_POLICIES = {
+    'public-page': {'public': True, 'max_age': 300, 's_maxage': 3600, 'stale_while_revalidate': 60},
+    'published-content': {'public': True, 'max_age': 60, 's_maxage': 600, 'stale_while_revalidate': 60},
+    'media': {'public': True, 'max_age': 86400, 's_maxage': 604800, 'anonymous_only': False},
+    # Uploads addressed by content hash (DeduplicatedStorage.url) never change
+    'media-blob': {'public': True, 'max_age': 31536000, 'immutable': True, 'anonymous_only': False},
+}
+HTTP_CACHE_URL_POLICIES = {
+    'home': 'public-page',
+    'about': 'public-page',
+    'pricing': 'public-page',
+    'kindlewick': 'public-page',
+    'questopia': 'public-page',
+    'wonderworld': 'public-page',
+    'teacher_hub': 'public-page',
+    'contact': 'public-page',
+    'teacher_news_detail': 'published-content',
+    'teacher_help_detail': 'published-content',
+    'teacher_resource_detail': 'published-content',
+    'media': 'media',
+    'media_blob': 'media-blob',
+}
+# Edge purges on content save: core.http_cache.LoggingPurger only logs;
+# core.http_cache.HttpPurger sends PURGE with a Surrogate-Key header
+SURROGATE_PURGE_URL = os.environ.get('SURROGATE_PURGE_URL')
+SURROGATE_PURGE_TOKEN = os.environ.get('SURROGATE_PURGE_TOKEN')
+SURROGATE_PURGER = 'core.http_cache.HttpPurger' if SURROGATE_PURGE_URL else 'core.http_cache.LoggingPurger'
+
+# How often each process adds its cache hit/miss counts to the shared totals
+CACHE_STATS_FLUSH_INTERVAL = 10
+
+# Runs the suite against a process-local shared cache, so test runs neither see
+# nor disturb the on-disk or Redis cache
+TEST_RUNNER = 'core.test_runner.IsolatedCacheTestRunner'
+
 
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
@@ -187,6 +365,72 @@ DATABASES = {
     )
 }
 
+# Optional read replica for read-only analytics and feed views (see
+# core.replicas.use_replica). Tests read it through the default database.
+DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+DATABASE_REPLICA_ALIAS = 'replica'
+if DATABASE_REPLICA_URL:
+    DATABASES[DATABASE_REPLICA_ALIAS] = dj_database_url.parse(DATABASE_REPLICA_URL, conn_max_age=600, ssl_require=False)
+    DATABASES[DATABASE_REPLICA_ALIAS]['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', '10'))
+REPLICA_HEALTH_CHECK_INTERVAL = float(os.environ.get('REPLICA_HEALTH_CHECK_INTERVAL', '5'))
+REPLICA_PIN_COOKIE = 'db_pin'
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', '15'))
+
+# Connection pooling (psycopg 3). Each gunicorn worker process has its own
+# pool, so the pool size is derived from WEB_CONCURRENCY and GUNICORN_THREADS
+# to keep workers x pool size within DATABASE_MAX_CONNECTIONS.
+DATABASE_POOL = os.environ.get('DATABASE_POOL', 'False') == 'True'
+DATABASE_POOL_STATS_INTERVAL = float(os.environ.get('DATABASE_POOL_STATS_INTERVAL', '60'))
+DATABASE_POOL_SLOW_WAIT_MS = float(os.environ.get('DATABASE_POOL_SLOW_WAIT_MS', '100'))
+
+
+def database_pool_options(max_connections=None):
+    web_workers = int(os.environ.get('WEB_CONCURRENCY', '2'))
+    web_threads = int(os.environ.get('GUNICORN_THREADS', '1'))
+    max_connections = max_connections or int(os.environ.get('DATABASE_MAX_CONNECTIONS', '20'))
+    max_size = int(os.environ.get('DATABASE_POOL_MAX_SIZE', max(min(web_threads, max_connections // web_workers), 1)))
+    return {
+        'min_size': min(int(os.environ.get('DATABASE_POOL_MIN_SIZE', '1')), max_size),
+        'max_size': max_size,
+        'timeout': float(os.environ.get('DATABASE_POOL_TIMEOUT', '10')),
+        'max_idle': float(os.environ.get('DATABASE_POOL_MAX_IDLE', '300')),
+        'max_lifetime': float(os.environ.get('DATABASE_POOL_MAX_LIFETIME', '3600')),
+    }
+
+
+if DATABASE_POOL:
+    for database in DATABASES.values():
+        if database['ENGINE'] != 'django.db.backends.postgresql':
+            continue
+        database.update({
+            'ENGINE': 'core.db.backends.postgresql',
+            'CONN_MAX_AGE': 0,  # The pool replaces persistent connections
+            'CONN_HEALTH_CHECKS': True,  # Pool checks connections before handing them out
+        })
+        database.setdefault('OPTIONS', {})['pool'] = database_pool_options()
+
+
+# Logging
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'core.performance': {
+            'handlers': ['console'],
+            'level': os.environ.get('PERFORMANCE_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -228,12 +472,52 @@ STATICFILES_DIRS = [
     BASE_DIR / 'core/static',
 ]
 
-# WhiteNoise configuration
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+STORAGES = {
+    # Each distinct upload stored once under its SHA-256 (core.storage.DeduplicatedStorage);
+    # run `manage.py dedupe_media` once to convert files uploaded before it
+    'default': {
+        'BACKEND': 'core.storage.DeduplicatedStorage',
+    },
+    # Hashed names, gzip/brotli copies, WebP/AVIF copies of large PNGs and
+    # asset-report.json (see `manage.py static_asset_report`)
+    'staticfiles': {
+        'BACKEND': 'core.storage.OptimizedStaticFilesStorage',
+    },
+}
+STATIC_IMAGE_VARIANT_MIN_BYTES = int(os.environ.get('STATIC_IMAGE_VARIANT_MIN_BYTES', str(100 * 1024)))
+
+# WhiteNoise configuration: files with a content hash in their name (the
+# manifest's name.0123456789ab.ext and its .avif/.webp copies, or webpack's
+# 20-character hashes under kindlewick/), and tiles under a versioned pyramid
+# directory, are cached as immutable for ten years, others for 60 seconds
+WHITENOISE_IMMUTABLE_FILE_TEST = r'(\.[0-9a-f]{12}|/[0-9a-f]{20})\.\w+(\.avif|\.webp)?$|/tiles/[\w-]+/[0-9a-f]{12}/'
+
+# Deep Zoom tile pyramids (`manage.py build_tile_pyramids`), served as
+# /static/kindlewick/tiles/index.json -> <image>/manifest.json -> tiles
+KINDLEWICK_TILE_SOURCES = ['kindlewick/map.png', 'kindlewick/wizardscastle.png']
+KINDLEWICK_TILES_DIR = BASE_DIR / 'core/static/kindlewick/tiles'
+
+# Static files cached by the Kindlewick service worker (/kindlewick/sw.js);
+# tiles are requested lazily, so they are left to the HTTP cache
+KINDLEWICK_PRECACHE_PREFIXES = ['kindlewick/', 'core/images/favicon/favicon-16x16.png']
+KINDLEWICK_PRECACHE_EXCLUDE = ['kindlewick/tiles/']
 
 # Media files (User uploads)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# Resized WebP/JPEG copies of uploaded resource, forum and help images,
+# built by background threads after upload ({% responsive_image %})
+IMAGE_DERIVATIVE_WIDTHS = [320, 640, 960]
+IMAGE_DERIVATIVE_SIZES = '(min-width: 992px) 33vw, (min-width: 768px) 50vw, 100vw'
+IMAGE_DERIVATIVE_WORKERS = int(os.environ.get('IMAGE_DERIVATIVE_WORKERS', '2'))
+
+# Chunked, resumable uploads of TeachingResource.file (/api/resources/<slug>/uploads/);
+# chunks are streamed to disk, so they are not bound by DATA_UPLOAD_MAX_MEMORY_SIZE
+RESOURCE_UPLOAD_CHUNK_BYTES = 8 * 1024 * 1024
+RESOURCE_UPLOAD_MAX_BYTES = 500 * 1024 * 1024
+RESOURCE_UPLOAD_EXTENSIONS = ['.pdf', '.doc', '.docx', '.ppt', '.pptx', '.xls', '.xlsx']
+
 # Summernote Configuration
 SUMMERNOTE_CONFIG = {
     'default': {
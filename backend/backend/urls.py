@@ -14,11 +14,14 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
+from django.views.static import serve
 from core.views import custom_logout_view
 
 urlpatterns = [
@@ -33,4 +36,14 @@ urlpatterns = [
 if settings.DEBUG:
     urlpatterns += staticfiles_urlpatterns()
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    # Named so HttpCachePolicyMiddleware can apply the media cache policies
+    urlpatterns += [
+        re_path(
+            r'^%s(?P<path>blobs/.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')),
+            serve, {'document_root': settings.MEDIA_ROOT}, name='media_blob',
+        ),
+        re_path(
+            r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')),
+            serve, {'document_root': settings.MEDIA_ROOT}, name='media',
+        ),
+    ]
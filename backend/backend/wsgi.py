@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_wsgi_application()
+
+# Fill the cached template loader before the worker takes traffic
+from core.templating import warm_templates_on_boot  # noqa: E402
+
+warm_templates_on_boot()
@@ -1,7 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth.models import Group
 from .models import (User, Class, ClassStudent, SchoolAnalyticsProfile, 
-                     NewsAnnouncement, HelpTutorial, TeachingResource, ForumPost, ForumReply, ResourceComment)
+                     NewsAnnouncement, HelpTutorial, TeachingResource, ForumPost, ForumReply, ResourceComment,
+                     SlowQuery, ResourceUpload)
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django_summernote.admin import SummernoteModelAdmin
 
@@ -476,3 +477,63 @@ class SchoolAnalyticsProfileAdmin(admin.ModelAdmin):
 
 
 admin.site.register(User, UserAdmin)
+
+
+# Slow Queries - Superusers only, written by SlowQueryLogMiddleware
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'duration_ms', 'view', 'database', 'analyzed', 'short_fingerprint')
+    list_filter = ('view', 'database', 'analyzed', 'created_at')
+    search_fields = ('sql', 'view', 'path')
+    date_hierarchy = 'created_at'
+    readonly_fields = ('created_at', 'duration_ms', 'database', 'view', 'path', 'sql', 'fingerprint',
+                       'fingerprint_hash', 'params_hash', 'plan', 'analyzed', 'stack')
+
+    fieldsets = (
+        ('Request', {
+            'fields': ('created_at', 'duration_ms', 'database', 'view', 'path')
+        }),
+        ('Statement', {
+            'fields': ('sql', 'fingerprint', 'fingerprint_hash', 'params_hash')
+        }),
+        ('Plan', {
+            'fields': ('plan', 'analyzed')
+        }),
+        ('Call stack', {
+            'fields': ('stack',)
+        }),
+    )
+
+    def short_fingerprint(self, obj):
+        return obj.fingerprint[:120]
+    short_fingerprint.short_description = 'Statement'
+
+    def has_module_permission(self, request):
+        return request.user.is_superuser
+
+    def has_view_permission(self, request, obj=None):
+        return request.user.is_superuser
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return request.user.is_superuser
+
+
+# Resource Uploads - Read-only, written by the chunked upload API
+@admin.register(ResourceUpload)
+class ResourceUploadAdmin(admin.ModelAdmin):
+    list_display = ('filename', 'resource', 'user', 'offset', 'size', 'status', 'updated_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('filename', 'resource__title', 'user__username')
+    readonly_fields = ('id', 'resource', 'user', 'filename', 'size', 'sha256', 'offset', 'status', 'created_at', 'updated_at')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,52 @@
+from django.contrib import admin
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden
+from django.template.response import TemplateResponse
+from django.urls import path
+
+from .profiling import format_stats, get_profile_path, list_profiles
+
+
+class CoreAdminSite(admin.AdminSite):
+    """
+    The default admin site (installed by core.apps.CoreAdminConfig) plus the
+    request profiles written by ProfilerMiddleware, which only superusers
+    may browse.
+    """
+
+    def get_urls(self):
+        return [
+            path('profiles/', self.admin_view(self.profile_list_view), name='core_profiles'),
+            path('profiles/<str:name>/', self.admin_view(self.profile_detail_view), name='core_profile_detail'),
+        ] + super().get_urls()
+
+    def profile_list_view(self, request):
+        if not request.user.is_superuser:
+            return HttpResponseForbidden()
+        context = {
+            **self.each_context(request),
+            'title': 'Request profiles',
+            'profiles': list_profiles(),
+        }
+        return TemplateResponse(request, 'admin/core/profile_list.html', context)
+
+    def profile_detail_view(self, request, name):
+        if not request.user.is_superuser:
+            return HttpResponseForbidden()
+        profile_path = get_profile_path(name)
+        if profile_path is None:
+            raise Http404('Profile not found')
+        if request.GET.get('download'):
+            return FileResponse(open(profile_path, 'rb'), as_attachment=True, filename=name)
+        if name.endswith('.html'):
+            return HttpResponse(profile_path.read_bytes())
+        sort = request.GET.get('sort')
+        if sort not in ('cumulative', 'tottime', 'calls'):
+            sort = 'cumulative'
+        context = {
+            **self.each_context(request),
+            'title': name,
+            'name': name,
+            'sort': sort,
+            'stats': format_stats(profile_path, sort=sort),
+        }
+        return TemplateResponse(request, 'admin/core/profile_detail.html', context)
@@ -1,5 +1,16 @@
 from django.apps import AppConfig
+from django.contrib.admin import apps as admin_apps
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+    default = True
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
+
+
+class CoreAdminConfig(admin_apps.AdminConfig):
+    """django.contrib.admin with core.admin_site.CoreAdminSite as admin.site"""
+    default = False
+    default_site = 'core.admin_site.CoreAdminSite'
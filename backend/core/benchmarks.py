@@ -0,0 +1,228 @@
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from django.db import connections
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Class, ClassStudent, ForumPost, KindlewickGameSession, TeachingResource, User
+from .queries import record_queries
+
+
+@dataclass
+class Endpoint:
+    """A URL to benchmark and the role of the user requesting it"""
+    name: str
+    role: str
+    url_name: str
+    kwargs: tuple = ()
+
+    def path(self, context):
+        """Reverse the URL, filling kwargs from the benchmark context (None if unavailable)"""
+        values = {key: context.get(key) for key in self.kwargs}
+        if any(value is None for value in values.values()):
+            return None
+        return reverse(self.url_name, kwargs=values)
+
+
+ENDPOINTS = [
+    # Kindlewick student bootstrap and game APIs
+    Endpoint('kindlewick_page', 'student', 'kindlewick'),
+    Endpoint('student_dashboard', 'student', 'student_dashboard'),
+    Endpoint('current_user', 'student', 'api_current_user'),
+    Endpoint('student_progress', 'student', 'api_kindlewick_progress'),
+    Endpoint('student_sessions', 'student', 'api_kindlewick_sessions'),
+    Endpoint('student_session_detail', 'student', 'api_kindlewick_session_detail', ('session_id',)),
+    # Teacher feeds, analytics and hub list pages
+    Endpoint('teacher_progress', 'teacher', 'api_kindlewick_teacher_progress'),
+    Endpoint('teacher_sessions', 'teacher', 'api_kindlewick_teacher_sessions'),
+    Endpoint('teacher_dashboard', 'teacher', 'teacher_dashboard'),
+    Endpoint('teacher_analytics', 'teacher', 'teacher_analytics'),
+    Endpoint('class_detail', 'teacher', 'class_detail', ('class_id',)),
+    Endpoint('class_analytics', 'teacher', 'class_analytics', ('class_id',)),
+    Endpoint('student_analytics', 'teacher', 'student_analytics', ('class_id', 'student_id')),
+    Endpoint('teacher_news', 'teacher', 'teacher_news'),
+    Endpoint('teacher_help', 'teacher', 'teacher_help'),
+    Endpoint('teacher_resources', 'teacher', 'teacher_resources'),
+    Endpoint('teacher_resource_detail', 'teacher', 'teacher_resource_detail', ('slug',)),
+    Endpoint('teacher_forum', 'teacher', 'teacher_forum'),
+    Endpoint('teacher_forum_detail', 'teacher', 'teacher_forum_detail', ('post_id',)),
+    # School admin feeds and analytics
+    Endpoint('school_admin_progress', 'school_admin', 'api_kindlewick_school_admin_progress'),
+    Endpoint('school_admin_sessions', 'school_admin', 'api_kindlewick_school_admin_sessions'),
+    Endpoint('school_admin_dashboard', 'school_admin', 'school_admin_dashboard'),
+    Endpoint('school_admin_classes', 'school_admin', 'school_admin_classes'),
+    Endpoint('school_admin_analytics', 'school_admin', 'school_admin_analytics'),
+]
+
+
+def benchmark_users(student=None, teacher=None, school_admin=None):
+    """
+    Pick the users to benchmark as. Without explicit usernames, the teacher
+    with the most enrolled students is used, with one of their students and
+    an admin of the same school, so feeds return realistic volumes.
+    """
+    users = {}
+    if teacher:
+        users['teacher'] = User.objects.get(username=teacher)
+    else:
+        busiest = (
+            ClassStudent.objects.values('clazz__teacher')
+            .annotate(students=Count('id')).order_by('-students').first()
+        )
+        users['teacher'] = User.objects.filter(pk=busiest['clazz__teacher']).first() if busiest else None
+    if users['teacher'] is None:
+        users['teacher'] = User.objects.filter(role='teacher').order_by('id').first()
+
+    if student:
+        users['student'] = User.objects.get(username=student)
+    else:
+        enrolled = ClassStudent.objects.filter(clazz__teacher=users['teacher']).order_by('id').first()
+        users['student'] = enrolled.student if enrolled else User.objects.filter(role='student').order_by('id').first()
+
+    if school_admin:
+        users['school_admin'] = User.objects.get(username=school_admin)
+    else:
+        admins = User.objects.filter(role='school_admin').order_by('id')
+        school = users['teacher'].school if users['teacher'] else None
+        users['school_admin'] = (school and admins.filter(school=school).first()) or admins.first()
+    return users
+
+
+def benchmark_context(users):
+    """Look up the ids and slugs that parameterised endpoints need"""
+    context = {}
+    teacher, student = users.get('teacher'), users.get('student')
+    if teacher:
+        clazz = Class.objects.filter(teacher=teacher).order_by('id').first()
+        if clazz:
+            context['class_id'] = clazz.id
+            enrolled = ClassStudent.objects.filter(clazz=clazz).order_by('id').first()
+            if enrolled:
+                context['student_id'] = enrolled.student_id
+    if student:
+        context['session_id'] = (
+            KindlewickGameSession.objects.filter(user=student).order_by('-created_at')
+            .values_list('id', flat=True).first()
+        )
+    context['slug'] = (
+        TeachingResource.objects.filter(status='published').order_by('-published_at')
+        .values_list('slug', flat=True).first()
+    )
+    context['post_id'] = ForumPost.objects.order_by('-created_at').values_list('id', flat=True).first()
+    return context
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(p / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def _worker(user, path, count, threaded):
+    client = Client(HTTP_HOST='localhost', raise_request_exception=False)
+    client.force_login(user)
+    samples = []
+    try:
+        for _ in range(count):
+            with record_queries() as recorder:
+                start = time.perf_counter()
+                response = client.get(path)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                elapsed = time.perf_counter() - start
+            samples.append((elapsed, recorder.count, response.status_code))
+    finally:
+        if threaded:
+            # Each thread opened its own connections
+            connections.close_all()
+    return samples
+
+
+def run_endpoint(user, path, requests=50, concurrency=8, warmup=2):
+    """
+    Request path `requests` times from `concurrency` logged-in clients in
+    parallel threads. Returns a summary dict of latency percentiles (ms),
+    throughput, query counts and status codes.
+    """
+    if warmup:
+        _worker(user, path, warmup, threaded=False)
+    concurrency = max(min(concurrency, requests), 1)
+    shares = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+
+    start = time.perf_counter()
+    if concurrency == 1:
+        samples = _worker(user, path, requests, threaded=False)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = [pool.submit(_worker, user, path, share, True) for share in shares]
+            samples = [sample for future in futures for sample in future.result()]
+    wall = time.perf_counter() - start
+
+    latencies = [elapsed * 1000 for elapsed, _, _ in samples]
+    queries = [count for _, count, _ in samples]
+    statuses = {}
+    for _, _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        'path': path,
+        'requests': len(samples),
+        'concurrency': concurrency,
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'throughput_rps': round(len(samples) / wall, 1) if wall else None,
+        'queries_mean': round(sum(queries) / len(queries), 1),
+        'queries_max': max(queries),
+        'errors': sum(count for status, count in statuses.items() if int(status) >= 500),
+        'status_codes': statuses,
+    }
+
+
+def find_regressions(baseline, current, threshold=0.2, min_delta_ms=5.0):
+    """
+    Compare two results documents. An endpoint regresses when its p95 grows
+    by more than `threshold` (and at least min_delta_ms, to ignore noise on
+    fast endpoints), when its mean query count grows by more than
+    `threshold`, or when it starts returning server errors.
+    """
+    regressions = []
+    for name, result in current.get('endpoints', {}).items():
+        before = baseline.get('endpoints', {}).get(name)
+        if not before:
+            continue
+        if result['p95_ms'] > before['p95_ms'] * (1 + threshold) and result['p95_ms'] - before['p95_ms'] >= min_delta_ms:
+            regressions.append(f"{name}: p95 {before['p95_ms']}ms -> {result['p95_ms']}ms")
+        if result['queries_mean'] > before['queries_mean'] * (1 + threshold):
+            regressions.append(f"{name}: queries {before['queries_mean']} -> {result['queries_mean']}")
+        if result['errors'] and not before['errors']:
+            regressions.append(f"{name}: {result['errors']} server errors")
+    return regressions
+
+
+def load_results(path):
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def append_query_counts(path, counts, label=''):
+    """Append one run of {endpoint: {size: queries}} to a JSON lines history file"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a') as handle:
+        handle.write(json.dumps({'created': timezone.now().isoformat(), 'label': label, 'counts': counts}, sort_keys=True) + '\n')
+
+
+def load_query_count_history(path):
+    with open(path) as handle:
+        return [json.loads(line) for line in handle if line.strip()]
@@ -0,0 +1,476 @@
+import functools
+import hashlib
+import threading
+import time
+from collections import Counter, OrderedDict
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.db import connections
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.utils.cache import patch_vary_headers
+from django.utils.functional import cached_property
+
+from .queries import performance_logger
+
+_MISSING = object()
+
+# Django creates cache backends per thread; the local tier is shared by the
+# whole process, keyed by the shared cache alias (like LocMemCache's _caches).
+_local_tiers = {}
+_local_tiers_lock = threading.Lock()
+
+
+class LocalLRU:
+    """Thread-safe bounded LRU mapping with a per-entry expiry"""
+
+    def __init__(self, max_entries=1000, timeout=5):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return _MISSING
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return _MISSING
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        timeout = self.timeout if timeout is None else min(timeout, self.timeout)
+        if timeout <= 0:
+            self.delete(key)
+            return
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + timeout)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class TwoTierCache(BaseCache):
+    """
+    Cache backend with a small in-process LRU in front of a shared backend
+    (Redis, or the file-based stand-in). Reads check the local tier first;
+    writes go to both. Local entries live at most OPTIONS['LOCAL_TIMEOUT']
+    seconds, which bounds how stale one worker can be after another worker
+    changes a key. LOCATION names the shared cache alias.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = location or 'shared'
+        with _local_tiers_lock:
+            self.local = _local_tiers.setdefault(self.shared_alias, LocalLRU(
+                max_entries=options.get('LOCAL_MAX_ENTRIES', 1000),
+                timeout=options.get('LOCAL_TIMEOUT', 5),
+            ))
+
+    @cached_property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def _local_timeout(self, timeout):
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def get_with_tier(self, key, default=None, version=None):
+        """Return (value, tier) where tier is 'local', 'shared' or None for a miss"""
+        local_key = self.make_and_validate_key(key, version=version)
+        value = self.local.get(local_key)
+        if value is not _MISSING:
+            return value, 'local'
+        value = self.shared.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            return default, None
+        self.local.set(local_key, value)
+        return value, 'shared'
+
+    def get(self, key, default=None, version=None):
+        return self.get_with_tier(key, default, version)[0]
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        self.local.set(self.make_and_validate_key(key, version=version), value, self._local_timeout(timeout))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        if not self.shared.add(key, value, timeout, version=version):
+            # Another process holds a value we have not seen
+            self.local.delete(local_key)
+            return False
+        self.local.set(local_key, value, self._local_timeout(timeout))
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self.local.delete(self.make_and_validate_key(key, version=version))
+        return self.shared.delete(key, version=version)
+
+    def has_key(self, key, version=None):
+        if self.local.get(self.make_and_validate_key(key, version=version)) is not _MISSING:
+            return True
+        return self.shared.has_key(key, version=version)
+
+    def get_many(self, keys, version=None):
+        found, missing = {}, []
+        for key in keys:
+            value = self.local.get(self.make_and_validate_key(key, version=version))
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        if missing:
+            fetched = self.shared.get_many(missing, version=version)
+            for key, value in fetched.items():
+                self.local.set(self.make_and_validate_key(key, version=version), value)
+            found.update(fetched)
+        return found
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        for key, value in data.items():
+            if key not in failed:
+                self.local.set(self.make_and_validate_key(key, version=version), value, self._local_timeout(timeout))
+        return failed
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self.local.delete(self.make_and_validate_key(key, version=version))
+        self.shared.delete_many(keys, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        # Counters must be atomic across processes, so they live in the shared tier only
+        self.local.delete(self.make_and_validate_key(key, version=version))
+        return self.shared.incr(key, delta, version=version)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+
+class CacheStats:
+    """
+    Hit/miss counters per namespace. Counts accumulate in the process and are
+    added to the shared cache every CACHE_STATS_FLUSH_INTERVAL seconds, so
+    `manage.py cache_stats` sees totals across all workers.
+    """
+
+    EVENTS = ('local_hit', 'shared_hit', 'miss')
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+        self.pending = Counter()
+        self.lock = threading.Lock()
+        self.last_flush = time.monotonic()
+
+    @staticmethod
+    def key(namespace, event):
+        return f'cache-stats:{namespace}:{event}'
+
+    def record(self, namespace, tier):
+        event = {'local': 'local_hit', 'shared': 'shared_hit'}.get(tier, 'miss')
+        with self.lock:
+            self.pending[(namespace, event)] += 1
+            interval = getattr(settings, 'CACHE_STATS_FLUSH_INTERVAL', 10)
+            if time.monotonic() - self.last_flush < interval:
+                return
+        self.flush()
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, Counter()
+            self.last_flush = time.monotonic()
+        cache = caches[self.alias]
+        for (namespace, event), count in pending.items():
+            key = self.key(namespace, event)
+            try:
+                cache.incr(key, count)
+            except ValueError:
+                if not cache.add(key, count, None):
+                    cache.incr(key, count)
+
+    def totals(self, namespaces):
+        """Counts per namespace across processes (after flushing this one)"""
+        self.flush()
+        cache = caches[self.alias]
+        keys = {self.key(namespace, event): (namespace, event) for namespace in namespaces for event in self.EVENTS}
+        stored = cache.get_many(keys)
+        totals = {namespace: dict.fromkeys(self.EVENTS, 0) for namespace in namespaces}
+        for key, value in stored.items():
+            namespace, event = keys[key]
+            totals[namespace][event] = value
+        return totals
+
+    def reset(self, namespaces):
+        with self.lock:
+            self.pending.clear()
+        caches[self.alias].delete_many([self.key(n, event) for n in namespaces for event in self.EVENTS])
+
+
+cache_stats = CacheStats()
+
+
+class NamespacedCache:
+    """
+    Keys stored as '<namespace>:<version>:<key>'. bump() increments the
+    namespace version, which invalidates every key in it at once; the old
+    entries are never read again and simply expire. Other workers see a bump
+    once their local copy of the version expires (LOCAL_TIMEOUT).
+    """
+
+    def __init__(self, namespace, timeout=300, alias='default'):
+        self.namespace = namespace
+        self.timeout = timeout
+        self.alias = alias
+        self.version_key = f'cache-version:{namespace}'
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def version(self):
+        version = self.cache.get(self.version_key)
+        if version is None:
+            self.cache.add(self.version_key, 1, None)
+            version = self.cache.get(self.version_key, 1)
+        return version
+
+    def make_key(self, key):
+        return f'{self.namespace}:{self.version()}:{key}'
+
+    def get(self, key, default=None):
+        full_key = self.make_key(key)
+        if isinstance(self.cache, TwoTierCache):
+            value, tier = self.cache.get_with_tier(full_key, _MISSING)
+        else:
+            value = self.cache.get(full_key, _MISSING)
+            tier = 'shared' if value is not _MISSING else None
+        cache_stats.record(self.namespace, tier)
+        return default if value is _MISSING else value
+
+    def set(self, key, value, timeout=None):
+        self.cache.set(self.make_key(key), value, self.timeout if timeout is None else timeout)
+
+    def add(self, key, value, timeout=None):
+        return self.cache.add(self.make_key(key), value, self.timeout if timeout is None else timeout)
+
+    def delete(self, key):
+        self.cache.delete(self.make_key(key))
+
+    def get_or_set(self, key, default, timeout=None):
+        """Return the cached value, computing and storing default() on a miss"""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = default() if callable(default) else default
+            self.set(key, value, timeout)
+        return value
+
+    def bump(self):
+        try:
+            return self.cache.incr(self.version_key)
+        except ValueError:
+            self.cache.set(self.version_key, 2, None)
+            return 2
+
+
+# Class rosters (which students a teacher or school admin can see)
+roster_cache = NamespacedCache('roster', timeout=600)
+# Analytics aggregations
+analytics_cache = NamespacedCache('analytics', timeout=600)
+# Rendered public content (news, help, resources, marketing pages)
+content_cache = NamespacedCache('content', timeout=3600)
+
+NAMESPACES = [roster_cache, analytics_cache, content_cache]
+
+
+def _freeze_response(response):
+    # Plain data rather than the response object: the local tier hands out the
+    # same object to every reader, and middleware mutates responses
+    return {
+        'content': response.content,
+        'status': response.status_code,
+        'headers': tuple(response.items()),
+        'created': time.time(),
+    }
+
+
+def _thaw_response(entry):
+    response = HttpResponse(entry['content'], status=entry['status'])
+    for header, value in entry['headers']:
+        response[header] = value
+    return response
+
+
+def _view_cache_key(request, view_func):
+    # Per user, and per CSRF secret so a cached form never carries a token
+    # from before the secret was rotated at login
+    user = getattr(request, 'user', None)
+    user_id = user.pk if user is not None and user.is_authenticated else 'anon'
+    csrf = request.META.get('CSRF_COOKIE') or request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+    digest = hashlib.md5(f'{request.get_full_path()}|{csrf}'.encode(), usedforsecurity=False).hexdigest()
+    return f'view:{view_func.__module__}.{view_func.__qualname__}:{user_id}:{digest}'
+
+
+def _has_messages(request):
+    # Flash messages are per visit: a render that displayed them must not be
+    # replayed, and a request with some waiting must not get a cached page
+    storage = get_messages(request)
+    return getattr(storage, 'used', False) or len(storage) > 0
+
+
+def _refresh_request(request):
+    """
+    A new GET for `request`'s URL, user and CSRF secret, to render in the
+    background once `request` has finished: its session, messages and the
+    rest of its state belong to the finished request. The session is an
+    empty one that is never saved.
+    """
+    fresh = RequestFactory().get(
+        request.get_full_path(), secure=request.is_secure(), HTTP_HOST=request.get_host(),
+    )
+    fresh.user = request.user
+    fresh.session = import_module(settings.SESSION_ENGINE).SessionStore()
+    if 'CSRF_COOKIE' in request.META:
+        fresh.META['CSRF_COOKIE'] = request.META['CSRF_COOKIE']
+    if settings.CSRF_COOKIE_NAME in request.COOKIES:
+        fresh.COOKIES[settings.CSRF_COOKIE_NAME] = request.COOKIES[settings.CSRF_COOKIE_NAME]
+    fresh.resolver_match = request.resolver_match
+    return fresh
+
+
+def _start_refresh(target):
+    thread = threading.Thread(target=target, daemon=True, name='cache-refresh')
+    thread.start()
+    return thread
+
+
+def stale_while_revalidate(cache, soft_ttl, hard_ttl, lock_timeout=30):
+    """
+    Cache a view's rendered response in a NamespacedCache. Responses younger
+    than soft_ttl are served as is; older ones (up to hard_ttl) are still
+    served immediately while one background thread re-renders the view. A
+    per-key lock makes sure only one request renders a given key at a time:
+    on a cold cache, concurrent requests wait up to lock_timeout for the
+    first one instead of all running the same aggregation. Requests with
+    flash messages waiting bypass the cache, and renders that showed
+    messages are not stored. The background render gets a request of its
+    own (see _refresh_request).
+
+    The lock is cache.add(), which is atomic on Redis and locmem but not on
+    the file-based cache used without REDIS_URL: there, concurrent requests
+    can occasionally render the same key twice.
+    """
+    def decorator(view_func):
+        def render(request, key, args, kwargs):
+            response = view_func(request, *args, **kwargs)
+            if (response.status_code == 200 and not response.streaming and not response.cookies
+                    and not _has_messages(request)):
+                cache.set(key, _freeze_response(response), hard_ttl)
+            return response
+
+        def refresh(request, key, args, kwargs):
+            try:
+                render(request, key, args, kwargs)
+            except Exception:
+                performance_logger.exception('Background refresh of %s failed', request.path)
+            finally:
+                cache.delete(f'{key}:lock')
+                connections.close_all()
+
+        @functools.wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or _has_messages(request):
+                return view_func(request, *args, **kwargs)
+            key = _view_cache_key(request, view_func)
+            lock_key = f'{key}:lock'
+
+            entry = cache.get(key)
+            if entry is None:
+                deadline = time.monotonic() + lock_timeout
+                while not cache.add(lock_key, 1, lock_timeout):
+                    # Another request is rendering this key; use its result
+                    time.sleep(0.05)
+                    # Read past the hit counters so waiting does not count as misses
+                    entry = cache.cache.get(cache.make_key(key))
+                    if entry is not None:
+                        return _thaw_response(entry)
+                    if time.monotonic() > deadline:
+                        return view_func(request, *args, **kwargs)
+                try:
+                    return render(request, key, args, kwargs)
+                finally:
+                    cache.delete(lock_key)
+
+            if time.time() - entry['created'] >= soft_ttl and cache.add(lock_key, 1, lock_timeout):
+                _start_refresh(functools.partial(refresh, _refresh_request(request), key, args, kwargs))
+            return _thaw_response(entry)
+        return wrapper
+    return decorator
+
+
+def is_anonymous_request(request):
+    """
+    True when the request cannot belong to a logged-in user or carry flash
+    messages. Decided from cookies alone, so no session or user is loaded.
+    """
+    return settings.SESSION_COOKIE_NAME not in request.COOKIES and 'messages' not in request.COOKIES
+
+
+def anonymous_page_key(path):
+    return f'page:{path}'
+
+
+def cache_anonymous_page(view_func):
+    """
+    Full-page cache for pages that render identically for every anonymous
+    visitor. Cache lifetimes are per URL name in ANONYMOUS_PAGE_CACHE_TTLS;
+    a hit returns the stored HTML without touching templates or the
+    database. Visitors with a session or messages cookie always get a fresh
+    render, and renders that issued a CSRF token or set cookies are never
+    stored, since those differ per visitor.
+    """
+    @functools.wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        url_name = request.resolver_match.url_name if request.resolver_match else None
+        ttl = getattr(settings, 'ANONYMOUS_PAGE_CACHE_TTLS', {}).get(url_name)
+        if ttl is None or request.method not in ('GET', 'HEAD') or not is_anonymous_request(request):
+            response = view_func(request, *args, **kwargs)
+        else:
+            key = anonymous_page_key(request.path)
+            entry = content_cache.get(key)
+            if entry is not None:
+                response = _thaw_response(entry)
+            else:
+                response = view_func(request, *args, **kwargs)
+                if (
+                    response.status_code == 200 and not response.streaming and not response.cookies
+                    and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+                ):
+                    content_cache.set(key, _freeze_response(response), ttl)
+        patch_vary_headers(response, ('Cookie',))
+        return response
+    return wrapper
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+from .templating import cached_loaders, django_engines
+
+
+@register(Tags.templates)
+def check_cached_template_loader(app_configs, **kwargs):
+    """Production must parse each template once per worker, not on every render"""
+    if settings.DEBUG:
+        return []
+    return [
+        Error(
+            f"Template engine '{engine.name}' does not use the cached template loader.",
+            hint="Wrap its loaders in ('django.template.loaders.cached.Loader', [...]) in TEMPLATES.",
+            id='core.E001',
+        )
+        for engine in django_engines()
+        if not cached_loaders(engine)
+    ]
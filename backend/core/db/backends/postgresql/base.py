@@ -0,0 +1,80 @@
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db.backends.postgresql import base as postgresql
+
+from core.queries import performance_logger
+from core.timing import current_timings
+
+
+class PoolMetrics:
+    """
+    Per-process record of how long requests waited for a pooled connection.
+    Every DATABASE_POOL_STATS_INTERVAL seconds one line with the wait
+    percentiles and psycopg_pool's own counters is logged to core.performance.
+    """
+
+    def __init__(self, max_samples=1000):
+        self.lock = threading.Lock()
+        self.waits = {}
+        self.max_samples = max_samples
+        self.last_logged = time.monotonic()
+
+    def record(self, alias, pool, wait):
+        wait_ms = wait * 1000
+        slow_ms = getattr(settings, 'DATABASE_POOL_SLOW_WAIT_MS', 100)
+        if wait_ms >= slow_ms:
+            stats = pool.get_stats()
+            performance_logger.warning(
+                'Waited %.0fms for a %s pool connection (size %s, available %s, waiting %s)',
+                wait_ms, alias, stats.get('pool_size'), stats.get('pool_available'), stats.get('requests_waiting'),
+            )
+        with self.lock:
+            self.waits.setdefault(alias, deque(maxlen=self.max_samples)).append(wait_ms)
+            interval = getattr(settings, 'DATABASE_POOL_STATS_INTERVAL', 60)
+            if time.monotonic() - self.last_logged < interval:
+                return
+            self.last_logged = time.monotonic()
+            waits, self.waits = self.waits, {}
+        for name, samples in waits.items():
+            self.log(name, sorted(samples), postgresql.DatabaseWrapper._connection_pools.get(name))
+
+    def log(self, alias, samples, pool):
+        stats = pool.pop_stats() if pool is not None else {}
+        performance_logger.info(
+            'Pool %s: %d checkouts, wait p50 %.1fms p95 %.1fms max %.1fms; size %s, available %s, '
+            'waiting %s, timeouts %s, pool wait total %sms',
+            alias, len(samples), samples[len(samples) // 2], samples[int(len(samples) * 0.95)], samples[-1],
+            stats.get('pool_size'), stats.get('pool_available'), stats.get('requests_waiting'),
+            stats.get('requests_errors', 0), stats.get('requests_wait_ms', 0),
+        )
+
+    def snapshot(self):
+        """Current wait samples per alias, for debugging from a shell"""
+        with self.lock:
+            return {alias: list(samples) for alias, samples in self.waits.items()}
+
+
+pool_metrics = PoolMetrics()
+
+
+class DatabaseWrapper(postgresql.DatabaseWrapper):
+    """
+    PostgreSQL backend that measures how long checking a connection out of
+    the psycopg pool takes. The wait feeds the 'db_pool' Server-Timing phase
+    and the periodic pool log line.
+    """
+
+    def get_new_connection(self, conn_params):
+        if not self.pool:
+            return super().get_new_connection(conn_params)
+        start = time.perf_counter()
+        connection = super().get_new_connection(conn_params)
+        wait = time.perf_counter() - start
+        timings = current_timings()
+        if timings is not None:
+            timings.add('db_pool', wait)
+        pool_metrics.record(self.alias, self.pool, wait)
+        return connection
@@ -0,0 +1,104 @@
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .models import HelpTutorial, NewsAnnouncement, TeachingResource
+from .queries import performance_logger
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def media_key(name):
+    """Surrogate key for an uploaded file, from its storage name"""
+    return 'media-' + hashlib.md5(name.encode(), usedforsecurity=False).hexdigest()[:16]
+
+
+def _published_key(model, prefix):
+    def build(request, slug):
+        pk = model.objects.filter(slug=slug, status='published').values_list('pk', flat=True).first()
+        # Drafts and missing items are never handed to a shared cache
+        return None if pk is None else [prefix, f'{prefix}-{pk}']
+    return build
+
+
+# URL name -> callable(request, **url_kwargs) returning the response's
+# surrogate keys, or None when the response must not be cached publicly.
+# Pages without an entry get ['page-<url name>'].
+SURROGATE_KEY_BUILDERS = {
+    'teacher_news_detail': _published_key(NewsAnnouncement, 'news'),
+    'teacher_help_detail': _published_key(HelpTutorial, 'help'),
+    'teacher_resource_detail': _published_key(TeachingResource, 'resource'),
+    'media': lambda request, path: ['media', media_key(path)],
+    # Content-addressed, so never purged
+    'media_blob': lambda request, path: ['media-blob'],
+}
+
+
+def surrogate_keys_for(request):
+    match = request.resolver_match
+    build = SURROGATE_KEY_BUILDERS.get(match.url_name)
+    if build is None:
+        return [f'page-{match.url_name}']
+    return build(request, *match.args, **match.kwargs)
+
+
+def instance_surrogate_keys(instance):
+    """
+    Surrogate keys to purge when a news item, tutorial or resource changes:
+    its own detail page and uploads. The bare prefix key, which every detail
+    page of that kind carries, is left for purging them all by hand.
+    """
+    prefix = {NewsAnnouncement: 'news', HelpTutorial: 'help', TeachingResource: 'resource'}[type(instance)]
+    keys = [f'{prefix}-{instance.pk}']
+    for field in ('image', 'file'):
+        upload = getattr(instance, field, None)
+        if upload:
+            keys.append(media_key(upload.name))
+    return keys
+
+
+class LoggingPurger:
+    """Default purger: records what would be purged (no edge cache configured)"""
+
+    def purge(self, keys):
+        performance_logger.info('Surrogate key purge: %s', ' '.join(keys))
+
+
+class HttpPurger:
+    """
+    Send PURGE to SURROGATE_PURGE_URL with the keys in a Surrogate-Key header,
+    which Varnish (with a surrogate key VCL) and most CDN purge APIs accept.
+    Requests go out from a background thread, so a slow edge never holds up
+    the request that saved the content.
+    """
+
+    def purge(self, keys):
+        global _executor
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='surrogate-purge')
+        _executor.submit(self.send, keys)
+
+    def send(self, keys):
+        url = settings.SURROGATE_PURGE_URL
+        headers = {'Surrogate-Key': ' '.join(keys)}
+        token = getattr(settings, 'SURROGATE_PURGE_TOKEN', None)
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        try:
+            response = requests.request('PURGE', url, headers=headers, timeout=5)
+            response.raise_for_status()
+        except requests.RequestException:
+            performance_logger.exception('Surrogate key purge of %s failed', ' '.join(keys))
+
+
+def purge_surrogate_keys(keys):
+    """Purge keys from the edge cache once the current transaction commits"""
+    purger = import_string(getattr(settings, 'SURROGATE_PURGER', 'core.http_cache.LoggingPurger'))()
+    transaction.on_commit(lambda: purger.purge(list(keys)))
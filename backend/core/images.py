@@ -0,0 +1,159 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils.html import format_html
+from PIL import Image, ImageOps
+
+from .cache import content_cache
+from .queries import performance_logger
+
+# Extension -> (Pillow format, save options)
+DERIVATIVE_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _derivative_stem(name):
+    # Keeps the source extension, so cat.png and cat.jpg get separate copies
+    root, source_extension = os.path.splitext(name)
+    return f'{root}_{source_extension[1:].lower()}' if source_extension else root
+
+
+def derivative_name(name, width, extension):
+    """teaching_resources/images/cat.png -> teaching_resources/images/cat_png_320w.webp"""
+    return f'{_derivative_stem(name)}_{width}w.{extension}'
+
+
+def derivatives_manifest_name(name):
+    return f'{_derivative_stem(name)}_derivatives.json'
+
+
+def _cache_key(name):
+    return f'derivatives:{name}'
+
+
+def _save(name, content, storage):
+    # Regenerating must keep the same names, which Storage.save would not
+    if storage.exists(name):
+        storage.delete(name)
+    storage.save(name, ContentFile(content))
+
+
+def build_derivatives(name, storage=default_storage):
+    """
+    Write resized copies of an uploaded image next to it, in every
+    DERIVATIVE_FORMATS format and at each of IMAGE_DERIVATIVE_WIDTHS that is
+    narrower than the original (or the original width if none is), then a
+    <name>_<ext>_derivatives.json manifest, written last so readers never see a
+    partial set. Returns the manifest.
+    """
+    with storage.open(name) as original, Image.open(original) as image:
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+    opaque = image
+    if image.mode == 'RGBA':
+        # JPEG has no alpha channel; flatten onto white like the card background
+        opaque = Image.new('RGB', image.size, 'white')
+        opaque.paste(image, mask=image.getchannel('A'))
+
+    widths = sorted({width for width in settings.IMAGE_DERIVATIVE_WIDTHS if width < image.width}) or [image.width]
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        for extension, (image_format, options) in DERIVATIVE_FORMATS.items():
+            source = opaque if image_format == 'JPEG' else image
+            buffer = BytesIO()
+            source.resize((width, height), Image.Resampling.LANCZOS).save(buffer, image_format, **options)
+            _save(derivative_name(name, width, extension), buffer.getvalue(), storage)
+
+    manifest = {'width': image.width, 'height': image.height, 'widths': widths, 'formats': list(DERIVATIVE_FORMATS)}
+    _save(derivatives_manifest_name(name), json.dumps(manifest).encode(), storage)
+    content_cache.delete(_cache_key(name))
+    return manifest
+
+
+def image_derivatives(name, storage=default_storage):
+    """The manifest written by build_derivatives, or None until it exists"""
+    manifest = content_cache.get(_cache_key(name))
+    if manifest is None:
+        try:
+            with storage.open(derivatives_manifest_name(name)) as manifest_file:
+                manifest = json.load(manifest_file)
+        except (FileNotFoundError, ValueError):
+            manifest = {}
+        # Misses are remembered briefly; build_derivatives clears them
+        content_cache.set(_cache_key(name), manifest, None if manifest else 60)
+    return manifest or None
+
+
+def responsive_image(image, alt='', css_class='card-img-top', sizes=None):
+    """
+    <picture> for an ImageField value: a WebP srcset with a JPEG <img>
+    fallback, both from the derivatives, and `sizes` defaulting to
+    IMAGE_DERIVATIVE_SIZES (the list page card grid). Until the
+    derivatives exist, a plain <img> of the original.
+    """
+    manifest = image_derivatives(image.name, image.storage)
+    if manifest is None:
+        return format_html('<img class="{}" src="{}" alt="{}" loading="lazy">', css_class, image.url, alt)
+
+    def srcset(extension):
+        return ', '.join(
+            f'{image.storage.url(derivative_name(image.name, width, extension))} {width}w' for width in manifest['widths']
+        )
+
+    sizes = sizes or settings.IMAGE_DERIVATIVE_SIZES
+    width = manifest['widths'][0]
+    height = max(1, round(manifest['height'] * width / manifest['width']))
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img class="{}" src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" loading="lazy" decoding="async">'
+        '</picture>',
+        srcset('webp'), sizes, css_class, image.storage.url(derivative_name(image.name, width, 'jpg')),
+        srcset('jpg'), sizes, width, height, alt,
+    )
+
+
+def _build_logged(name):
+    try:
+        build_derivatives(name)
+    except Exception:
+        performance_logger.exception('Building image derivatives for %s failed', name)
+
+
+def _build_in_background(name):
+    try:
+        _build_logged(name)
+    finally:
+        connections.close_all()
+
+
+def queue_derivatives(name):
+    """
+    Build an upload's derivatives on the IMAGE_DERIVATIVE_WORKERS background
+    threads once the current transaction commits, so the request that saved
+    it does not wait. With no workers configured they are built inline.
+    Uploads whose worker died before finishing are picked up by
+    `manage.py build_image_derivatives`.
+    """
+    global _executor
+    workers = getattr(settings, 'IMAGE_DERIVATIVE_WORKERS', 2)
+    if not workers:
+        transaction.on_commit(lambda: _build_logged(name))
+        return
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-derivatives')
+    transaction.on_commit(lambda: _executor.submit(_build_in_background, name))
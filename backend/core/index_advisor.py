@@ -0,0 +1,271 @@
+import json
+import re
+from dataclasses import dataclass, field
+
+from django.apps import apps
+from django.db import models
+
+_SQL_KEYWORDS = {
+    'WHERE', 'INNER', 'LEFT', 'RIGHT', 'OUTER', 'FULL', 'CROSS', 'JOIN', 'ON', 'GROUP',
+    'ORDER', 'LIMIT', 'OFFSET', 'HAVING', 'UNION', 'AS', 'USING', 'SET', 'VALUES', 'FOR',
+}
+_TABLE_RE = re.compile(r'\b(?:FROM|JOIN|UPDATE|INTO)\s+"(\w+)"(?:\s+(?:AS\s+)?"?(\w+)"?)?', re.IGNORECASE)
+_COLUMN = r'(?:"(?P<alias>\w+)"|(?P<bare>\w+))\."(?P<column>\w+)"'
+_PREDICATE_RE = re.compile(_COLUMN + r'\s*(?P<op>=|<=|>=|<|>|\bIN\b|\bIS\b|\bBETWEEN\b)', re.IGNORECASE)
+_ORDER_BY_RE = re.compile(r'\bORDER BY\s+(.+?)(?=\bLIMIT\b|\bOFFSET\b|\bFOR UPDATE\b|\)|$)', re.IGNORECASE | re.DOTALL)
+_ORDER_COLUMN_RE = re.compile(_COLUMN + r'(?:\s+(?P<direction>ASC|DESC))?', re.IGNORECASE)
+
+EQUALITY_OPERATORS = {'=', 'IN', 'IS'}
+
+
+@dataclass
+class TableAccess:
+    """Columns one statement filters and sorts on for a single table"""
+    table: str
+    equality: list = field(default_factory=list)
+    ranges: list = field(default_factory=list)
+    ordering: list = field(default_factory=list)
+
+
+def parse_statement(sql):
+    """Extract per-table equality, range and ORDER BY columns from Django-style SQL"""
+    aliases = {}
+    for table, alias in _TABLE_RE.findall(sql):
+        aliases[table] = table
+        if alias and alias.upper() not in _SQL_KEYWORDS:
+            aliases[alias] = table
+
+    # Keyed by alias: a table joined twice (U0, U3) is two separate accesses
+    accesses = {}
+
+    def access_for(match):
+        alias = match.group('alias') or match.group('bare')
+        table = aliases.get(alias)
+        if table is None:
+            return None
+        return accesses.setdefault(alias, TableAccess(table))
+
+    for match in _PREDICATE_RE.finditer(sql):
+        access = access_for(match)
+        if access is None:
+            continue
+        column = match.group('column')
+        target = access.equality if match.group('op').upper() in EQUALITY_OPERATORS else access.ranges
+        if column not in access.equality and column not in target:
+            target.append(column)
+
+    order_clauses = _ORDER_BY_RE.findall(sql)
+    if order_clauses:
+        # Only the outermost ORDER BY decides the result order
+        for match in _ORDER_COLUMN_RE.finditer(order_clauses[-1]):
+            access = access_for(match)
+            if access is None:
+                continue
+            descending = (match.group('direction') or '').upper() == 'DESC'
+            access.ordering.append((match.group('column'), descending))
+
+    for access in accesses.values():
+        access.ranges = [column for column in access.ranges if column not in access.equality]
+    return list(accesses.values())
+
+
+def core_models_by_table():
+    return {
+        model._meta.db_table: model
+        for model in apps.get_app_config('core').get_models(include_auto_created=True)
+    }
+
+
+def model_indexes(model):
+    """Column lists of the indexes the model declares (pk, unique, db_index, FKs, Meta)"""
+    meta = model._meta
+    columns_for = {f.name: f.column for f in meta.concrete_fields}
+    indexes = []
+    for f in meta.concrete_fields:
+        if f.primary_key or f.unique or f.db_index:
+            indexes.append(([f.column], f.primary_key or f.unique))
+    for fields in meta.unique_together:
+        indexes.append(([columns_for[name] for name in fields], True))
+    for index in meta.indexes:
+        indexes.append(([columns_for[name.lstrip('-')] for name in index.fields], False))
+    for constraint in meta.constraints:
+        if isinstance(constraint, models.UniqueConstraint) and constraint.fields:
+            indexes.append(([columns_for[name] for name in constraint.fields], True))
+    return indexes
+
+
+def database_indexes(connection, table):
+    """Column lists of the indexes that actually exist in the database"""
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+    return [
+        (info['columns'], bool(info['unique'] or info['primary_key']))
+        for info in constraints.values()
+        if info['columns'] and (info['index'] or info['unique'] or info['primary_key'])
+    ]
+
+
+def table_statistics(connection, table, columns, sample=100000):
+    """
+    Return (row count, {column: distinct values}). PostgreSQL uses the planner
+    statistics from pg_class/pg_stats; other backends count distinct values in
+    a sample of at most `sample` rows.
+    """
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s', [table])
+            row = cursor.fetchone()
+            row_count = max(int(row[0]), 0) if row else 0
+            cursor.execute('SELECT attname, n_distinct FROM pg_stats WHERE tablename = %s', [table])
+            distinct = {}
+            for name, n_distinct in cursor.fetchall():
+                # Negative n_distinct is a fraction of the row count
+                distinct[name] = -n_distinct * row_count if n_distinct < 0 else n_distinct
+            return row_count, {column: distinct.get(column) for column in columns}
+
+        cursor.execute(f'SELECT COUNT(*) FROM {quote(table)}')
+        row_count = cursor.fetchone()[0]
+        distinct = {}
+        for column in columns:
+            cursor.execute(
+                f'SELECT COUNT(DISTINCT {quote(column)}) FROM (SELECT {quote(column)} FROM {quote(table)} LIMIT %s) sample',
+                [sample],
+            )
+            sampled = cursor.fetchone()[0]
+            # Scale up columns that look unique within the sample
+            distinct[column] = row_count if sampled >= min(row_count, sample) else sampled
+        return row_count, distinct
+
+
+@dataclass
+class IndexAdvice:
+    model: type
+    columns: list
+    descending: set
+    queries: int = 0
+    total_ms: float = 0.0
+    example: str = ''
+    row_count: int = None
+    selectivity: float = None
+
+    @property
+    def field_names(self):
+        by_column = {f.column: f.name for f in self.model._meta.concrete_fields}
+        return [('-' if column in self.descending else '') + by_column.get(column, column) for column in self.columns]
+
+    def as_index(self):
+        index = models.Index(fields=self.field_names)
+        index.set_name_with_model(self.model)
+        return index
+
+
+def _is_covered(candidate, equality_count, indexes):
+    """Check whether an existing index serves the candidate's leading columns"""
+    equality = set(candidate[:equality_count])
+    for columns, unique in indexes:
+        if unique and len(columns) == 1 and columns[0] in equality:
+            return True
+        if len(columns) < len(candidate):
+            continue
+        if set(columns[:equality_count]) == equality and columns[equality_count:len(candidate)] == candidate[equality_count:]:
+            return True
+    return False
+
+
+def advise(statements, connection, sample=100000):
+    """
+    Propose indexes for (sql, duration_ms) pairs. Candidates follow the
+    equality-sort-range rule: equality columns (most selective first), then
+    the ORDER BY columns, then the first range column.
+    """
+    tables = core_models_by_table()
+    existing_tables = set(connection.introspection.table_names())
+    grouped = {}
+    for sql, duration_ms in statements:
+        for access in parse_statement(sql):
+            model = tables.get(access.table)
+            if model is None or not (access.equality or access.ranges or access.ordering):
+                continue
+            key = (access.table, tuple(access.equality), tuple(access.ranges), tuple(access.ordering))
+            entry = grouped.setdefault(key, {'access': access, 'model': model, 'queries': 0, 'total_ms': 0.0, 'example': sql})
+            entry['queries'] += 1
+            entry['total_ms'] += duration_ms or 0.0
+
+    stats_cache = {}
+    advice = {}
+    for entry in grouped.values():
+        access, model = entry['access'], entry['model']
+        table = access.table
+        in_database = table in existing_tables
+        indexes = database_indexes(connection, table) if in_database else model_indexes(model)
+
+        row_count, distinct = None, {}
+        if in_database:
+            columns = access.equality + access.ranges
+            cache_key = (table, tuple(columns))
+            if cache_key not in stats_cache:
+                stats_cache[cache_key] = table_statistics(connection, table, columns, sample)
+            row_count, distinct = stats_cache[cache_key]
+
+        equality = sorted(access.equality, key=lambda column: -(distinct.get(column) or 0))
+        ordering = [column for column, _ in access.ordering if column not in equality]
+        candidate = equality + ordering
+        if access.ranges and not ordering:
+            candidate.append(access.ranges[0])
+        if not candidate or _is_covered(candidate, len(equality), indexes):
+            continue
+
+        selectivity = None
+        if row_count and equality:
+            selectivity = 1.0
+            for column in equality:
+                selectivity /= max(distinct.get(column) or 1, 1)
+
+        key = (table, tuple(candidate))
+        item = advice.get(key)
+        if item is None:
+            item = advice[key] = IndexAdvice(
+                model=model,
+                columns=candidate,
+                descending={column for column, descending in access.ordering if descending},
+                example=entry['example'],
+                row_count=row_count,
+                selectivity=selectivity,
+            )
+        item.queries += entry['queries']
+        item.total_ms += entry['total_ms']
+
+    return sorted(advice.values(), key=lambda item: (-item.total_ms, -item.queries))
+
+
+def load_statements(path):
+    """
+    Read captured SQL from a connection.queries JSON dump ([{"sql", "time"}]),
+    JSON lines, or a plain log with one statement per line.
+    """
+    with open(path) as handle:
+        text = handle.read()
+    try:
+        data = json.loads(text)
+    except ValueError:
+        rows = []
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                rows.append({'sql': line})
+    else:
+        rows = data if isinstance(data, list) else [data]
+
+    statements = []
+    for row in rows:
+        if isinstance(row, str):
+            statements.append((row, 0.0))
+        elif isinstance(row, dict) and row.get('sql'):
+            # connection.queries stores time in seconds as a string
+            statements.append((row['sql'], float(row.get('time') or 0) * 1000))
+    return statements
@@ -0,0 +1,71 @@
+from crispy_forms.templatetags.crispy_forms_filters import as_crispy_field, as_crispy_form
+from django.conf import settings
+from django.template import TemplateDoesNotExist
+from django.template.backends.jinja2 import Jinja2
+from django.template.defaultfilters import date, pluralize, truncatewords
+from django.templatetags.static import static
+from django.urls import reverse
+from jinja2 import ChainableUndefined, Environment, pass_context
+
+from .images import responsive_image
+from .preload import add_preload
+from .timing import TimedTemplate
+
+
+def url(name, *args, **kwargs):
+    return reverse(name, args=args or None, kwargs=kwargs or None)
+
+
+def widthratio(value, max_value, max_width):
+    """Equivalent of {% widthratio %}: value / max_value * max_width, rounded"""
+    try:
+        value, max_value = float(value), float(max_value)
+    except (TypeError, ValueError):
+        return ''
+    if max_value == 0:
+        return 0
+    return round(value / max_value * int(max_width))
+
+
+@pass_context
+def preload(context, name, kind, versioned=True):
+    """Equivalent of {% preload %}"""
+    request = context.get('request')
+    if request is not None:
+        add_preload(request, name, kind, versioned)
+    return ''
+
+
+def environment(**options):
+    # Missing variables render empty, as they do in Django templates
+    options.setdefault('undefined', ChainableUndefined)
+    env = Environment(**options)
+    env.globals.update(url=url, static=static, widthratio=widthratio, preload=preload, responsive_image=responsive_image)
+    env.filters.update(
+        crispy=as_crispy_form,
+        as_crispy_field=as_crispy_field,
+        pluralize=pluralize,
+        date=date,
+        truncatewords=truncatewords,
+    )
+    return env
+
+
+class SelectiveJinja2(Jinja2):
+    """
+    Jinja2 backend for the hottest list and dashboard templates. Jinja2
+    versions live under core/jinja2/ with the same names as their Django
+    counterparts, and are only served for names listed in JINJA2_TEMPLATES;
+    other names fall through to the Django engine, so each page can be
+    switched and benchmarked on its own. Renders feed the 'template' timing
+    phase like TimedDjangoTemplates.
+    """
+
+    def get_template(self, template_name):
+        if template_name not in getattr(settings, 'JINJA2_TEMPLATES', ()):
+            raise TemplateDoesNotExist(template_name, backend=self)
+        return TimedTemplate(super().get_template(template_name))
+
+    def get_template_unfiltered(self, template_name):
+        """Load the Jinja2 version regardless of JINJA2_TEMPLATES (for benchmarks)"""
+        return TimedTemplate(super().get_template(template_name))
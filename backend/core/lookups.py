@@ -0,0 +1,20 @@
+from django.db.models import Lookup
+from django.db.models.lookups import In
+
+
+class AnyOf(Lookup):
+    """
+    `lhs = ANY(%s)` on PostgreSQL, binding the values as one array parameter
+    however many there are; IN (...) elsewhere. Used as a filter() argument:
+    Model.objects.filter(AnyOf(F('user_id'), ids)).
+    """
+
+    lookup_name = 'any'
+    prepare_rhs = False
+
+    def as_sql(self, compiler, connection):
+        return In(self.lhs, self.rhs).as_sql(compiler, connection)
+
+    def as_postgresql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        return f'{lhs} = ANY(%s)', (*lhs_params, list(self.rhs))
@@ -0,0 +1,80 @@
+import json
+import platform
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from core.benchmarks import ENDPOINTS, benchmark_context, benchmark_users, find_regressions, load_results, run_endpoint
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the Kindlewick, teacher hub, analytics and school admin endpoints under concurrency, '
+        'save JSON results and fail on regressions against a baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Measured requests per endpoint (default: 50)')
+        parser.add_argument('--concurrency', type=int, default=8, help='Parallel clients per endpoint (default: 8)')
+        parser.add_argument('--warmup', type=int, default=2, help='Unmeasured requests per endpoint first (default: 2)')
+        parser.add_argument('--only', action='append', default=[], help='Only endpoints whose name contains this text')
+        parser.add_argument('--student', help='Username to request student endpoints as')
+        parser.add_argument('--teacher', help='Username to request teacher endpoints as')
+        parser.add_argument('--school-admin', help='Username to request school admin endpoints as')
+        parser.add_argument('--output', help='Results file (default: benchmarks/api-<timestamp>.json)')
+        parser.add_argument('--baseline', help='Earlier results file to compare against')
+        parser.add_argument('--threshold', type=float, default=0.2, help='Allowed p95/query growth as a fraction (default: 0.2)')
+        parser.add_argument('--min-delta-ms', type=float, default=5.0, help='Ignore p95 changes smaller than this (default: 5)')
+
+    def handle(self, *args, **options):
+        users = benchmark_users(options['student'], options['teacher'], options['school_admin'])
+        context = benchmark_context(users)
+        endpoints = [
+            endpoint for endpoint in ENDPOINTS
+            if not options['only'] or any(text in endpoint.name for text in options['only'])
+        ]
+        if not endpoints:
+            raise CommandError('No endpoints match --only')
+
+        results = {
+            'created': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'users': {role: user.username for role, user in users.items() if user},
+            'endpoints': {},
+        }
+        header = f"{'endpoint':<26} {'p50':>8} {'p95':>8} {'p99':>8} {'req/s':>7} {'queries':>8} {'errors':>6}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for endpoint in endpoints:
+            user = users.get(endpoint.role)
+            path = endpoint.path(context)
+            if user is None or path is None:
+                self.stdout.write(f'{endpoint.name:<26} skipped (no {endpoint.role} or test data)')
+                continue
+            result = run_endpoint(user, path, options['requests'], options['concurrency'], options['warmup'])
+            results['endpoints'][endpoint.name] = result
+            self.stdout.write(
+                f"{endpoint.name:<26} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} "
+                f"{result['throughput_rps']:>7.1f} {result['queries_mean']:>8.1f} {result['errors']:>6}"
+            )
+
+        output = Path(options['output'] or settings.BASE_DIR / 'benchmarks' / f"api-{timezone.now():%Y%m%d-%H%M%S}.json")
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(results, indent=2))
+        self.stdout.write(f'Results written to {output}')
+
+        if options['baseline']:
+            regressions = find_regressions(
+                load_results(options['baseline']), results, options['threshold'], options['min_delta_ms'],
+            )
+            if regressions:
+                for regression in regressions:
+                    self.stderr.write(regression)
+                raise CommandError(f'{len(regressions)} regression(s) against {options["baseline"]}')
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
@@ -0,0 +1,110 @@
+import json
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.middleware.gzip import GZipMiddleware
+from django.template.loader import render_to_string
+from django.test import Client
+from django.utils import timezone
+from django.utils.text import compress_string
+
+from core import middleware
+from core.middleware import BREACH_SENSITIVE_CONTENT_TYPES, compress_bytes, content_type_allowed
+from core.models import KindlewickGameProgress
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare bytes saved against CPU cost for gzip and brotli on representative responses, '
+        'compressed as CompressionMiddleware serves them'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=300, help='Rows in the synthetic Kindlewick feeds (default: 300)')
+        parser.add_argument('--repeat', type=int, default=20, help='Compressions per measurement (default: 20)')
+        parser.add_argument('--path', action='append', default=[], help='Also benchmark the anonymous response for this URL path')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        # name -> (body, content type)
+        payloads = {
+            'sessions_feed (json)': (self._sessions_feed(rng, options['rows']), 'application/json'),
+            'home page (html)': (render_to_string('core/home.html').encode(), 'text/html'),
+        }
+        client = Client(HTTP_HOST='localhost')
+        for path in options['path']:
+            response = client.get(path)
+            if response.streaming:
+                body = b''.join(response.streaming_content)
+            else:
+                body = response.content
+            payloads[f'{path} ({response.status_code})'] = (body, response.get('Content-Type', ''))
+
+        # GZipMiddleware always compresses at level 6
+        variants = [('gzip', 6)]
+        if middleware.brotli is not None:
+            variants += [('br', 1), ('br', 4), ('br', 11)]
+        else:
+            self.stdout.write(self.style.WARNING('brotli is not installed; only gzip will be measured'))
+
+        header = f"{'payload':<28} {'encoding':<9} {'original':>10} {'compressed':>11} {'saved':>7} {'ms/resp':>8}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for name, (body, content_type) in payloads.items():
+            gzip_only = content_type_allowed(content_type, BREACH_SENSITIVE_CONTENT_TYPES)
+            for encoding, level in variants:
+                if encoding == 'br' and gzip_only:
+                    continue
+                compressed, elapsed = self._measure(body, encoding, level, options['repeat'])
+                saved = 100 * (1 - len(compressed) / len(body)) if body else 0
+                self.stdout.write(
+                    f'{name[:28]:<28} {encoding + "-" + str(level):<9} {len(body):>10} '
+                    f'{len(compressed):>11} {saved:>6.1f}% {elapsed * 1000:>8.2f}'
+                )
+            if gzip_only and middleware.brotli is not None:
+                self.stdout.write(f'{name[:28]:<28} {"br":<9} gzip only, never brotli-encoded (BREACH)')
+
+    def _measure(self, body, encoding, level, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            if encoding == 'gzip':
+                compressed = compress_string(body, max_random_bytes=GZipMiddleware.max_random_bytes)
+            else:
+                compressed = compress_bytes(body, level)
+        return compressed, (time.perf_counter() - start) / repeat
+
+    def _sessions_feed(self, rng, rows):
+        """Build a payload shaped like the school-admin Kindlewick sessions feed"""
+        game_types = KindlewickGameProgress.GAME_TYPES
+        now = timezone.now()
+        feed = []
+        for index in range(rows):
+            game_type, game_type_display = rng.choice(game_types)
+            student_id = rng.randint(1, rows // 10 + 1)
+            created = now - timedelta(minutes=rng.randint(1, 60 * 24 * 30))
+            feed.append({
+                'id': index + 1,
+                'user': student_id,
+                'user_detail': {
+                    'id': student_id,
+                    'username': f'student{student_id}',
+                    'first_name': f'First{student_id}',
+                    'last_name': f'Last{student_id}',
+                    'email': '',
+                    'role': 'student',
+                },
+                'game_type': game_type,
+                'game_type_display': game_type_display,
+                'level': rng.randint(1, 10),
+                'score': rng.randint(0, 500),
+                'tokens_earned': rng.randint(0, 50),
+                'playtime': rng.randint(30, 1800),
+                'completed': rng.random() < 0.6,
+                'session_data': {'checkpoint': rng.randint(0, 5)},
+                'created_at': created.isoformat(),
+                'finished_at': (created + timedelta(minutes=5)).isoformat(),
+            })
+        return json.dumps(feed).encode()
@@ -0,0 +1,76 @@
+import json
+from pathlib import Path
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.template import engines
+from django.test import RequestFactory
+from django.utils import timezone
+
+from core.models import User
+from core.templating import benchmark_template, core_template_names, django_engines, jinja2_template_names, sample_context
+
+
+class Command(BaseCommand):
+    help = (
+        'Time cold compile and render (p50/p95) of every template under core/templates/core, '
+        'or compare the Django and Jinja2 versions of the hot templates on identical contexts'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50, help='Renders per template (default: 50)')
+        parser.add_argument('--only', action='append', default=[], help='Only templates whose name contains this text')
+        parser.add_argument('--user', help='Username to render as (default: anonymous)')
+        parser.add_argument('--rows', type=int, default=100, help='Rows in the sample contexts of list templates (default: 100)')
+        parser.add_argument('--compare-jinja2', action='store_true', help='Benchmark templates that have a Jinja2 version with both engines')
+        parser.add_argument('--output', help='Also write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        if options['compare_jinja2']:
+            if 'jinja2' not in engines:
+                raise CommandError('Jinja2 is not installed')
+            candidates, engine_names = jinja2_template_names(), ['django', 'jinja2']
+        else:
+            candidates, engine_names = core_template_names(), ['django']
+        names = [name for name in candidates if not options['only'] or any(text in name for text in options['only'])]
+        if not names:
+            raise CommandError('No templates match --only')
+        request = RequestFactory().get('/')
+        request.user = User.objects.get(username=options['user']) if options['user'] else AnonymousUser()
+        selected = {'django': django_engines()[0]}
+        if 'jinja2' in engine_names:
+            selected['jinja2'] = engines['jinja2']
+
+        results = {engine: {} for engine in engine_names}
+        header = f"{'template':<40} {'engine':<7} {'compile':>9} {'p50':>8} {'p95':>8} {'bytes':>8}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for name in names:
+            for engine_name in engine_names:
+                # Each engine gets a freshly built context so neither benefits from the other's queries
+                context = sample_context(name, request.user, options['rows'])
+                result = results[engine_name][name] = benchmark_template(
+                    selected[engine_name], name, request, context, options['iterations'],
+                )
+                if 'error' in result:
+                    self.stdout.write(f"{name:<40} {engine_name:<7} {self.style.ERROR(result['error'][:60])}")
+                    continue
+                self.stdout.write(
+                    f"{name:<40} {engine_name:<7} {result['compile_ms']:>9.2f} {result['p50_ms']:>8.2f} "
+                    f"{result['p95_ms']:>8.2f} {result['bytes']:>8}"
+                )
+            if len(engine_names) == 2 and 'p50_ms' in results['django'][name] and 'p50_ms' in results['jinja2'][name]:
+                speedup = results['django'][name]['p50_ms'] / max(results['jinja2'][name]['p50_ms'], 0.001)
+                self.stdout.write(f"{'':<40} django p50 / jinja2 p50 = {speedup:.2f}")
+
+        if options['output']:
+            path = Path(options['output'])
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps({
+                'created': timezone.now().isoformat(),
+                'iterations': options['iterations'],
+                'rows': options['rows'],
+                'user': options['user'],
+                'engines': results,
+            }, indent=2))
+            self.stdout.write(f'Results written to {path}')
@@ -0,0 +1,29 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from core.images import build_derivatives, image_derivatives
+from core.models import ForumPost, HelpTutorial, TeachingResource
+
+
+class Command(BaseCommand):
+    help = 'Build the resized WebP/JPEG copies of uploaded images that do not have them yet (or all, with --force)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Rebuild images that already have derivatives')
+
+    def handle(self, *args, **options):
+        built = skipped = failed = 0
+        for model in (TeachingResource, ForumPost, HelpTutorial):
+            names = model.objects.exclude(image='').exclude(image__isnull=True).values_list('image', flat=True)
+            for name in names.distinct().iterator():
+                if not options['force'] and image_derivatives(name) is not None:
+                    skipped += 1
+                    continue
+                if not default_storage.exists(name):
+                    self.stderr.write(f'Missing upload: {name}')
+                    failed += 1
+                    continue
+                manifest = build_derivatives(name)
+                self.stdout.write(f"{name}: {', '.join(f'{width}w' for width in manifest['widths'])}")
+                built += 1
+        self.stdout.write(f'Built {built}, already built {skipped}, missing {failed}')
@@ -0,0 +1,69 @@
+import json
+import shutil
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.management.base import BaseCommand, CommandError
+
+from core.storage import file_sha256
+from core.tiles import TILE_FORMATS, build_pyramid, pyramid_version
+
+
+class Command(BaseCommand):
+    help = (
+        'Slice the large Kindlewick images into Deep Zoom tile pyramids with JSON manifests '
+        '(only images whose content changed are re-tiled; run before collectstatic)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('images', nargs='*', help='Static names to tile (default: KINDLEWICK_TILE_SOURCES)')
+        parser.add_argument('--tile-size', type=int, default=256)
+        parser.add_argument('--overlap', type=int, default=1)
+        parser.add_argument('--format', choices=sorted(TILE_FORMATS), default='webp')
+        parser.add_argument('--force', action='store_true', help='Re-tile even if the image is unchanged')
+
+    def handle(self, *args, **options):
+        tiles_dir = Path(settings.KINDLEWICK_TILES_DIR)
+        index_path = tiles_dir / 'index.json'
+        index = json.loads(index_path.read_text()) if index_path.exists() else {}
+
+        for name in options['images'] or settings.KINDLEWICK_TILE_SOURCES:
+            source = finders.find(name)
+            if source is None:
+                raise CommandError(f'Static file not found: {name}')
+            key = Path(name).stem
+            output_dir = tiles_dir / key
+            manifest_path = output_dir / 'manifest.json'
+            version = pyramid_version(file_sha256(source), options['tile_size'], options['overlap'], options['format'])
+
+            current = json.loads(manifest_path.read_text()) if manifest_path.exists() else None
+            if (
+                not options['force'] and current is not None and current['version'] == version
+                and (output_dir / version).is_dir()
+            ):
+                self.stdout.write(f'{name}: unchanged ({version})')
+            else:
+                if (output_dir / version).is_dir():
+                    shutil.rmtree(output_dir / version)
+                manifest = {'source': name, **build_pyramid(
+                    source, output_dir, options['tile_size'], options['overlap'], options['format'],
+                )}
+                manifest_path.write_text(json.dumps(manifest, indent=2))
+                tiles = sum(level['columns'] * level['rows'] for level in manifest['levels'])
+                self.stdout.write(f"{name}: {len(manifest['levels'])} levels, {tiles} tiles ({version})")
+                current = manifest
+            # Earlier builds are only referenced by stale manifests
+            for stale in output_dir.iterdir():
+                if stale.is_dir() and stale.name != version:
+                    shutil.rmtree(stale)
+
+            index[key] = {
+                'source': name,
+                'manifest': f'{key}/manifest.json',
+                'version': version,
+                'width': current['width'],
+                'height': current['height'],
+            }
+
+        index_path.write_text(json.dumps(index, indent=2, sort_keys=True))
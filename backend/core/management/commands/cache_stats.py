@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.cache import NAMESPACES, cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Show cache hit/miss counts per namespace (roster, analytics, content) across all workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--bump', action='append', default=[], metavar='NAMESPACE',
+            help='Bump a namespace version, invalidating every key in it (repeatable)',
+        )
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after showing them')
+
+    def handle(self, *args, **options):
+        namespaces = {cache.namespace: cache for cache in NAMESPACES}
+        for name in options['bump']:
+            if name not in namespaces:
+                raise CommandError(f"Unknown namespace '{name}'; choose from {', '.join(namespaces)}")
+            version = namespaces[name].bump()
+            self.stdout.write(f'Bumped {name} to version {version}')
+
+        totals = cache_stats.totals(list(namespaces))
+        self.stdout.write(f"{'namespace':<12}{'version':>8}{'local':>10}{'shared':>10}{'miss':>10}{'hit ratio':>11}")
+        for name, counts in totals.items():
+            lookups = sum(counts.values())
+            hits = counts['local_hit'] + counts['shared_hit']
+            ratio = f'{hits / lookups:.1%}' if lookups else '-'
+            self.stdout.write(
+                f"{name:<12}{namespaces[name].version():>8}{counts['local_hit']:>10}"
+                f"{counts['shared_hit']:>10}{counts['miss']:>10}{ratio:>11}"
+            )
+
+        if options['reset']:
+            cache_stats.reset(list(namespaces))
+            self.stdout.write('Counters reset')
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.uploads import clear_stale_uploads
+
+
+class Command(BaseCommand):
+    help = 'Delete chunked resource uploads (and their partial files) that have been idle for --hours'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help='Idle time after which an upload is abandoned')
+
+    def handle(self, *args, **options):
+        cleared = clear_stale_uploads(options['hours'])
+        self.stdout.write(f'Cleared {cleared} stale uploads')
@@ -0,0 +1,49 @@
+import os
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from core.storage import UNMANAGED_MEDIA_DIRS, DeduplicatedStorage, file_sha256
+
+
+class Command(BaseCommand):
+    help = 'Move files uploaded before DeduplicatedStorage into the blob store, linking duplicates to one copy'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be freed')
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, DeduplicatedStorage):
+            raise CommandError("STORAGES['default'] is not core.storage.DeduplicatedStorage")
+
+        root = default_storage.location
+        files = freed = 0
+        seen = set()
+        for directory, subdirectories, filenames in os.walk(root):
+            if directory == root:
+                subdirectories[:] = [name for name in subdirectories if name not in UNMANAGED_MEDIA_DIRS]
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                if os.stat(path).st_nlink > 1:
+                    # Already a link to a blob
+                    continue
+                name = os.path.relpath(path, root).replace(os.sep, '/')
+                files += 1
+                if options['dry_run']:
+                    digest = file_sha256(path)
+                    if digest in seen or default_storage.exists(default_storage.blob_name(digest, name)):
+                        freed += os.path.getsize(path)
+                    seen.add(digest)
+                    continue
+                saved = default_storage.deduplicate(name)
+                if saved:
+                    self.stdout.write(f'{name}: duplicate, {saved} bytes freed')
+                freed += saved
+
+        orphans = 0
+        if not options['dry_run']:
+            for blob in default_storage.orphaned_blobs():
+                default_storage.delete(blob)
+                orphans += 1
+        verb = 'would free' if options['dry_run'] else 'freed'
+        self.stdout.write(f'{files} files checked, {verb} {freed} bytes, removed {orphans} unreferenced blobs')
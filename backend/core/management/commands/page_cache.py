@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+
+from core.cache import anonymous_page_key, content_cache
+from core.http_cache import purge_surrogate_keys
+
+
+class Command(BaseCommand):
+    help = 'Purge and/or warm the anonymous full-page cache and its edge copies (run --purge --warm on deploy)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('pages', nargs='*', help='URL names to act on (default: all of ANONYMOUS_PAGE_CACHE_TTLS)')
+        parser.add_argument('--purge', action='store_true', help='Delete the cached pages')
+        parser.add_argument('--warm', action='store_true', help='Render the pages into the cache')
+
+    def handle(self, *args, **options):
+        if not (options['purge'] or options['warm']):
+            raise CommandError('Pass --purge, --warm or both')
+        ttls = getattr(settings, 'ANONYMOUS_PAGE_CACHE_TTLS', {})
+        pages = options['pages'] or list(ttls)
+        unknown = sorted(set(pages) - set(ttls))
+        if unknown:
+            raise CommandError(f"Not cached pages: {', '.join(unknown)}")
+
+        factory = RequestFactory()
+        for name in pages:
+            path = reverse(name)
+            if options['purge']:
+                content_cache.delete(anonymous_page_key(path))
+                purge_surrogate_keys([f'page-{name}'])
+                self.stdout.write(f'Purged {path}')
+            if options['warm']:
+                # Call the view directly: the request is anonymous, so no middleware state is needed
+                request = factory.get(path)
+                request.user = AnonymousUser()
+                request.resolver_match = match = resolve(path)
+                response = match.func(request, *match.args, **match.kwargs)
+                cached = content_cache.get(anonymous_page_key(path)) is not None
+                self.stdout.write(
+                    f"Warmed {path} ({response.status_code}, {len(response.content)} bytes, "
+                    f"{'cached' if cached else 'NOT cached'} for {ttls[name]}s)"
+                )
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.index_advisor import advise, load_statements
+from core.models import SlowQuery
+
+
+class Command(BaseCommand):
+    help = 'Propose Meta.indexes additions for core models from captured query fingerprints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', action='append', default=[],
+                            help='connection.queries JSON dump, JSON lines or plain SQL log (repeatable)')
+        parser.add_argument('--slow-log', action='store_true',
+                            help='Use statements recorded in the SlowQuery table (default when no --file is given)')
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--min-queries', type=int, default=1,
+                            help='Ignore candidates seen in fewer statements (default: 1)')
+        parser.add_argument('--sample', type=int, default=100000,
+                            help='Rows sampled per column for distinct counts on non-PostgreSQL backends')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        statements = []
+        for path in options['file']:
+            statements.extend(load_statements(path))
+        if options['slow_log'] or not options['file']:
+            statements.extend(SlowQuery.objects.using(options['database']).values_list('sql', 'duration_ms'))
+
+        if not statements:
+            self.stdout.write('No captured statements to analyse.')
+            return
+
+        advice = [item for item in advise(statements, connection, options['sample']) if item.queries >= options['min_queries']]
+        self.stdout.write(f'Analysed {len(statements)} statements.\n')
+        if not advice:
+            self.stdout.write(self.style.SUCCESS('Existing indexes cover every filter and sort seen.'))
+            return
+
+        for item in advice:
+            meta = item.model._meta
+            rows = f'~{item.row_count:,} rows' if item.row_count is not None else 'table statistics unavailable'
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{meta.label} ({meta.db_table}, {rows})'))
+            index = item.as_index()
+            self.stdout.write(f"    models.Index(fields={index.fields!r}, name='{index.name}'),")
+            detail = f'    {item.queries} statement(s), {item.total_ms:.1f}ms recorded'
+            if item.selectivity is not None:
+                detail += f'; equality selectivity {item.selectivity:.4%} (~{item.selectivity * item.row_count:,.0f} rows per lookup)'
+                if item.selectivity > 0.2:
+                    detail += ' - low selectivity, index may not be used'
+            self.stdout.write(detail)
+            if options['verbosity'] > 1:
+                self.stdout.write(f'    e.g. {item.example[:300]}')
+            self.stdout.write('')
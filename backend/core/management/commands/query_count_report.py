@@ -0,0 +1,45 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarks import load_query_count_history
+
+
+class Command(BaseCommand):
+    help = (
+        'Show per-endpoint query counts over time from the history the query guard tests append to '
+        '(run them with QUERY_COUNT_REPORT=<file>)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file', default=str(settings.BASE_DIR / 'benchmarks' / 'query-counts.jsonl'),
+            help='History file (default: benchmarks/query-counts.jsonl)',
+        )
+        parser.add_argument('--last', type=int, default=5, help='Number of most recent runs to show (default: 5)')
+        parser.add_argument('--size', default='large', help='Data size column to show (default: large)')
+        parser.add_argument('--changed', action='store_true', help='Only show endpoints whose count changed')
+
+    def handle(self, *args, **options):
+        path = Path(options['file'])
+        if not path.exists():
+            raise CommandError(f'{path} does not exist; run the tests with QUERY_COUNT_REPORT={path}')
+        runs = load_query_count_history(path)[-options['last']:]
+        if not runs:
+            raise CommandError(f'{path} is empty')
+
+        size = options['size']
+        labels = [run['label'] or run['created'][:16] for run in runs]
+        endpoints = sorted({name for run in runs for name in run['counts']})
+        width = max(len(name) for name in endpoints)
+        self.stdout.write(f"{'endpoint':<{width}}  " + '  '.join(f'{label[-16:]:>16}' for label in labels))
+        for name in endpoints:
+            values = [run['counts'].get(name, {}).get(size) for run in runs]
+            known = [value for value in values if value is not None]
+            if options['changed'] and len(set(known)) <= 1:
+                continue
+            line = f'{name:<{width}}  ' + '  '.join(f"{'-' if value is None else value:>16}" for value in values)
+            if len(known) > 1 and known[-1] > known[0]:
+                line = self.style.WARNING(line)
+            self.stdout.write(line)
@@ -0,0 +1,365 @@
+import multiprocessing
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, time as dt_time, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+
+from core.cache import roster_cache
+from core.models import (
+    User, Class, ClassStudent, Avatar, KindlewickGameProgress, KindlewickGameSession,
+    TeachingResource, ResourceComment, ForumPost, ForumReply,
+)
+
+FIRST_NAMES = ['Amelia', 'Oliver', 'Isla', 'George', 'Ava', 'Noah', 'Mia', 'Arthur', 'Freya', 'Leo',
+               'Lily', 'Oscar', 'Ivy', 'Harry', 'Sophia', 'Jack', 'Rosie', 'Theo', 'Grace', 'Alfie']
+LAST_NAMES = ['Smith', 'Jones', 'Taylor', 'Brown', 'Williams', 'Wilson', 'Johnson', 'Davies', 'Patel',
+              'Robinson', 'Wright', 'Thompson', 'Evans', 'Walker', 'White', 'Roberts', 'Green', 'Hall']
+COLOURS = ['#FF6B9D', '#FFB347', '#FF1493', '#4A90E2', '#7ED321', '#9013FE', '#50E3C2', '#F5A623']
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """Let bulk_create keep our generated dates instead of auto_now(_add) overwriting them"""
+    saved = [(f, f.auto_now, f.auto_now_add) for f in fields]
+    for f in fields:
+        f.auto_now = f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f, auto_now, auto_now_add in saved:
+            f.auto_now, f.auto_now_add = auto_now, auto_now_add
+
+
+def timestamp_fields():
+    return [
+        model._meta.get_field(name)
+        for model, names in (
+            (User, ['created_at']),
+            (Class, ['created_at']),
+            (ClassStudent, ['date_joined']),
+            (Avatar, ['created_at', 'updated_at']),
+            (KindlewickGameProgress, ['last_played', 'created_at']),
+            (KindlewickGameSession, ['created_at']),
+            (TeachingResource, ['created_at', 'updated_at']),
+            (ResourceComment, ['created_at', 'updated_at']),
+            (ForumPost, ['created_at', 'updated_at']),
+            (ForumReply, ['created_at', 'updated_at']),
+        )
+        for name in names
+    ]
+
+
+class SchoolSeeder:
+    """Generate one school's data from its own RNG so output is independent of worker count"""
+
+    def __init__(self, options, school_index, password_hash):
+        self.options = options
+        self.index = school_index
+        self.rng = random.Random(f"{options['seed']}:{school_index}")
+        self.prefix = f"seed{options['seed']}_s{school_index}"
+        self.school = f"Seed School {options['seed']}-{school_index}"
+        self.password_hash = password_hash
+        self.end = options['end']
+        self.database = options['database']
+        self.batch_size = options['batch_size']
+        self.counts = Counter()
+
+    def when(self, max_days):
+        return self.end - timedelta(seconds=self.rng.randint(0, max_days * 86400))
+
+    def bulk(self, model, objects):
+        created = model.objects.using(self.database).bulk_create(objects, batch_size=self.batch_size)
+        self.counts[model.__name__] += len(objects)
+        return created
+
+    def make_user(self, username, role, joined):
+        return User(
+            username=username,
+            password=self.password_hash,
+            first_name=self.rng.choice(FIRST_NAMES),
+            last_name=self.rng.choice(LAST_NAMES),
+            email=f'{username}@example.com' if role != 'student' else '',
+            role=role,
+            school=self.school,
+            is_staff=role in ('teacher', 'school_admin'),
+            date_joined=joined,
+            created_at=joined,
+        )
+
+    def create_users(self, users):
+        created = self.bulk(User, users)
+        if all(user.pk for user in created):
+            return created
+        # Backends that cannot return ids from bulk inserts
+        by_username = User.objects.using(self.database).in_bulk([u.username for u in users], field_name='username')
+        return [by_username[u.username] for u in users]
+
+    def run(self):
+        o = self.options
+        with transaction.atomic(using=self.database):
+            admin_and_teachers = [self.make_user(f'{self.prefix}_admin', 'school_admin', self.when(400))]
+            admin_and_teachers += [
+                self.make_user(f'{self.prefix}_t{t}', 'teacher', self.when(400))
+                for t in range(o['teachers_per_school'])
+            ]
+            teachers = self.create_users(admin_and_teachers)[1:]
+
+            classes = self.bulk(Class, [
+                Class(
+                    name=f'{self.rng.choice(["Oak", "Ash", "Elm", "Willow", "Birch"])} {t}-{c}',
+                    teacher=teacher,
+                    subject=self.rng.choice(Class.SUBJECT_CHOICES)[0],
+                    year_ks=self.rng.choice(Class.KEY_STAGE_CHOICES)[0],
+                    description='Seeded class',
+                    created_at=self.when(365),
+                )
+                for t, teacher in enumerate(teachers)
+                for c in range(o['classes_per_teacher'])
+            ])
+            if not all(clazz.pk for clazz in classes):
+                classes = list(Class.objects.using(self.database).filter(teacher__in=teachers).order_by('id'))
+
+            students = self.create_users([
+                self.make_user(f'{self.prefix}_c{c}_p{p}', 'student', self.when(365))
+                for c in range(len(classes))
+                for p in range(o['students_per_class'])
+            ])
+            per_class = o['students_per_class']
+            self.bulk(ClassStudent, [
+                ClassStudent(student=student, clazz=classes[i // per_class], date_joined=student.created_at)
+                for i, student in enumerate(students)
+            ])
+            self.bulk(Avatar, [self.make_avatar(student) for student in students])
+            self.seed_game_data(students)
+            self.seed_community(teachers)
+        return self.counts
+
+    def make_avatar(self, student):
+        return Avatar(
+            user=student,
+            body_type=self.rng.choice(Avatar.BODY_TYPES)[0],
+            body_color=self.rng.choice(COLOURS),
+            eye_type=self.rng.choice(Avatar.EYE_TYPES)[0],
+            mouth_type=self.rng.choice(Avatar.MOUTH_TYPES)[0],
+            head_decoration=self.rng.choice(Avatar.DECORATION_TYPES)[0],
+            decoration_color=self.rng.choice(COLOURS),
+            pattern=self.rng.choice(Avatar.PATTERN_TYPES)[0],
+            pattern_color=self.rng.choice(COLOURS),
+            created_at=student.created_at,
+            updated_at=student.created_at,
+        )
+
+    def seed_game_data(self, students):
+        game_types = [choice[0] for choice in KindlewickGameProgress.GAME_TYPES]
+        sessions_per_student = self.options['sessions_per_student']
+        progress, sessions = [], []
+        for student in students:
+            totals = {}
+            for _ in range(sessions_per_student):
+                game_type = self.rng.choice(game_types)
+                level = self.rng.randint(1, 10)
+                started = self.when(180)
+                completed = self.rng.random() < 0.7
+                playtime = self.rng.randint(30, 1500)
+                score = self.rng.randint(0, 500) if completed else self.rng.randint(0, 100)
+                tokens = score // 20
+                sessions.append(KindlewickGameSession(
+                    user=student,
+                    game_type=game_type,
+                    level=level,
+                    score=score,
+                    tokens_earned=tokens,
+                    playtime=playtime,
+                    completed=completed,
+                    session_data={'checkpoint': self.rng.randint(0, 5)},
+                    created_at=started,
+                    finished_at=started + timedelta(seconds=playtime) if completed else None,
+                ))
+                total = totals.setdefault(game_type, [0, 0, 0, 0, started])
+                total[0] = max(total[0], level)
+                total[1] += score
+                total[2] += tokens
+                total[3] += playtime
+                total[4] = max(total[4], started)
+                if len(sessions) >= self.batch_size:
+                    self.bulk(KindlewickGameSession, sessions)
+                    sessions = []
+            for game_type, (level, score, tokens, playtime, last_played) in totals.items():
+                progress.append(KindlewickGameProgress(
+                    user=student,
+                    game_type=game_type,
+                    current_level=level,
+                    score=score,
+                    tokens_earned=tokens,
+                    total_playtime=playtime,
+                    completed=level >= 10,
+                    last_played=last_played,
+                    created_at=student.created_at,
+                ))
+        self.bulk(KindlewickGameSession, sessions)
+        self.bulk(KindlewickGameProgress, progress)
+
+    def seed_community(self, teachers):
+        o = self.options
+        resources = []
+        for t, teacher in enumerate(teachers):
+            for r in range(o['resources_per_teacher']):
+                created = self.when(365)
+                published = self.rng.random() < 0.85
+                resources.append(TeachingResource(
+                    title=f'Seeded resource {t}-{r}',
+                    slug=f'{self.prefix}-resource-{t}-{r}'.replace('_', '-'),
+                    author=teacher,
+                    content='<p>Seeded teaching resource content.</p>' * 5,
+                    excerpt='Seeded teaching resource',
+                    resource_type=self.rng.choice(TeachingResource.RESOURCE_TYPE_CHOICES)[0],
+                    key_stage=self.rng.randint(1, 4),
+                    subject=self.rng.choice(['English', 'Maths']),
+                    status='published' if published else 'draft',
+                    featured=self.rng.random() < 0.1,
+                    created_at=created,
+                    updated_at=created,
+                    published_at=created if published else None,
+                ))
+        resources = self.bulk(TeachingResource, resources)
+        if resources and not all(resource.pk for resource in resources):
+            resources = list(TeachingResource.objects.using(self.database).filter(author__in=teachers))
+
+        Like = TeachingResource.likes.through
+        self.bulk(Like, [
+            Like(teachingresource=resource, user=teacher)
+            for resource in resources
+            for teacher in self.rng.sample(teachers, self.rng.randint(0, len(teachers)))
+        ])
+        self.bulk(ResourceComment, [
+            ResourceComment(
+                resource=resource,
+                author=self.rng.choice(teachers),
+                content='Seeded comment',
+                created_at=resource.created_at,
+                updated_at=resource.created_at,
+            )
+            for resource in resources
+            for _ in range(o['comments_per_resource'])
+        ])
+
+        posts = []
+        for t, teacher in enumerate(teachers):
+            for p in range(o['posts_per_teacher']):
+                created = self.when(365)
+                posts.append(ForumPost(
+                    title=f'Seeded discussion {t}-{p}',
+                    author=teacher,
+                    content='<p>Seeded forum post.</p>',
+                    views=self.rng.randint(0, 500),
+                    created_at=created,
+                    updated_at=created,
+                ))
+        posts = self.bulk(ForumPost, posts)
+        if posts and not all(post.pk for post in posts):
+            posts = list(ForumPost.objects.using(self.database).filter(author__in=teachers))
+        self.bulk(ForumReply, [
+            ForumReply(
+                post=post,
+                author=self.rng.choice(teachers),
+                content='<p>Seeded reply.</p>',
+                created_at=post.created_at,
+                updated_at=post.created_at,
+            )
+            for post in posts
+            for _ in range(o['replies_per_post'])
+        ])
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def _seed_school(args):
+    options, school_index, password_hash = args
+    with explicit_timestamps(*timestamp_fields()):
+        return SchoolSeeder(options, school_index, password_hash).run()
+
+
+class Command(BaseCommand):
+    help = 'Generate deterministic school-scale data (users, classes, games, forum, resources) for performance work'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schools', type=int, default=1)
+        parser.add_argument('--teachers-per-school', type=int, default=10)
+        parser.add_argument('--classes-per-teacher', type=int, default=2)
+        parser.add_argument('--students-per-class', type=int, default=30)
+        parser.add_argument('--sessions-per-student', type=int, default=20)
+        parser.add_argument('--resources-per-teacher', type=int, default=3)
+        parser.add_argument('--comments-per-resource', type=int, default=2)
+        parser.add_argument('--posts-per-teacher', type=int, default=1)
+        parser.add_argument('--replies-per-post', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=1, help='Same seed and --end-date produce identical data')
+        parser.add_argument('--end-date', help='Latest generated timestamp, YYYY-MM-DD (default: today)')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--workers', type=int, default=1, help='Processes to seed schools in parallel (not SQLite)')
+        parser.add_argument('--password', default='password123', help='Password set on every seeded account')
+        parser.add_argument('--clear', action='store_true', help='Delete data previously seeded with this --seed first')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        end_date = datetime.strptime(options['end_date'], '%Y-%m-%d').date() if options['end_date'] else timezone.now().date()
+        options['end'] = timezone.make_aware(datetime.combine(end_date, dt_time.max.replace(microsecond=0)), timezone.get_current_timezone())
+
+        prefix = f"seed{options['seed']}_s"
+        existing = User.objects.using(options['database']).filter(username__startswith=prefix)
+        if options['clear']:
+            deleted, _ = existing.delete()
+            self.stdout.write(f'Deleted {deleted} previously seeded rows.')
+        elif existing.exists():
+            raise CommandError(f"Data for --seed {options['seed']} already exists; use --clear or another seed.")
+
+        workers = options['workers']
+        if workers > 1 and connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING('SQLite allows one writer at a time; seeding with a single process.'))
+            workers = 1
+
+        # Hash once: PBKDF2 per account would dominate the run time
+        password_hash = make_password(options['password'])
+        seed_options = {key: value for key, value in options.items() if key not in ('stdout', 'stderr')}
+        tasks = [(seed_options, index, password_hash) for index in range(options['schools'])]
+
+        totals = Counter()
+        start = time.perf_counter()
+        if workers > 1:
+            # Child processes must open their own connections
+            connections.close_all()
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as pool:
+                for done, counts in enumerate(pool.map(_seed_school, tasks), start=1):
+                    totals.update(counts)
+                    self._progress(done, len(tasks), totals, start)
+        else:
+            for done, task in enumerate(tasks, start=1):
+                totals.update(_seed_school(task))
+                self._progress(done, len(tasks), totals, start)
+
+        # bulk_create sends no post_save, so the roster signals never fired
+        roster_cache.bump()
+
+        elapsed = time.perf_counter() - start
+        rows = sum(totals.values())
+        self.stdout.write(self.style.SUCCESS(f'Seeded {rows:,} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s)'))
+        for model_name, count in sorted(totals.items()):
+            self.stdout.write(f'  {model_name:<32} {count:>12,}')
+
+    def _progress(self, done, total, totals, start):
+        # Roughly twenty progress lines however many schools there are
+        if done == total or done % max(total // 20, 1) == 0:
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f'  {done}/{total} schools, {sum(totals.values()):,} rows, {elapsed:.1f}s')
@@ -0,0 +1,46 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.storage import ASSET_REPORT_NAME
+
+
+class Command(BaseCommand):
+    help = 'Show static file sizes before and after collectstatic post-processing (compression, WebP/AVIF)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='', help="Only files whose name starts with this (e.g. 'kindlewick/')")
+        parser.add_argument('--limit', type=int, default=20, help='Largest files to list (default: 20)')
+
+    def handle(self, *args, **options):
+        path = os.path.join(settings.STATIC_ROOT, ASSET_REPORT_NAME)
+        try:
+            with open(path) as report_file:
+                report = json.load(report_file)
+        except FileNotFoundError:
+            raise CommandError(f'{path} not found; run collectstatic first')
+
+        assets = {name: sizes for name, sizes in report['assets'].items() if name.startswith(options['prefix'])}
+        header = f"{'file':<48} {'original':>10} {'gzip':>10} {'br':>10} {'webp':>10} {'avif':>10} {'saved':>7}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        largest = sorted(assets.items(), key=lambda item: item[1]['original'], reverse=True)[:options['limit']]
+        for name, sizes in largest:
+            columns = ' '.join(f"{sizes.get(label, '-'):>10}" for label in ('original', 'gzip', 'br', 'webp', 'avif'))
+            self.stdout.write(f'{name[-48:]:<48} {columns} {self._saved(sizes):>6.1f}%')
+
+        total = {
+            'original': sum(sizes['original'] for sizes in assets.values()),
+            'smallest': sum(sizes['smallest'] for sizes in assets.values()),
+        }
+        self.stdout.write('-' * len(header))
+        self.stdout.write(
+            f"{len(assets)} files: {total['original']} bytes before, {total['smallest']} after "
+            f"({self._saved(total):.1f}% saved)"
+        )
+
+    @staticmethod
+    def _saved(sizes):
+        return 100 * (1 - sizes['smallest'] / sizes['original']) if sizes['original'] else 0
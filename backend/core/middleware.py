@@ -0,0 +1,472 @@
+import logging
+import mimetypes
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.middleware.gzip import GZipMiddleware
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; fall back to gzip only
+    brotli = None
+
+from .cache import is_anonymous_request
+from .http_cache import surrogate_keys_for
+from .preload import learned_links
+from .profiling import profile_request
+from .queries import QueryRecorder, SlowQueryLogger, record_queries
+from .replicas import replica_alias
+from .storage import IMAGE_VARIANT_SOURCES, IMAGE_VARIANTS
+from .timing import collect_timings, db_execute_timer
+
+performance_logger = logging.getLogger('core.performance')
+
+
+DEFAULT_COMPRESSION_CONTENT_TYPES = (
+    'text/*',
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+)
+# Responses that may reflect user input next to a secret (CSRF tokens);
+# see CompressionMiddleware
+BREACH_SENSITIVE_CONTENT_TYPES = ('text/html',)
+
+
+def _accepted_encodings(accept_encoding):
+    """Parse an Accept-Encoding header into {coding: q-value}"""
+    accepted = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+def choose_encoding(accept_encoding, allow_brotli=True):
+    """Pick the best supported encoding for a request, preferring brotli"""
+    accepted = _accepted_encodings(accept_encoding)
+    for coding in ('br', 'gzip'):
+        if coding == 'br' and (brotli is None or not allow_brotli):
+            continue
+        if accepted.get(coding, accepted.get('*', 0)) > 0:
+            return coding
+    return None
+
+
+def content_type_allowed(content_type, allowed_types):
+    """Check a Content-Type header against an allow-list supporting 'type/*'"""
+    media_type = content_type.split(';', 1)[0].strip().lower()
+    for allowed in allowed_types:
+        if allowed.endswith('/*'):
+            if media_type.startswith(allowed[:-1]):
+                return True
+        elif media_type == allowed:
+            return True
+    return False
+
+
+class StreamCompressor:
+    """Incremental brotli compressor (gzip is left to GZipMiddleware)"""
+
+    def __init__(self, quality=4):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        """Emit everything buffered so far so streamed chunks reach the client"""
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+def compress_bytes(data, brotli_quality=4):
+    compressor = StreamCompressor(brotli_quality)
+    return compressor.compress(data) + compressor.finish()
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Compress dynamic responses (JSON feeds, exports, HTML) with brotli or gzip.
+
+    WhiteNoise already serves precompressed static files, so this only handles
+    responses produced by views. Responses are skipped when they are below
+    COMPRESSION_MIN_SIZE, already carry a Content-Encoding, or have a content
+    type outside COMPRESSION_CONTENT_TYPES (which keeps PNGs, PDFs and other
+    already-compressed media untouched). StreamingHttpResponse bodies are
+    compressed chunk by chunk.
+
+    Gzip is left to Django's GZipMiddleware, which pads the gzip header by a
+    random length against BREACH. Brotli has no such padding, so pages that
+    may carry CSRF tokens (BREACH_SENSITIVE_CONTENT_TYPES) are only gzipped.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 512)
+        self.content_types = getattr(settings, 'COMPRESSION_CONTENT_TYPES', DEFAULT_COMPRESSION_CONTENT_TYPES)
+        self.brotli_quality = getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 4)
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding') or response.has_header('Content-Range'):
+            return response
+        if response.status_code in (204, 304):
+            return response
+        content_type = response.get('Content-Type', '')
+        if not content_type_allowed(content_type, self.content_types):
+            return response
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+
+        encoding = choose_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''),
+            allow_brotli=not content_type_allowed(content_type, BREACH_SENSITIVE_CONTENT_TYPES),
+        )
+        if encoding == 'gzip':
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            compressor = StreamCompressor(self.brotli_quality)
+            if response.is_async:
+                response.streaming_content = self._acompress_stream(response.streaming_content, compressor)
+            else:
+                response.streaming_content = self._compress_stream(response.streaming_content, compressor)
+            # The compressed length is unknown until the stream is exhausted
+            if response.has_header('Content-Length'):
+                del response.headers['Content-Length']
+        else:
+            compressed = compress_bytes(response.content, self.brotli_quality)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # A strong ETag must not match a different representation
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    @staticmethod
+    def _compress_stream(chunks, compressor):
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+
+    @staticmethod
+    async def _acompress_stream(chunks, compressor):
+        async for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+
+
+class QueryBudgetMiddleware:
+    """
+    Opt-in per-request query budget and N+1 detector.
+
+    A sample of requests (QUERY_BUDGET_SAMPLE_RATE) is run with a QueryRecorder
+    installed on every connection. A warning is logged to 'core.performance'
+    when a request exceeds the budget for its URL name (QUERY_BUDGETS, falling
+    back to QUERY_BUDGET_DEFAULT) or repeats one statement fingerprint at least
+    QUERY_BUDGET_REPEAT_THRESHOLD times, along with the offending call stacks.
+    Unsampled requests pay for a single random() call.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_BUDGET_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'QUERY_BUDGET_SAMPLE_RATE', 1.0)
+        self.budgets = getattr(settings, 'QUERY_BUDGETS', {})
+        self.default_budget = getattr(settings, 'QUERY_BUDGET_DEFAULT', 50)
+        self.repeat_threshold = getattr(settings, 'QUERY_BUDGET_REPEAT_THRESHOLD', 5)
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        recorder = QueryRecorder(capture_stacks_after=self.repeat_threshold)
+        with record_queries(recorder):
+            response = self.get_response(request)
+        self.report(request, recorder)
+        return response
+
+    def report(self, request, recorder):
+        match = getattr(request, 'resolver_match', None)
+        url_name = match.view_name if match and match.view_name else request.path
+        budget = self.budgets.get(url_name, self.default_budget)
+        repeated = recorder.repeated(self.repeat_threshold)
+
+        performance_logger.debug(
+            '%s %s: %d queries in %.1fms', request.method, url_name, recorder.count, recorder.duration * 1000
+        )
+        if recorder.count <= budget and not repeated:
+            return
+
+        lines = [
+            f'Query budget exceeded for {request.method} {request.path} ({url_name}): '
+            f'{recorder.count} queries (budget {budget}), {recorder.duration * 1000:.1f}ms in the database'
+        ]
+        for key, count in repeated:
+            lines.append(f'  repeated {count}x: {key}')
+            if key in recorder.stacks:
+                lines.append(recorder.stacks[key].rstrip())
+        performance_logger.warning('\n'.join(lines))
+
+
+class ServerTimingMiddleware:
+    """
+    Add a Server-Timing header breaking the request down into db, cache,
+    template, serialize and total, for staff users only.
+
+    Enabled by SERVER_TIMING_ENABLED. Cache, template and serialize phases
+    come from the Timed* cache backend, template backend and DRF renderers in
+    core.timing; phases can overlap (e.g. lazy querysets evaluated while a
+    template renders count towards both db and template).
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SERVER_TIMING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with collect_timings() as timings, ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(db_execute_timer))
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            response.headers['Server-Timing'] = timings.server_timing(total)
+        return response
+
+
+class ProfilerMiddleware:
+    """
+    Profile a single request on demand for superusers.
+
+    Triggered by the PROFILER_HEADER header (default X-Profile) or the
+    PROFILER_QUERY_PARAM query flag (default __profile). A value of 'sample'
+    selects the pyinstrument sampling profiler when it is installed; anything
+    else uses cProfile. Output is saved under PROFILER_DIR, capped at
+    PROFILER_MAX_FILES, browsable at /admin/profiles/, and the saved name is
+    returned in an X-Profile-Id header. Requests without the trigger only pay
+    for a header and query-string lookup.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILER_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.header = 'HTTP_' + getattr(settings, 'PROFILER_HEADER', 'X-Profile').upper().replace('-', '_')
+        self.query_param = getattr(settings, 'PROFILER_QUERY_PARAM', '__profile')
+
+    def __call__(self, request):
+        mode = request.META.get(self.header) or request.GET.get(self.query_param)
+        if not mode:
+            return self.get_response(request)
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_superuser:
+            return self.get_response(request)
+
+        response, name = profile_request(self.get_response, request, mode)
+        if name is None:
+            performance_logger.warning('Profile skipped for %s: another profile is in progress', request.path)
+        else:
+            response.headers['X-Profile-Id'] = name
+        return response
+
+
+class SlowQueryLogMiddleware:
+    """
+    Record statements slower than SLOW_QUERY_THRESHOLD_MS, with EXPLAIN plans,
+    into the SlowQuery table (browsable in the admin). Enabled by
+    SLOW_QUERY_LOG_ENABLED; see core.queries.SlowQueryLogger.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SLOW_QUERY_LOG_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold_ms = getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', 200)
+        self.analyze_rate = getattr(settings, 'SLOW_QUERY_EXPLAIN_ANALYZE_RATE', 0.0)
+        self.max_rows = getattr(settings, 'SLOW_QUERY_LOG_MAX_ROWS', 1000)
+
+    def __call__(self, request):
+        logger = SlowQueryLogger(request, self.threshold_ms, self.analyze_rate, self.max_rows)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(logger))
+            try:
+                return self.get_response(request)
+            finally:
+                # ATOMIC_REQUESTS has committed or rolled back by now
+                logger.flush()
+
+
+class ReplicaPinningMiddleware:
+    """
+    Read-your-writes for the read replica: after a successful POST, PUT,
+    PATCH or DELETE the browser gets a short-lived cookie, and @use_replica
+    views read from the primary while it is present. Only active when a
+    replica database is configured (DATABASE_REPLICA_URL).
+    """
+
+    def __init__(self, get_response):
+        if replica_alias() not in settings.DATABASES:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.cookie = getattr(settings, 'REPLICA_PIN_COOKIE', 'db_pin')
+        self.seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 15)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE') and response.status_code < 400:
+            response.set_cookie(self.cookie, '1', max_age=self.seconds, httponly=True, samesite='Lax')
+        return response
+
+
+class HttpCachePolicyMiddleware:
+    """
+    Cache-Control, Vary and Surrogate-Key headers by URL name, so an edge
+    cache or reverse proxy can serve public pages and media. Policies are
+    defined in HTTP_CACHE_POLICIES and assigned in HTTP_CACHE_URL_POLICIES.
+
+    Only successful GET/HEAD responses that set no cookies are made public,
+    and (unless the policy says otherwise) only for anonymous visitors;
+    everyone else gets `private, no-cache` on those URLs. Surrogate keys come
+    from core.http_cache.SURROGATE_KEY_BUILDERS, and the edge copies are
+    purged by key when the underlying content is saved.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.policies = getattr(settings, 'HTTP_CACHE_POLICIES', {})
+        self.url_policies = getattr(settings, 'HTTP_CACHE_URL_POLICIES', {})
+        self.header = getattr(settings, 'SURROGATE_KEY_HEADER', 'Surrogate-Key')
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        match = request.resolver_match
+        policy_name = self.url_policies.get(match.url_name) if match else None
+        if policy_name is None or response.has_header('Cache-Control'):
+            return response
+
+        policy = dict(self.policies[policy_name])
+        anonymous_only = policy.pop('anonymous_only', True)
+        if anonymous_only:
+            patch_vary_headers(response, ('Cookie',))
+        keys = None
+        if (
+            request.method in ('GET', 'HEAD') and response.status_code == 200 and not response.cookies
+            and (not anonymous_only or is_anonymous_request(request))
+        ):
+            keys = surrogate_keys_for(request)
+        if keys is None:
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+
+        patch_cache_control(response, **policy)
+        response.headers[self.header] = ' '.join(keys)
+        return response
+
+
+class PreloadMiddleware:
+    """
+    Send the static assets a page declares with {% preload %} as a
+    `Link: rel=preload` header on its HTML responses and, where the server
+    supports it (gunicorn's wsgi.early_hints), as 103 Early Hints before the
+    view runs, so the browser fetches CSS, scripts and hero images while the
+    page is still being built. Early Hints use the links learned from the
+    page's last render in this process; EARLY_HINTS_ENABLED turns them off.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.early_hints = getattr(settings, 'EARLY_HINTS_ENABLED', True)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        send_early_hints = request.META.get('wsgi.early_hints')
+        links = learned_links.get(request.resolver_match.url_name)
+        if self.early_hints and send_early_hints is not None and links:
+            send_early_hints([('Link', ', '.join(links))])
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        match = request.resolver_match
+        if match is None or response.status_code != 200:
+            return response
+        links = getattr(request, 'preload_links', None)
+        if links:
+            learned_links[match.url_name] = links
+        else:
+            # Cached pages are not rendered
+            links = learned_links.get(match.url_name)
+        if links and response.get('Content-Type', '').startswith('text/html') and not response.has_header('Link'):
+            response['Link'] = ', '.join(links)
+        return response
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise, plus content negotiation for the WebP/AVIF copies of large
+    PNGs written by core.storage.OptimizedStaticFilesStorage. A copy is
+    served, as the static file it is with its own Content-Type, ETag and
+    Last-Modified, when the Accept header prefers its media type to the
+    PNG's; responses for the PNG's URL carry Vary: Accept either way.
+    """
+
+    def __call__(self, request):
+        url = request.path_info
+        if not url.lower().endswith(IMAGE_VARIANT_SOURCES):
+            return super().__call__(request)
+        variants = {}
+        for suffix, (media_type, _, _) in IMAGE_VARIANTS.items():
+            static_file = self.find_static_file(url + suffix)
+            if static_file is not None:
+                variants[media_type] = static_file
+        if not variants:
+            return super().__call__(request)
+        # The original's type comes first, so */* alone or image/avif;q=0 keeps the PNG
+        preferred = request.get_preferred_type([mimetypes.guess_type(url)[0], *variants])
+        if preferred in variants:
+            response = self.serve(variants[preferred], request)
+        else:
+            response = super().__call__(request)
+        patch_vary_headers(response, ['Accept'])
+        return response
+
+    def find_static_file(self, url):
+        # As WhiteNoiseMiddleware.__call__ looks files up
+        return self.find_file(url) if self.autorefresh else self.files.get(url)
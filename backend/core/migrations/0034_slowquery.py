@@ -0,0 +1,36 @@
+# Generated by Django 6.0.1 on 2026-10-19 15:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0033_kindlewickgamesession_kindlewickgameprogress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sql', models.TextField()),
+                ('fingerprint', models.TextField(help_text='SQL with literals and parameters normalised')),
+                ('fingerprint_hash', models.CharField(db_index=True, max_length=40)),
+                ('params_hash', models.CharField(blank=True, help_text='Hash of the parameter values', max_length=16)),
+                ('duration_ms', models.FloatField()),
+                ('database', models.CharField(default='default', max_length=50)),
+                ('view', models.CharField(blank=True, max_length=255)),
+                ('path', models.CharField(blank=True, max_length=2048)),
+                ('stack', models.TextField(blank=True)),
+                ('plan', models.TextField(blank=True)),
+                ('analyzed', models.BooleanField(default=False, help_text='Plan captured with EXPLAIN ANALYZE')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Slow Query',
+                'verbose_name_plural': 'Slow Queries',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
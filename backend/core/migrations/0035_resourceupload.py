@@ -0,0 +1,36 @@
+# Generated by Django 6.0.1 on 2026-10-19 16:27
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0034_slowquery'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResourceUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255)),
+                ('size', models.BigIntegerField(help_text='Total bytes declared by the client')),
+                ('sha256', models.CharField(help_text='Expected SHA-256 of the whole file', max_length=64)),
+                ('offset', models.BigIntegerField(default=0, help_text='Bytes received so far')),
+                ('status', models.CharField(choices=[('uploading', 'Uploading'), ('complete', 'Complete'), ('failed', 'Failed')], default='uploading', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('resource', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='uploads', to='core.teachingresource')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resource_uploads', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Resource Upload',
+                'verbose_name_plural': 'Resource Uploads',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
@@ -220,6 +222,35 @@ class TeachingResource(models.Model):
         return self.likes.count()
 
 
+
+# ResourceUpload Model - Chunked, resumable upload of a resource's file
+class ResourceUpload(models.Model):
+    """Upload in progress for TeachingResource.file; see core.uploads"""
+    STATUS_CHOICES = (
+        ('uploading', 'Uploading'),
+        ('complete', 'Complete'),
+        ('failed', 'Failed'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    resource = models.ForeignKey(TeachingResource, on_delete=models.CASCADE, related_name='uploads')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='resource_uploads')
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField(help_text="Total bytes declared by the client")
+    sha256 = models.CharField(max_length=64, help_text="Expected SHA-256 of the whole file")
+    offset = models.BigIntegerField(default=0, help_text="Bytes received so far")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='uploading')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Resource Upload'
+        verbose_name_plural = 'Resource Uploads'
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
+
 # ForumPost Model - Community discussions
 class ForumPost(models.Model):
     title = models.CharField(max_length=255)
@@ -420,4 +451,28 @@ class KindlewickGameSession(models.Model):
         verbose_name_plural = 'Kindlewick Game Sessions'
     
     def __str__(self):
-        return f"{self.user.username} - {self.game_type} Level {self.level}"
\ No newline at end of file
+        return f"{self.user.username} - {self.game_type} Level {self.level}"
+
+# SlowQuery Model - Bounded log of slow SQL statements with EXPLAIN plans
+class SlowQuery(models.Model):
+    """Statement recorded by SlowQueryLogMiddleware above SLOW_QUERY_THRESHOLD_MS"""
+    sql = models.TextField()
+    fingerprint = models.TextField(help_text="SQL with literals and parameters normalised")
+    fingerprint_hash = models.CharField(max_length=40, db_index=True)
+    params_hash = models.CharField(max_length=16, blank=True, help_text="Hash of the parameter values")
+    duration_ms = models.FloatField()
+    database = models.CharField(max_length=50, default='default')
+    view = models.CharField(max_length=255, blank=True)
+    path = models.CharField(max_length=2048, blank=True)
+    stack = models.TextField(blank=True)
+    plan = models.TextField(blank=True)
+    analyzed = models.BooleanField(default=False, help_text="Plan captured with EXPLAIN ANALYZE")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Slow Query'
+        verbose_name_plural = 'Slow Queries'
+
+    def __str__(self):
+        return f"{self.duration_ms:.0f}ms {self.view or self.path}"
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.templatetags.static import static
+
+# URL name -> Link header values from the page's last render, so cached
+# responses get the header and the next request can send Early Hints before
+# the view runs. Kept per process; static asset URLs only change on deploy.
+learned_links = {}
+
+
+def preload_link(name, kind, versioned=True):
+    """
+    Link header value preloading a static file. `versioned=False` uses the
+    unhashed URL, for assets the Kindlewick bundle requests by that URL.
+    """
+    url = static(name) if versioned else settings.STATIC_URL + name
+    crossorigin = '; crossorigin' if kind == 'font' else ''
+    return f'<{url}>; rel=preload; as={kind}{crossorigin}'
+
+
+def add_preload(request, name, kind, versioned=True):
+    links = request.__dict__.setdefault('preload_links', [])
+    link = preload_link(name, kind, versioned)
+    if link not in links:
+        links.append(link)
@@ -0,0 +1,114 @@
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.text import slugify
+
+try:
+    import pyinstrument
+except ImportError:  # The sampling profiler is optional; cProfile is always available
+    pyinstrument = None
+
+PROFILE_EXTENSIONS = ('.prof', '.html')
+
+# cProfile uses sys.monitoring on Python 3.12+, which allows one active
+# profiler per process, so profiled requests are serialised.
+_profiler_lock = threading.Lock()
+
+
+def profile_dir():
+    return Path(getattr(settings, 'PROFILER_DIR', settings.BASE_DIR / 'profiles'))
+
+
+def profile_request(get_response, request, mode='cprofile'):
+    """
+    Run a request under cProfile (deterministic) or pyinstrument (sampling,
+    when installed) and save the output. Returns (response, profile name);
+    the name is None when another profile was already running.
+    """
+    if not _profiler_lock.acquire(blocking=False):
+        return get_response(request), None
+    try:
+        start = time.perf_counter()
+        if mode == 'sample' and pyinstrument is not None:
+            profiler = pyinstrument.Profiler()
+            profiler.start()
+            try:
+                response = get_response(request)
+            finally:
+                profiler.stop()
+            output, extension = profiler.output_html().encode(), '.html'
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                response = get_response(request)
+            finally:
+                profiler.disable()
+            output, extension = None, '.prof'
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        directory = profile_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        name = '{}-{}-{}-{:.0f}ms{}'.format(
+            timezone.now().strftime('%Y%m%d%H%M%S%f'),
+            request.method.lower(),
+            slugify(request.path.replace('/', '-'))[:80] or 'root',
+            elapsed_ms,
+            extension,
+        )
+        if output is None:
+            profiler.dump_stats(directory / name)
+        else:
+            (directory / name).write_bytes(output)
+        prune_profiles()
+        return response, name
+    finally:
+        _profiler_lock.release()
+
+
+def list_profiles():
+    """Return saved profiles, newest first, as dicts for the admin listing"""
+    directory = profile_dir()
+    if not directory.is_dir():
+        return []
+    profiles = []
+    for entry in os.scandir(directory):
+        if entry.is_file() and entry.name.endswith(PROFILE_EXTENSIONS):
+            stat = entry.stat()
+            profiles.append({
+                'name': entry.name,
+                'size': stat.st_size,
+                'modified': datetime.fromtimestamp(stat.st_mtime, tz=timezone.get_current_timezone()),
+            })
+    profiles.sort(key=lambda profile: profile['name'], reverse=True)
+    return profiles
+
+
+def prune_profiles():
+    """Delete the oldest profiles beyond PROFILER_MAX_FILES"""
+    max_files = getattr(settings, 'PROFILER_MAX_FILES', 50)
+    for profile in list_profiles()[max_files:]:
+        (profile_dir() / profile['name']).unlink(missing_ok=True)
+
+
+def get_profile_path(name):
+    """Resolve a profile name from the listing, refusing anything else"""
+    if name not in {profile['name'] for profile in list_profiles()}:
+        return None
+    return profile_dir() / name
+
+
+def format_stats(path, sort='cumulative', limit=80):
+    """Render a cProfile dump as the familiar pstats text table"""
+    stream = io.StringIO()
+    stats = pstats.Stats(str(path), stream=stream)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return stream.getvalue()
@@ -0,0 +1,197 @@
+import hashlib
+import logging
+import random
+import re
+import time
+import traceback
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+
+performance_logger = logging.getLogger('core.performance')
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r'\s+')
+_QUOTED_IDENTIFIER_RE = re.compile(r'"(?:[^"]|"")*"')
+# Statements EXPLAIN ANALYZE must not re-run: writes (including inside a CTE),
+# SELECT INTO, and row locks (FOR UPDATE / NO KEY UPDATE / SHARE / KEY SHARE)
+_WRITE_RE = re.compile(r'\b(?:INSERT|UPDATE|DELETE|MERGE|INTO|SHARE)\b', re.IGNORECASE)
+
+
+def fingerprint(sql):
+    """Normalise a SQL statement so queries differing only by literals compare equal"""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    return _WHITESPACE_RE.sub(' ', sql).strip()
+
+
+def project_stack(limit=8):
+    """Format the current call stack, keeping only frames from this project"""
+    base_dir = str(settings.BASE_DIR)
+    frames = [
+        frame for frame in traceback.extract_stack()[:-1]
+        if frame.filename.startswith(base_dir) and 'site-packages' not in frame.filename
+    ]
+    return ''.join(traceback.format_list(frames[-limit:]))
+
+
+class QueryRecorder:
+    """
+    Database execute wrapper that tallies query count, DB time and repeated
+    statement fingerprints. When capture_stacks_after is set, the call stack
+    is captured the first time a fingerprint repeats that many times, which
+    is where an N+1 loop usually lives.
+    """
+
+    def __init__(self, capture_stacks_after=None):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        self.stacks = {}
+        self.capture_stacks_after = capture_stacks_after
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            key = fingerprint(sql)
+            self.fingerprints[key] += 1
+            if self.capture_stacks_after and self.fingerprints[key] == self.capture_stacks_after:
+                self.stacks[key] = project_stack()
+
+    def repeated(self, threshold):
+        """Return (fingerprint, count) pairs executed at least threshold times"""
+        return [(key, count) for key, count in self.fingerprints.most_common() if count >= threshold]
+
+
+@contextmanager
+def record_queries(recorder=None):
+    """Install a QueryRecorder on every configured database connection"""
+    recorder = recorder or QueryRecorder()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        yield recorder
+
+
+# Set while the slow query log is writing, so its own statements are ignored
+_logging_slow_query = ContextVar('core_logging_slow_query', default=False)
+
+
+def is_read_only_select(sql):
+    """Whether `sql` is a plain SELECT that neither writes nor takes row locks"""
+    if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return False
+    sql = _QUOTED_IDENTIFIER_RE.sub('""', _STRING_RE.sub("''", sql))
+    return not _WRITE_RE.search(sql)
+
+
+def explain(connection, sql, params, analyze=False):
+    """
+    Return the vendor's EXPLAIN output for a SELECT, or '' for anything else.
+    ANALYZE executes the statement, so it is only used for read-only SELECTs;
+    others get a plain EXPLAIN.
+    """
+    if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return ''
+    if not connection.features.supports_explaining_query_execution:
+        return ''
+    analyze = analyze and is_read_only_select(sql)
+    options = {'analyze': True, 'buffers': True} if analyze else {}
+    prefix = connection.ops.explain_query_prefix(**options)
+    with connection.cursor() as cursor:
+        cursor.execute(f'{prefix} {sql}', params)
+        rows = cursor.fetchall()
+    return '\n'.join(' '.join(str(column) for column in row) for row in rows)
+
+
+class SlowQueryLogger:
+    """
+    Database execute wrapper that stores statements slower than threshold_ms
+    as SlowQuery rows, with the calling view, a parameter hash, the project
+    call stack and an EXPLAIN plan. A fraction (analyze_rate) of read-only
+    PostgreSQL SELECTs are explained with ANALYZE, which re-runs the statement. The table
+    is kept to max_rows by deleting everything older than the newest max_rows.
+
+    Rows are always written to the primary. A statement seen inside a
+    transaction is held until flush(), so the entry neither joins the
+    caller's transaction (and vanishes with its rollback) nor waits on it.
+    """
+
+    def __init__(self, request=None, threshold_ms=200, analyze_rate=0.0, max_rows=1000):
+        self.request = request
+        self.threshold_ms = threshold_ms
+        self.analyze_rate = analyze_rate
+        self.max_rows = max_rows
+        self.pending = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if _logging_slow_query.get():
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration_ms = (time.perf_counter() - start) * 1000
+        if duration_ms >= self.threshold_ms:
+            token = _logging_slow_query.set(True)
+            try:
+                self.record(context['connection'], sql, params, many, duration_ms)
+            except DatabaseError:
+                performance_logger.exception('Could not record slow query')
+            finally:
+                _logging_slow_query.reset(token)
+        return result
+
+    def record(self, connection, sql, params, many, duration_ms):
+        from .models import SlowQuery
+
+        analyze = (
+            connection.vendor == 'postgresql' and random.random() < self.analyze_rate and is_read_only_select(sql)
+        )
+        key = fingerprint(sql)
+        match = getattr(self.request, 'resolver_match', None)
+        # A savepoint keeps a failed EXPLAIN from aborting the caller's transaction
+        with transaction.atomic(using=connection.alias):
+            plan = '' if many else explain(connection, sql, params, analyze)
+        self.pending.append(SlowQuery(
+            sql=sql,
+            fingerprint=key,
+            fingerprint_hash=hashlib.sha1(key.encode()).hexdigest(),
+            params_hash=hashlib.sha1(repr(params).encode()).hexdigest()[:16] if params else '',
+            duration_ms=duration_ms,
+            database=connection.alias,
+            view=match.view_name if match else '',
+            path=self.request.path if self.request is not None else '',
+            stack=project_stack(),
+            plan=plan,
+            analyzed=bool(plan) and analyze,
+        ))
+        if not connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            self.flush()
+
+    def flush(self):
+        """Write the held entries to the primary; call once the caller's transaction has ended"""
+        from .models import SlowQuery
+
+        entries, self.pending = self.pending, []
+        if not entries:
+            return
+        token = _logging_slow_query.set(True)
+        try:
+            with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                for entry in entries:
+                    entry.save(using=DEFAULT_DB_ALIAS)
+                SlowQuery.objects.using(DEFAULT_DB_ALIAS).filter(id__lte=entry.id - self.max_rows).delete()
+        except DatabaseError:
+            performance_logger.exception('Could not record %d slow queries', len(entries))
+        finally:
+            _logging_slow_query.reset(token)
@@ -0,0 +1,132 @@
+import functools
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+from .queries import performance_logger
+
+# Set by @use_replica for the duration of a read-only view
+_reading_from_replica = ContextVar('core_reading_from_replica', default=False)
+
+# SQL returning the replica's replay lag in seconds; 0 when it has replayed
+# everything it received, so an idle primary does not look like lag
+POSTGRES_LAG_SQL = (
+    "SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0 "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+def replica_alias():
+    return getattr(settings, 'DATABASE_REPLICA_ALIAS', 'replica')
+
+
+class ReplicaHealth:
+    """
+    Cached per-process verdict on whether the replica can serve reads: it must
+    accept connections and lag at most REPLICA_MAX_LAG_SECONDS. The check runs
+    at most once every REPLICA_HEALTH_CHECK_INTERVAL seconds.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.healthy = False
+        self.checked_at = None
+
+    def is_healthy(self, alias):
+        interval = getattr(settings, 'REPLICA_HEALTH_CHECK_INTERVAL', 5)
+        with self.lock:
+            if self.checked_at is not None and time.monotonic() - self.checked_at < interval:
+                return self.healthy
+            self.checked_at = time.monotonic()
+        healthy = self.check(alias)
+        with self.lock:
+            if healthy != self.healthy:
+                log = performance_logger.info if healthy else performance_logger.warning
+                log('Read replica %s is %s', alias, 'serving reads' if healthy else 'unavailable; reading from primary')
+            self.healthy = healthy
+        return healthy
+
+    def check(self, alias):
+        max_lag = getattr(settings, 'REPLICA_MAX_LAG_SECONDS', 10)
+        connection = connections[alias]
+        try:
+            with connection.cursor() as cursor:
+                if connection.vendor != 'postgresql':
+                    return True
+                cursor.execute(POSTGRES_LAG_SQL)
+                lag = float(cursor.fetchone()[0])
+        except OperationalError:
+            return False
+        if lag > max_lag:
+            performance_logger.warning('Read replica %s is %.1fs behind (limit %ss)', alias, lag, max_lag)
+            return False
+        return True
+
+    def mark_down(self):
+        with self.lock:
+            self.healthy = False
+            self.checked_at = time.monotonic()
+
+
+replica_health = ReplicaHealth()
+
+
+def replica_available():
+    alias = replica_alias()
+    return alias in settings.DATABASES and replica_health.is_healthy(alias)
+
+
+def is_pinned_to_primary(request):
+    """True for a few seconds after this browser wrote, so it reads its own writes"""
+    return getattr(settings, 'REPLICA_PIN_COOKIE', 'db_pin') in request.COOKIES
+
+
+def use_replica(view_func):
+    """
+    Route the view's reads to the read replica, unless the requester is
+    pinned to the primary after a write or the replica is down or lagging.
+    A view that fails on the replica is retried once on the primary.
+    """
+    @functools.wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if is_pinned_to_primary(request) or not replica_available():
+            return view_func(request, *args, **kwargs)
+        token = _reading_from_replica.set(True)
+        try:
+            return view_func(request, *args, **kwargs)
+        except OperationalError:
+            performance_logger.exception('Read replica failed; retrying %s on the primary', request.path)
+            replica_health.mark_down()
+            _reading_from_replica.set(False)
+            return view_func(request, *args, **kwargs)
+        finally:
+            _reading_from_replica.reset(token)
+    return wrapper
+
+
+class ReplicaRouter:
+    """Send reads inside @use_replica views to the replica; everything else to the primary"""
+
+    def db_for_read(self, model, **hints):
+        if _reading_from_replica.get():
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica receives schema changes through replication
+        if db == replica_alias():
+            return False
+        return None
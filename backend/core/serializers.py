@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from .models import (
     User, Class, ClassStudent, Avatar,
-    KindlewickGameProgress, KindlewickGameSession
+    KindlewickGameProgress, KindlewickGameSession, ResourceUpload
 )
 
 class UserSerializer(serializers.ModelSerializer):
@@ -68,4 +68,13 @@ class KindlewickGameSessionAdminSerializer(serializers.ModelSerializer):
         model = KindlewickGameSession
         fields = ['id', 'user', 'user_detail', 'game_type', 'game_type_display', 'level', 'score', 
                   'tokens_earned', 'playtime', 'completed', 'session_data', 'created_at', 'finished_at']
-        read_only_fields = ['id', 'created_at']
\ No newline at end of file
+        read_only_fields = ['id', 'created_at']
+
+
+class ResourceUploadSerializer(serializers.ModelSerializer):
+    resource = serializers.SlugRelatedField(slug_field='slug', read_only=True)
+
+    class Meta:
+        model = ResourceUpload
+        fields = ['id', 'resource', 'filename', 'size', 'sha256', 'offset', 'status', 'created_at', 'updated_at']
+        read_only_fields = fields
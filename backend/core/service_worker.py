@@ -0,0 +1,47 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.utils.encoding import filepath_to_uri
+
+# Built once per staticfiles.json (keyed by its hash)
+_manifests = {}
+
+
+def _is_image(name):
+    return name.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.webp', '.avif'))
+
+
+def precache_manifest():
+    """
+    The Kindlewick service worker's asset list, from the static files
+    manifest: {'version': ..., 'assets': [{'name', 'url', 'original_url',
+    'size', 'precache'}]}. `url` is the hashed (immutable) URL the asset is
+    cached under; `original_url` is the unhashed one, which the game uses
+    for some images. The version only changes when a hash does.
+
+    Images are cached on first use rather than at install, so the request
+    carries the browser's own Accept header (and gets WebP/AVIF where
+    supported). Without a manifest (DEBUG) the list is empty.
+    """
+    hashed_files = getattr(staticfiles_storage, 'hashed_files', None) or {}
+    manifest_hash = getattr(staticfiles_storage, 'manifest_hash', '')
+    if manifest_hash in _manifests:
+        return _manifests[manifest_hash]
+
+    prefixes = tuple(getattr(settings, 'KINDLEWICK_PRECACHE_PREFIXES', ('kindlewick/',)))
+    excluded = tuple(getattr(settings, 'KINDLEWICK_PRECACHE_EXCLUDE', ()))
+    assets = []
+    for name, hashed_name in sorted(hashed_files.items()):
+        if not name.startswith(prefixes) or name.startswith(excluded) or not staticfiles_storage.exists(hashed_name):
+            continue
+        assets.append({
+            'name': name,
+            'url': settings.STATIC_URL + filepath_to_uri(hashed_name),
+            'original_url': settings.STATIC_URL + filepath_to_uri(name),
+            'size': staticfiles_storage.size(hashed_name),
+            'precache': not _is_image(name),
+        })
+    version = hashlib.sha256(' '.join(asset['url'] for asset in assets).encode()).hexdigest()[:12]
+    manifest = _manifests[manifest_hash] = {'version': version, 'assets': assets}
+    return manifest
@@ -0,0 +1,41 @@
+from django.core.files.storage import default_storage
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import roster_cache
+from .http_cache import instance_surrogate_keys, purge_surrogate_keys
+from .images import image_derivatives, queue_derivatives
+from .models import Class, ClassStudent, ForumPost, HelpTutorial, NewsAnnouncement, TeachingResource, User
+
+
+@receiver([post_save, post_delete], sender=Class)
+@receiver([post_save, post_delete], sender=ClassStudent)
+def invalidate_rosters(sender, **kwargs):
+    """Enrolment or class ownership changed; every cached roster may be stale."""
+    roster_cache.bump()
+
+
+@receiver(post_save, sender=User)
+def invalidate_rosters_for_user(sender, update_fields=None, **kwargs):
+    # Logging in only touches last_login, which no roster depends on
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    roster_cache.bump()
+
+
+@receiver([post_save, post_delete], sender=NewsAnnouncement)
+@receiver([post_save, post_delete], sender=HelpTutorial)
+@receiver([post_save, post_delete], sender=TeachingResource)
+def purge_edge_cache(sender, instance, **kwargs):
+    """Drop edge-cached copies of the item's detail page and its uploads."""
+    purge_surrogate_keys(instance_surrogate_keys(instance))
+
+
+@receiver(post_save, sender=TeachingResource)
+@receiver(post_save, sender=ForumPost)
+@receiver(post_save, sender=HelpTutorial)
+def build_image_derivatives(sender, instance, **kwargs):
+    """Resize a newly uploaded image for the list pages, off the request."""
+    name = instance.image.name if instance.image else None
+    if name and image_derivatives(name) is None and default_storage.exists(name):
+        queue_derivatives(name)
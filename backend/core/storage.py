@@ -0,0 +1,300 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from PIL import Image, features
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+from .cache import _MISSING, LocalLRU
+from .queries import performance_logger
+
+# Suffix appended to an image's name -> (media type, Pillow format, save
+# options). StaticFilesMiddleware serves these in place of the image to
+# browsers whose Accept header lists the media type.
+IMAGE_VARIANTS = {
+    '.avif': ('image/avif', 'AVIF', {'quality': 60}),
+    '.webp': ('image/webp', 'WEBP', {'quality': 85, 'method': 6}),
+}
+IMAGE_VARIANT_SOURCES = ('.png',)
+
+ASSET_REPORT_NAME = 'asset-report.json'
+
+# Files written next to a static file that may be served instead of it
+SERVED_VARIANTS = {'.br': 'br', '.gz': 'gzip', '.avif': 'avif', '.webp': 'webp'}
+
+# Under MEDIA_ROOT: one file per distinct upload, named by its SHA-256
+BLOB_DIR = 'blobs'
+# Under BLOB_DIR: <stored name>.sha256, the hash of each name linked to a blob
+HASH_DIR = 'hashes'
+# Under BLOB_DIR: <ab>/<sha256>/<filename>, symlinks to the blob that url() returns
+ALIAS_DIR = 'files'
+# Directories of MEDIA_ROOT that are not uploads (see core.uploads)
+UNMANAGED_MEDIA_DIRS = (BLOB_DIR, 'uploads')
+
+# Hash record path -> SHA-256 (or None), so url() does not read it each time.
+# Entries expire, so a name deleted and reused by another process is seen.
+_content_hashes = LocalLRU(max_entries=10000, timeout=300)
+
+
+class OptimizedStaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """
+    WhiteNoise's manifest storage (hashed names, gzip and brotli copies) with
+    two more collectstatic steps: WebP and AVIF copies of PNGs of at least
+    STATIC_IMAGE_VARIANT_MIN_BYTES, kept only when smaller than the PNG, and
+    asset-report.json listing every file's size before and after.
+    """
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # A few templates reference files that were never committed;
+            # render them with the unhashed URL (a 404) rather than failing the page
+            performance_logger.warning('Static file %s is missing from the manifest', name)
+            return name
+
+    def post_process(self, *args, **kwargs):
+        yield from super().post_process(*args, **kwargs)
+        if kwargs.get('dry_run'):
+            return
+        yield from self.create_image_variants()
+        self.save_asset_report()
+
+    def large_images(self):
+        min_bytes = getattr(settings, 'STATIC_IMAGE_VARIANT_MIN_BYTES', 100 * 1024)
+        for name, hashed_name in sorted(self.hashed_files.items()):
+            if name.lower().endswith(IMAGE_VARIANT_SOURCES) and self.size(hashed_name) >= min_bytes:
+                yield name, hashed_name
+
+    def create_image_variants(self):
+        for name, hashed_name in self.large_images():
+            with Image.open(self.path(hashed_name)) as image:
+                if image.mode not in ('RGB', 'RGBA'):
+                    image = image.convert('RGBA')
+                for suffix, (media_type, image_format, options) in IMAGE_VARIANTS.items():
+                    if not features.check(image_format.lower()):
+                        continue
+                    buffer = BytesIO()
+                    image.save(buffer, image_format, **options)
+                    if buffer.tell() >= self.size(hashed_name):
+                        continue
+                    # The unhashed name is served too (the game loads some images by absolute URL)
+                    for path in {name, hashed_name}:
+                        with open(self.path(path + suffix), 'wb') as variant:
+                            variant.write(buffer.getvalue())
+                        yield path, path + suffix, True
+
+    def save_asset_report(self):
+        assets = {}
+        for name, hashed_name in sorted(self.hashed_files.items()):
+            if not self.exists(hashed_name):
+                continue
+            sizes = {'original': self.size(hashed_name)}
+            for suffix, label in SERVED_VARIANTS.items():
+                if self.exists(hashed_name + suffix):
+                    sizes[label] = self.size(hashed_name + suffix)
+            sizes['smallest'] = min(sizes.values())
+            assets[name] = sizes
+        total = {
+            'original': sum(sizes['original'] for sizes in assets.values()),
+            'smallest': sum(sizes['smallest'] for sizes in assets.values()),
+        }
+        with open(self.path(ASSET_REPORT_NAME), 'w') as report:
+            json.dump({'total': total, 'assets': assets}, report, indent=2)
+        performance_logger.info(
+            'Static assets: %d bytes before post-processing, %d after', total['original'], total['smallest']
+        )
+
+
+class DeduplicatedStorage(FileSystemStorage):
+    """
+    Media storage that keeps each distinct file once, as
+    blobs/<ab>/<sha256><ext>, hashing uploads as they are written. The names
+    FileFields store are hard links to the blob, so existing paths, path()
+    and open() work as before; the blob's link count is its reference count,
+    and deleting the last name that points at it deletes the blob. Each
+    name's hash is kept beside the blobs, and url() is
+    blobs/files/<ab>/<sha256>/<filename>: a symlink to the blob, so any server
+    mapping MEDIA_URL to MEDIA_ROOT serves it, under a URL that never changes
+    and downloads with the stored filename.
+    """
+
+    def blob_name(self, digest, name):
+        return f'{BLOB_DIR}/{digest[:2]}/{digest}{os.path.splitext(name)[1].lower()}'
+
+    def alias_name(self, digest, name):
+        return f'{BLOB_DIR}/{ALIAS_DIR}/{digest[:2]}/{digest}/{os.path.basename(name)}'
+
+    def hash_path(self, name):
+        return self.path(f'{BLOB_DIR}/{HASH_DIR}/{name}.sha256')
+
+    def content_hash(self, name):
+        """SHA-256 of a stored file, recorded when it was saved or deduplicated"""
+        path = self.hash_path(name)
+        digest = _content_hashes.get(path)
+        if digest is _MISSING:
+            try:
+                with open(path) as recorded:
+                    digest = recorded.read()
+            except FileNotFoundError:
+                digest = None
+            # A write cut short leaves the name served under its own URL
+            if digest is not None and len(digest) != 64:
+                digest = None
+            _content_hashes.set(path, digest)
+        return digest
+
+    def url(self, name):
+        digest = self.content_hash(name) if name else None
+        return super().url(self.alias_name(digest, name) if digest else name)
+
+    def record_hash(self, name, digest):
+        """Remember `name`'s hash and give its blob an alias under the name's filename"""
+        path = self.hash_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as recorded:
+            recorded.write(digest)
+        alias = self.path(self.alias_name(digest, name))
+        os.makedirs(os.path.dirname(alias), exist_ok=True)
+        try:
+            # Relative, and a symlink so it does not count as a reference
+            os.symlink(os.path.relpath(self.path(self.blob_name(digest, name)), os.path.dirname(alias)), alias)
+        except FileExistsError:
+            pass
+        _content_hashes.set(path, digest)
+
+    def remove_aliases(self, digest):
+        shutil.rmtree(self.path(f'{BLOB_DIR}/{ALIAS_DIR}/{digest[:2]}/{digest}'), ignore_errors=True)
+
+    def _save(self, name, content):
+        staging = self.path(f'{BLOB_DIR}/tmp')
+        os.makedirs(staging, exist_ok=True)
+        fd, temp = tempfile.mkstemp(dir=staging)
+        try:
+            if hasattr(content, 'temporary_file_path'):
+                # Already on disk (large uploads, core.uploads): move it rather than copy
+                os.close(fd)
+                file_move_safe(content.temporary_file_path(), temp, allow_overwrite=True)
+                digest = file_sha256(temp)
+            else:
+                sha256 = hashlib.sha256()
+                with os.fdopen(fd, 'wb') as staged:
+                    for chunk in content.chunks():
+                        sha256.update(chunk)
+                        staged.write(chunk)
+                digest = sha256.hexdigest()
+            return self.link(name, temp, digest)
+        finally:
+            if os.path.exists(temp):
+                os.remove(temp)
+
+    def link(self, name, source, digest):
+        """
+        Point `name` (or the next available name) at the blob for `digest`,
+        storing `source` as that blob if there is none yet. `source` is left
+        for the caller to remove. Returns the name used.
+        """
+        blob = self.blob_name(digest, name)
+        os.makedirs(os.path.dirname(self.path(blob)), exist_ok=True)
+        os.makedirs(os.path.dirname(self.path(name)), exist_ok=True)
+        while True:
+            try:
+                os.link(source, self.path(blob))
+                self._chmod(self.path(blob))
+            except FileExistsError:
+                pass
+            try:
+                os.link(self.path(blob), self.path(name))
+            except FileExistsError:
+                name = self.get_available_name(name)
+            except FileNotFoundError:
+                # The blob's last reference was deleted in between; store it again
+                continue
+            else:
+                break
+        self.record_hash(name, digest)
+        return name
+
+    def _chmod(self, path):
+        if self.file_permissions_mode is not None:
+            os.chmod(path, self.file_permissions_mode)
+
+    def delete(self, name):
+        if not name:
+            raise ValueError('The name must be given to delete().')
+        path = self.path(name)
+        try:
+            links = os.stat(path).st_nlink
+        except FileNotFoundError:
+            return
+        blob = None
+        if links == 2:
+            # The other link may be the blob, in which case this is its last reference
+            digest = self.content_hash(name) or file_sha256(path)
+            candidate = self.path(self.blob_name(digest, name))
+            if os.path.exists(candidate) and os.path.samefile(candidate, path):
+                blob = candidate
+        super().delete(name)
+        _content_hashes.delete(self.hash_path(name))
+        if name.startswith(f'{BLOB_DIR}/'):
+            # An unreferenced blob (see orphaned_blobs)
+            self.remove_aliases(os.path.splitext(os.path.basename(name))[0])
+            return
+        try:
+            os.remove(self.hash_path(name))
+        except FileNotFoundError:
+            pass
+        if blob:
+            try:
+                if os.stat(blob).st_nlink == 1:
+                    os.remove(blob)
+                    self.remove_aliases(digest)
+            except FileNotFoundError:
+                pass
+
+    def deduplicate(self, name):
+        """
+        Replace a file that predates this storage with a link to its blob.
+        Returns the number of bytes freed (0 for the first copy of a file).
+        """
+        path = self.path(name)
+        digest = file_sha256(path)
+        blob = self.path(self.blob_name(digest, name))
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        try:
+            os.link(path, blob)
+            freed = 0
+        except FileExistsError:
+            freed = 0 if os.path.samefile(path, blob) else os.path.getsize(path)
+            if freed:
+                # Swap in the link atomically, so the name is never missing
+                temp = f'{path}.dedupe'
+                os.link(blob, temp)
+                os.replace(temp, path)
+        self.record_hash(name, digest)
+        return freed
+
+    def orphaned_blobs(self):
+        """Names of blobs no stored name links to any more"""
+        root = self.path(BLOB_DIR)
+        for directory, subdirectories, files in os.walk(root):
+            if directory == root:
+                subdirectories[:] = [name for name in subdirectories if name not in ('tmp', HASH_DIR, ALIAS_DIR)]
+            for filename in files:
+                path = os.path.join(directory, filename)
+                if os.stat(path).st_nlink == 1:
+                    yield os.path.relpath(path, self.location).replace(os.sep, '/')
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
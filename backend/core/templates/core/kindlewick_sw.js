@@ -0,0 +1,74 @@
+// Kindlewick service worker, generated by core.views.kindlewick_service_worker.
+// Static assets are served cache-first under their hashed URLs; a new
+// static manifest changes VERSION, which installs a fresh cache.
+const MANIFEST = {{ manifest_json|safe }};
+const CACHE = 'kindlewick-' + MANIFEST.version;
+const PAGE = '{{ page_url }}';
+
+// Request path (hashed or not) -> hashed URL the response is cached under
+const ROUTES = {};
+MANIFEST.assets.forEach(function (asset) {
+    ROUTES[asset.url] = asset.url;
+    ROUTES[asset.original_url] = asset.url;
+});
+
+self.addEventListener('install', function (event) {
+    const urls = MANIFEST.assets.filter(function (asset) { return asset.precache; })
+        .map(function (asset) { return asset.url; });
+    event.waitUntil(
+        caches.open(CACHE)
+            .then(function (cache) { return cache.addAll(urls.concat([PAGE])); })
+            .then(function () { return self.skipWaiting(); })
+    );
+});
+
+self.addEventListener('activate', function (event) {
+    event.waitUntil(
+        caches.keys().then(function (keys) {
+            return Promise.all(keys.filter(function (key) {
+                return key.indexOf('kindlewick-') === 0 && key !== CACHE;
+            }).map(function (key) { return caches.delete(key); }));
+        }).then(function () { return self.clients.claim(); })
+    );
+});
+
+function cacheFirst(request, cachedUrl) {
+    return caches.open(CACHE).then(function (cache) {
+        // Images vary on Accept; the browser's Accept doesn't change between loads
+        return cache.match(cachedUrl, {ignoreVary: true}).then(function (cached) {
+            return cached || fetch(cachedUrl, {headers: request.headers}).then(function (response) {
+                if (response.ok) {
+                    cache.put(cachedUrl, response.clone());
+                }
+                return response;
+            });
+        });
+    });
+}
+
+function networkFirst(request) {
+    return fetch(request).then(function (response) {
+        if (response.ok) {
+            const copy = response.clone();
+            caches.open(CACHE).then(function (cache) { cache.put(PAGE, copy); });
+        }
+        return response;
+    }).catch(function () {
+        return caches.match(PAGE, {ignoreVary: true});
+    });
+}
+
+self.addEventListener('fetch', function (event) {
+    if (event.request.method !== 'GET') {
+        return;
+    }
+    const url = new URL(event.request.url);
+    if (url.origin !== self.location.origin) {
+        return;
+    }
+    if (ROUTES[url.pathname]) {
+        event.respondWith(cacheFirst(event.request, ROUTES[url.pathname]));
+    } else if (event.request.mode === 'navigate' && url.pathname === PAGE) {
+        event.respondWith(networkFirst(event.request));
+    }
+});
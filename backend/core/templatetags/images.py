@@ -0,0 +1,14 @@
+from django import template
+
+from .. import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(image, alt='', css_class='card-img-top', sizes=None):
+    """
+    {% responsive_image resource.image alt=resource.title %}: <picture> with
+    WebP and JPEG srcsets from the upload's derivatives
+    """
+    return images.responsive_image(image, alt, css_class, sizes)
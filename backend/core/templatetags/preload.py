@@ -0,0 +1,18 @@
+from django import template
+
+from ..preload import add_preload
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def preload(context, name, kind, versioned=True):
+    """
+    {% preload 'core/css/style.css' 'style' %}: send a static file as a
+    Link: rel=preload header (and 103 Early Hints) for this page. Renders
+    nothing.
+    """
+    request = context.get('request')
+    if request is not None:
+        add_preload(request, name, kind, versioned)
+    return ''
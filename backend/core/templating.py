@@ -0,0 +1,139 @@
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Count
+from django.template import engines
+from django.template.backends.django import DjangoTemplates
+from django.template.loaders.cached import Loader as CachedLoader
+
+from .benchmarks import percentile
+from .models import Class, ClassStudent, TeachingResource, User
+from .queries import performance_logger
+
+CORE_TEMPLATE_DIR = Path(__file__).resolve().parent / 'templates'
+JINJA2_TEMPLATE_DIR = Path(__file__).resolve().parent / 'jinja2'
+
+
+def core_template_names():
+    """Names ('core/base.html', ...) of every template under core/templates/core"""
+    return sorted(path.relative_to(CORE_TEMPLATE_DIR).as_posix() for path in (CORE_TEMPLATE_DIR / 'core').rglob('*.html'))
+
+
+def jinja2_template_names():
+    """Names of the templates that also have a Jinja2 version under core/jinja2/core"""
+    return sorted(path.relative_to(JINJA2_TEMPLATE_DIR).as_posix() for path in (JINJA2_TEMPLATE_DIR / 'core').rglob('*.html'))
+
+
+def django_engines():
+    return [engine for engine in engines.all() if isinstance(engine, DjangoTemplates)]
+
+
+def cached_loaders(engine):
+    """The engine's cached template loaders (empty when caching is off)"""
+    return [loader for loader in engine.engine.template_loaders if isinstance(loader, CachedLoader)]
+
+
+def warm_templates(names=None):
+    """
+    Compile templates into the cached loader so the first request of each
+    worker does not pay for parsing. Templates that fail to compile are
+    logged and skipped; the request that renders them will raise as usual.
+    """
+    names = core_template_names() if names is None else names
+    compiled = 0
+    start = time.perf_counter()
+    for engine in django_engines():
+        if not cached_loaders(engine):
+            continue
+        for name in names:
+            try:
+                engine.get_template(name)
+            except Exception:
+                performance_logger.exception('Template warm-up failed for %s', name)
+            else:
+                compiled += 1
+    performance_logger.info('Compiled %d templates in %.0fms', compiled, (time.perf_counter() - start) * 1000)
+    return compiled
+
+
+def warm_templates_on_boot():
+    if getattr(settings, 'TEMPLATE_WARMUP', not settings.DEBUG):
+        warm_templates()
+
+
+def reset_template_cache(engine):
+    for loader in cached_loaders(engine) if isinstance(engine, DjangoTemplates) else ():
+        loader.reset()
+    if getattr(engine, 'env', None) is not None and engine.env.cache is not None:
+        engine.env.cache.clear()
+
+
+def benchmark_template(engine, name, request, context=None, iterations=50):
+    """
+    Time a cold compile (template caches emptied first) and `iterations`
+    renders of a template with the given context and request. Works for the
+    Django engine and the Jinja2 one (regardless of JINJA2_TEMPLATES).
+    Returns {'compile_ms', 'p50_ms', 'p95_ms', 'bytes'} or {'error': ...}.
+    """
+    reset_template_cache(engine)
+    get_template = getattr(engine, 'get_template_unfiltered', engine.get_template)
+    try:
+        start = time.perf_counter()
+        template = get_template(name)
+        compile_ms = (time.perf_counter() - start) * 1000
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            html = template.render(dict(context or {}), request)
+            timings.append((time.perf_counter() - start) * 1000)
+    except Exception as exc:
+        return {'error': f'{type(exc).__name__}: {exc}'}
+    return {
+        'compile_ms': round(compile_ms, 3),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'bytes': len(html.encode()),
+    }
+
+
+def _resources_list_context(user, rows):
+    from .views import TeachingResourceForm
+    resources = TeachingResource.objects.filter(status='published').select_related('author')
+    return {'resources': list(resources[:rows]), 'form': TeachingResourceForm()}
+
+
+def _school_admin_staff_context(user, rows):
+    school = getattr(user, 'school', None)
+    teachers = User.objects.filter(role='teacher', school=school).annotate(class_count=Count('classes_taught'))
+    return {'school_name': school, 'teachers': teachers[:rows]}
+
+
+def _school_admin_analytics_context(user, rows):
+    school = getattr(user, 'school', None)
+    classes = list(Class.objects.filter(teacher__school=school).select_related('teacher')[:rows])
+    subjects = dict(Class.SUBJECT_CHOICES)
+    by_subject = Class.objects.filter(teacher__school=school).values('subject').annotate(count=Count('id'))
+    by_key_stage = Class.objects.filter(teacher__school=school).values('year_ks').annotate(count=Count('id'))
+    return {
+        'school_name': school,
+        'classes': classes,
+        'classes_count': len(classes),
+        'total_students': ClassStudent.objects.filter(clazz__teacher__school=school).values('student').distinct().count(),
+        'subject_breakdown': [{'label': subjects.get(row['subject'], row['subject']), 'count': row['count']} for row in by_subject],
+        'key_stage_breakdown': [{'label': dict(Class.KEY_STAGE_CHOICES)[row['year_ks']], 'count': row['count']} for row in by_key_stage],
+    }
+
+
+# Realistic contexts for the templates that have Jinja2 versions, so both
+# engines can be benchmarked on the same data (the views currently pass none)
+SAMPLE_CONTEXTS = {
+    'core/teacher_resources_list.html': _resources_list_context,
+    'core/school_admin_staff.html': _school_admin_staff_context,
+    'core/school_admin_analytics.html': _school_admin_analytics_context,
+}
+
+
+def sample_context(name, user, rows=100):
+    build = SAMPLE_CONTEXTS.get(name)
+    return build(user, rows) if build else {}
@@ -0,0 +1,45 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class IsolatedCacheTestRunner(DiscoverRunner):
+    """
+    The shared cache lives outside the test database (on disk or in Redis),
+    so the suite runs against a process-local one instead; otherwise rosters
+    cached by an earlier run could be served for reused primary keys, and a
+    test run would wipe or pollute the cache of a running server.
+
+    Static files are collected into a temporary STATIC_ROOT first, so pages
+    render against a real manifest. References to files that were never
+    committed render with their unhashed URL and a warning, as in production
+    (OptimizedStaticFilesStorage.stored_name). Only the hashing step runs
+    here; compression and image variants are covered by
+    StaticAssetPipelineTestCase.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._static_root = tempfile.mkdtemp(prefix='test-static-')
+        self._overrides = override_settings(
+            CACHES={
+                **settings.CACHES,
+                'shared': {'BACKEND': 'core.timing.TimedLocMemCache', 'LOCATION': 'test-shared'},
+            },
+            STATIC_ROOT=self._static_root,
+        )
+        self._overrides.enable()
+        with override_settings(STORAGES={
+            **settings.STORAGES,
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage'},
+        }):
+            call_command('collectstatic', interactive=False, verbosity=0)
+
+    def teardown_test_environment(self, **kwargs):
+        self._overrides.disable()
+        shutil.rmtree(self._static_root, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -1,7 +1,72 @@
-from django.test import TestCase, Client
-from django.urls import reverse
+import gzip
+import hashlib
+import importlib.util
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import StringIO, BytesIO
+from unittest import mock
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.test import TestCase, Client, RequestFactory, override_settings
+from django.urls import reverse, resolve
 from django.contrib.auth import get_user_model
-from .models import Class, ClassStudent, Avatar, SchoolAnalyticsProfile, TeachingResource, ForumPost
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection, transaction, OperationalError
+from django.db.models import F
+from django.http import HttpResponse, HttpResponseNotFound, StreamingHttpResponse
+from django.core.management import call_command
+from django.contrib import messages
+from django.contrib.messages import get_messages
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.middleware.csrf import get_token
+from django.template import engines, Context, Template
+from django.template.loader import get_template
+from django.templatetags.static import static
+from django.views.static import serve
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.storage import default_storage
+from django.core.files.base import ContentFile
+from PIL import Image
+from .middleware import (
+    CompressionMiddleware, QueryBudgetMiddleware, brotli, ReplicaPinningMiddleware, StaticFilesMiddleware,
+    PreloadMiddleware,
+)
+from .models import (
+    Class, ClassStudent, Avatar, SchoolAnalyticsProfile, TeachingResource, ForumPost, SlowQuery, KindlewickGameSession,
+    ForumReply, HelpTutorial, KindlewickGameProgress, NewsAnnouncement, ResourceComment, ResourceUpload,
+)
+from .profiling import list_profiles
+from .queries import SlowQueryLogger, fingerprint, is_read_only_select, record_queries
+from .index_advisor import parse_statement, advise
+from .benchmarks import percentile, find_regressions, append_query_counts
+from .urls import urlpatterns
+from .db.backends.postgresql.base import PoolMetrics
+from .replicas import ReplicaRouter, use_replica, replica_health
+from .cache import (
+    TwoTierCache, _MISSING, LocalLRU, NamespacedCache, cache_stats, stale_while_revalidate, anonymous_page_key,
+    cache_anonymous_page, content_cache, roster_cache,
+)
+from .views import school_roster_ids, teacher_roster_ids
+from .http_cache import HttpPurger, surrogate_keys_for, media_key
+from .templating import cached_loaders, core_template_names, django_engines, warm_templates, sample_context
+from .checks import check_cached_template_loader
+from .service_worker import precache_manifest
+from .preload import learned_links
+from .images import derivative_name, derivatives_manifest_name, image_derivatives, build_derivatives
+from .lookups import AnyOf
+from .storage import _content_hashes
+from .uploads import clear_stale_uploads, partial_path, UploadError, append_chunk
 
 User = get_user_model()
 
@@ -596,3 +661,1442 @@ class TeacherWorkflowIntegrationTestCase(TestCase):
         response = self.client.get(reverse('teacher_analytics'))
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, 'Integration Test Class')
+
+
+# ============================================================================
+# PERFORMANCE MIDDLEWARE TESTS
+# ============================================================================
+
+class CompressionMiddlewareTestCase(TestCase):
+    """Test gzip/brotli compression of dynamic responses"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.payload = b'{"sessions": [' + b','.join([b'{"score": 10, "level": 2}'] * 200) + b']}'
+
+    def _process(self, response, accept_encoding='gzip'):
+        request = self.factory.get('/api/kindlewick/sessions/', HTTP_ACCEPT_ENCODING=accept_encoding)
+        return CompressionMiddleware(lambda r: response).process_response(request, response)
+
+    def test_json_response_is_gzipped(self):
+        """Test that large JSON responses are gzip compressed"""
+        response = self._process(HttpResponse(self.payload, content_type='application/json'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), self.payload)
+
+    def test_brotli_preferred_when_available(self):
+        """Test that brotli is chosen over gzip when installed and accepted"""
+        response = self._process(HttpResponse(self.payload, content_type='application/json'), 'gzip, br')
+        expected = 'br' if brotli is not None else 'gzip'
+        self.assertEqual(response['Content-Encoding'], expected)
+
+    def test_html_is_gzipped_with_breach_padding(self):
+        """Test that HTML is never brotli-compressed and its gzip length varies per response"""
+        html = b'<html><body>' + b'<p>Lesson plan</p>' * 200 + b'</body></html>'
+        lengths = set()
+        for _ in range(10):
+            response = self._process(HttpResponse(html, content_type='text/html; charset=utf-8'), 'gzip, br')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(gzip.decompress(response.content), html)
+            lengths.add(len(response.content))
+        self.assertGreater(len(lengths), 1)
+
+    def test_small_and_binary_responses_are_skipped(self):
+        """Test that small responses and already-compressed media are left alone"""
+        small = self._process(HttpResponse(b'{}', content_type='application/json'))
+        image = self._process(HttpResponse(self.payload, content_type='image/png'))
+        self.assertFalse(small.has_header('Content-Encoding'))
+        self.assertFalse(image.has_header('Content-Encoding'))
+
+    def test_streaming_response_is_compressed(self):
+        """Test that StreamingHttpResponse bodies are compressed chunk by chunk"""
+        chunks = [b'name,score\n'] + [b'student,10\n'] * 100
+        response = self._process(StreamingHttpResponse(iter(chunks), content_type='text/csv'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), b''.join(chunks))
+
+
+class QueryBudgetMiddlewareTestCase(TestCase):
+    """Test the sampled query budget and N+1 detector"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.teacher = User.objects.create_user(username='teacher1', password='testpass123', role='teacher')
+        for index in range(6):
+            Class.objects.create(name=f'Class {index}', teacher=self.teacher, subject='maths', year_ks=2)
+
+    def test_fingerprint_normalises_literals(self):
+        """Test that fingerprints ignore literal values and IN-list lengths"""
+        self.assertEqual(
+            fingerprint("SELECT * FROM core_class WHERE id = 5 AND name = 'a''b'"),
+            fingerprint('SELECT *  FROM core_class WHERE id = %s AND name = %s'),
+        )
+        self.assertEqual(
+            fingerprint('SELECT * FROM core_user WHERE id IN (%s, %s, %s)'),
+            'SELECT * FROM core_user WHERE id IN (...)',
+        )
+
+    def test_repeated_queries_are_flagged(self):
+        """Test that an N+1 loop is logged with the offending stack"""
+
+        def view(request):
+            for clazz in Class.objects.all():
+                clazz.students.count()
+            return HttpResponse('ok')
+
+        with override_settings(QUERY_BUDGET_ENABLED=True, QUERY_BUDGET_SAMPLE_RATE=1.0,
+                               QUERY_BUDGET_DEFAULT=100, QUERY_BUDGET_REPEAT_THRESHOLD=5):
+            middleware = QueryBudgetMiddleware(view)
+        with self.assertLogs('core.performance', level='WARNING') as logs:
+            middleware(self.factory.get('/teacher/'))
+        self.assertIn('repeated 6x', logs.output[0])
+        self.assertIn('tests.py', logs.output[0])
+
+    def test_disabled_by_default(self):
+        """Test that the middleware removes itself unless enabled"""
+        with override_settings(QUERY_BUDGET_ENABLED=False):
+            with self.assertRaises(MiddlewareNotUsed):
+                QueryBudgetMiddleware(lambda request: None)
+
+
+class ServerTimingMiddlewareTestCase(TestCase):
+    """Test the staff-only Server-Timing header"""
+
+    def setUp(self):
+        self.teacher = User.objects.create_user(username='teacher1', password='testpass123', role='teacher', is_staff=True)
+        self.student = User.objects.create_user(username='student1', password='testpass123', role='student')
+
+    def test_staff_receive_phase_breakdown(self):
+        """Test that staff responses carry db, serialize and total timings"""
+        with override_settings(SERVER_TIMING_ENABLED=True):
+            client = Client()
+            client.login(username='teacher1', password='testpass123')
+            response = client.get(reverse('api_kindlewick_teacher_sessions'))
+        header = response['Server-Timing']
+        self.assertIn('db;dur=', header)
+        self.assertIn('serialize;dur=', header)
+        self.assertIn('total;dur=', header)
+
+    def test_non_staff_receive_no_header(self):
+        """Test that non-staff users never see Server-Timing"""
+        with override_settings(SERVER_TIMING_ENABLED=True):
+            client = Client()
+            client.login(username='student1', password='testpass123')
+            response = client.get(reverse('api_kindlewick_sessions'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+class ProfilerMiddlewareTestCase(TestCase):
+    """Test on-demand request profiling for superusers"""
+
+    def setUp(self):
+        self.profile_dir = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(PROFILER_DIR=self.profile_dir.name, PROFILER_MAX_FILES=2)
+        self.settings_override.enable()
+        self.superuser = User.objects.create_superuser(username='root', password='testpass123', email='root@school.com')
+        self.teacher = User.objects.create_user(username='teacher1', password='testpass123', role='teacher', is_staff=True)
+        self.client = Client()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.profile_dir.cleanup()
+
+    def test_superuser_request_is_profiled(self):
+        """Test that the query flag profiles the request and lists it in the admin"""
+        self.client.login(username='root', password='testpass123')
+        response = self.client.get(reverse('about'), {'__profile': '1'})
+        name = response['X-Profile-Id']
+        self.assertTrue(name.endswith('.prof'))
+        listing = self.client.get(reverse('admin:core_profiles'))
+        self.assertContains(listing, name)
+        detail = self.client.get(reverse('admin:core_profile_detail', args=[name]))
+        self.assertContains(detail, 'cumulative')
+
+    def test_other_users_are_not_profiled(self):
+        """Test that non-superusers can neither trigger nor browse profiles"""
+        self.client.login(username='teacher1', password='testpass123')
+        response = self.client.get(reverse('about'), HTTP_X_PROFILE='1')
+        self.assertFalse(response.has_header('X-Profile-Id'))
+        self.assertEqual(self.client.get(reverse('admin:core_profiles')).status_code, 403)
+
+    def test_retention_cap(self):
+        """Test that only PROFILER_MAX_FILES profiles are kept"""
+        self.client.login(username='root', password='testpass123')
+        for _ in range(4):
+            self.client.get(reverse('about'), HTTP_X_PROFILE='1')
+        self.assertEqual(len(list_profiles()), 2)
+
+
+class SlowQueryLogTestCase(TestCase):
+    """Test the slow query log and EXPLAIN capture"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.teacher = User.objects.create_user(username='teacher1', password='testpass123', role='teacher')
+
+    def test_slow_select_is_logged_with_plan(self):
+        """Test that statements over the threshold are stored with an EXPLAIN plan"""
+        request = self.factory.get('/teacher/')
+        logger = SlowQueryLogger(request, threshold_ms=0)
+        with connection.execute_wrapper(logger):
+            list(User.objects.filter(username='teacher1'))
+        logger.flush()
+        entry = SlowQuery.objects.get()
+        self.assertIn('core_user', entry.sql)
+        self.assertEqual(entry.path, '/teacher/')
+        self.assertTrue(entry.plan)
+        self.assertFalse(entry.analyzed)
+
+    def test_log_is_bounded(self):
+        """Test that the log keeps at most max_rows entries"""
+        logger = SlowQueryLogger(threshold_ms=0, max_rows=3)
+        with connection.execute_wrapper(logger):
+            for _ in range(5):
+                User.objects.filter(role='teacher').count()
+        logger.flush()
+        self.assertEqual(SlowQuery.objects.count(), 3)
+
+    def test_entry_survives_rollback(self):
+        """Test that entries are held until flush, outside the caller's transaction"""
+        logger = SlowQueryLogger(threshold_ms=0)
+        with connection.execute_wrapper(logger):
+            with self.assertRaises(ValueError):
+                with transaction.atomic():
+                    User.objects.filter(role='teacher').update(first_name='Rolled back')
+                    raise ValueError
+        self.assertFalse(SlowQuery.objects.exists())
+        logger.flush()
+        self.assertTrue(SlowQuery.objects.filter(sql__startswith='UPDATE').exists())
+
+    def test_only_read_only_selects_are_analyzed(self):
+        """Test that writes in a CTE and row-locking SELECTs are never re-run by EXPLAIN ANALYZE"""
+        self.assertTrue(is_read_only_select('SELECT "core_user"."updated_at" FROM "core_user" WHERE "name" = \'delete\''))
+        self.assertTrue(is_read_only_select('WITH recent AS (SELECT id FROM core_user) SELECT * FROM recent'))
+        self.assertFalse(is_read_only_select('WITH gone AS (DELETE FROM core_user RETURNING id) SELECT * FROM gone'))
+        self.assertFalse(is_read_only_select('SELECT id FROM core_user FOR UPDATE'))
+        self.assertFalse(is_read_only_select('SELECT id FROM core_user FOR KEY SHARE'))
+        self.assertFalse(is_read_only_select('SELECT id INTO archive FROM core_user'))
+        self.assertFalse(is_read_only_select('UPDATE core_user SET first_name = \'x\''))
+
+    def test_fast_queries_are_ignored(self):
+        """Test that statements under the threshold are not recorded"""
+        logger = SlowQueryLogger(threshold_ms=10000)
+        with connection.execute_wrapper(logger):
+            User.objects.count()
+        logger.flush()
+        self.assertFalse(SlowQuery.objects.exists())
+
+
+class IndexAdvisorTestCase(TestCase):
+    """Test index proposals from captured query fingerprints"""
+
+    SESSIONS_SQL = (
+        'SELECT "core_kindlewickgamesession"."id" FROM "core_kindlewickgamesession" '
+        'WHERE "core_kindlewickgamesession"."user_id" IN (SELECT U0."id" FROM "core_user" U0 '
+        'INNER JOIN "core_classstudent" U1 ON (U0."id" = U1."student_id") WHERE U0."school" = \'x\') '
+        'ORDER BY "core_kindlewickgamesession"."created_at" DESC LIMIT 300'
+    )
+
+    def test_parse_statement(self):
+        """Test that filters and ordering are attributed to the right tables"""
+        accesses = {access.table: access for access in parse_statement(self.SESSIONS_SQL)}
+        sessions = accesses['core_kindlewickgamesession']
+        self.assertEqual(sessions.equality, ['user_id'])
+        self.assertEqual(sessions.ordering, [('created_at', True)])
+        self.assertIn('school', accesses['core_user'].equality)
+
+    def test_advise_composite_index_for_sorted_lookup(self):
+        """Test that a sorted FK lookup yields a composite index proposal"""
+        advice = {item.model: item for item in advise([(self.SESSIONS_SQL, 50.0)], connection)}
+        self.assertEqual(advice[KindlewickGameSession].field_names, ['user', '-created_at'])
+
+    def test_existing_index_is_not_proposed(self):
+        """Test that lookups already served by a foreign key index are skipped"""
+        sql = 'SELECT "core_classstudent"."id" FROM "core_classstudent" WHERE "core_classstudent"."clazz_id" = 3'
+        self.assertEqual(advise([(sql, 1.0)], connection), [])
+
+
+class SeedScaleCommandTestCase(TestCase):
+    """Test the synthetic school-scale data generator"""
+
+    OPTIONS = dict(
+        schools=2, teachers_per_school=2, classes_per_teacher=1, students_per_class=3,
+        sessions_per_student=4, resources_per_teacher=1, posts_per_teacher=1, replies_per_post=2,
+        seed=7, end_date='2026-01-31',
+    )
+
+    def seed(self, **extra):
+        call_command('seed_scale', stdout=StringIO(), **self.OPTIONS, **extra)
+
+    def snapshot(self):
+        return list(
+            KindlewickGameSession.objects.order_by('user__username', 'created_at')
+            .values_list('user__username', 'game_type', 'level', 'score', 'created_at')
+        )
+
+    def test_generates_expected_volumes(self):
+        """Test that row counts follow the per-school options"""
+        self.seed()
+        self.assertEqual(User.objects.filter(username__startswith='seed7_', role='teacher').count(), 4)
+        self.assertEqual(ClassStudent.objects.count(), 12)
+        self.assertEqual(KindlewickGameSession.objects.count(), 48)
+        self.assertTrue(KindlewickGameSession.objects.filter(created_at__date__lt='2026-01-01').exists())
+
+    def test_output_is_deterministic(self):
+        """Test that the same seed reproduces the same data"""
+        self.seed()
+        first = self.snapshot()
+        self.seed(clear=True)
+        self.assertEqual(self.snapshot(), first)
+
+    def test_seeding_invalidates_rosters(self):
+        """Test that rosters cached before a bulk seed are not served afterwards"""
+        roster_cache.set('teacher:1:None:None', [])
+        self.seed()
+        self.assertIsNone(roster_cache.get('teacher:1:None:None'))
+
+
+class ApiBenchmarkTestCase(TestCase):
+    """Test the endpoint latency benchmark harness"""
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles"""
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertIsNone(percentile([], 95))
+
+    def test_find_regressions(self):
+        """Test that latency and query growth beyond the threshold are reported"""
+        baseline = {'endpoints': {
+            'feed': {'p95_ms': 100.0, 'queries_mean': 3.0, 'errors': 0},
+            'fast': {'p95_ms': 1.0, 'queries_mean': 1.0, 'errors': 0},
+        }}
+        current = {'endpoints': {
+            'feed': {'p95_ms': 130.0, 'queries_mean': 40.0, 'errors': 0},
+            'fast': {'p95_ms': 2.0, 'queries_mean': 1.0, 'errors': 0},
+        }}
+        regressions = find_regressions(baseline, current, threshold=0.2)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(all(line.startswith('feed:') for line in regressions))
+
+    def test_command_writes_results(self):
+        """Test that the command benchmarks an endpoint and saves JSON results"""
+        User.objects.create_user(username='bench_student', password='pass123', role='student')
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            call_command(
+                'benchmark_api', only=['current_user'], requests=3, concurrency=1, warmup=0,
+                student='bench_student', output=output, stdout=StringIO(),
+            )
+            with open(output) as handle:
+                results = json.load(handle)
+        result = results['endpoints']['current_user']
+        self.assertEqual(result['requests'], 3)
+        self.assertEqual(result['status_codes'], {'200': 3})
+        self.assertGreater(result['queries_mean'], 0)
+
+
+class DatabasePoolMetricsTestCase(TestCase):
+    """Test connection pool wait logging"""
+
+    class StubPool:
+        def get_stats(self):
+            return {'pool_size': 4, 'pool_available': 0, 'requests_waiting': 3}
+
+        def pop_stats(self):
+            return {'pool_size': 4, 'pool_available': 1, 'requests_waiting': 0, 'requests_wait_ms': 250}
+
+    def test_slow_wait_is_logged(self):
+        """Test that a checkout slower than DATABASE_POOL_SLOW_WAIT_MS logs a warning"""
+        metrics = PoolMetrics()
+        with override_settings(DATABASE_POOL_SLOW_WAIT_MS=50), self.assertLogs('core.performance', 'WARNING') as logs:
+            metrics.record('default', self.StubPool(), 0.2)
+        self.assertIn('Waited 200ms', logs.output[0])
+        self.assertIn('waiting 3', logs.output[0])
+
+    def test_periodic_summary(self):
+        """Test that wait percentiles are logged once per interval"""
+        metrics = PoolMetrics()
+        metrics.last_logged -= 120
+        with override_settings(DATABASE_POOL_STATS_INTERVAL=60), self.assertLogs('core.performance', 'INFO') as logs:
+            for wait in (0.001, 0.002, 0.003):
+                metrics.record('default', self.StubPool(), wait)
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('Pool default: 1 checkouts', logs.output[0])
+        self.assertEqual(metrics.snapshot(), {'default': [2.0, 3.0]})
+
+
+class ReplicaRoutingTestCase(TestCase):
+    """Test read replica routing, read-your-writes pinning and fallback"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        # Stand the default database in for the replica alias
+        self.override = override_settings(DATABASE_REPLICA_ALIAS='default')
+        self.override.enable()
+        replica_health.checked_at = None
+        replica_health.healthy = False
+
+    def tearDown(self):
+        self.override.disable()
+
+    def routed_view(self, fail_first=False):
+        calls = []
+
+        @use_replica
+        def view(request):
+            calls.append(ReplicaRouter().db_for_read(User))
+            if fail_first and len(calls) == 1:
+                raise OperationalError('replica went away')
+            return HttpResponse('ok')
+        return view, calls
+
+    def test_reads_go_to_replica(self):
+        """Test that reads inside @use_replica views are routed to the replica"""
+        view, calls = self.routed_view()
+        view(self.factory.get('/teacher/analytics/'))
+        self.assertEqual(calls, ['default'])
+        self.assertIsNone(ReplicaRouter().db_for_read(User))
+
+    def test_pinned_requests_read_primary(self):
+        """Test that the pin cookie keeps a user on the primary after a write"""
+        view, calls = self.routed_view()
+        request = self.factory.get('/teacher/analytics/')
+        request.COOKIES['db_pin'] = '1'
+        view(request)
+        self.assertEqual(calls, [None])
+
+    def test_failed_replica_falls_back_to_primary(self):
+        """Test that a replica error retries the view on the primary and marks the replica down"""
+        view, calls = self.routed_view(fail_first=True)
+        with self.assertLogs('core.performance', 'ERROR'):
+            response = view(self.factory.get('/teacher/analytics/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(calls, ['default', None])
+        self.assertFalse(replica_health.healthy)
+
+    def test_write_sets_pin_cookie(self):
+        """Test that successful unsafe requests pin the browser to the primary"""
+        middleware = ReplicaPinningMiddleware(lambda request: HttpResponse('ok'))
+        response = middleware(self.factory.post('/api/kindlewick/sessions/'))
+        self.assertEqual(response.cookies['db_pin']['max-age'], 15)
+        response = middleware(self.factory.get('/api/kindlewick/sessions/'))
+        self.assertNotIn('db_pin', response.cookies)
+
+
+class TwoTierCacheTestCase(TestCase):
+    """Test the process-local LRU, the shared tier, namespaces and hit counters"""
+
+    def setUp(self):
+        self.override = override_settings(CACHES={
+            'default': {'BACKEND': 'core.cache.TwoTierCache', 'LOCATION': 'test-shared'},
+            'test-shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-shared'},
+        }, CACHE_STATS_FLUSH_INTERVAL=0)
+        self.override.enable()
+        self.cache = TwoTierCache('test-shared', {'OPTIONS': {'LOCAL_TIMEOUT': 60}})
+        self.cache.clear()
+
+    def tearDown(self):
+        self.cache.clear()
+        self.override.disable()
+
+    def test_lru_evicts_and_expires(self):
+        """Test that the local tier drops the least recently used entry and expired entries"""
+        lru = LocalLRU(max_entries=2, timeout=5)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertIs(lru.get('b'), _MISSING)
+        self.assertEqual(lru.get('a'), 1)
+        with mock.patch('core.cache.time.monotonic', return_value=10 ** 9):
+            self.assertIs(lru.get('a'), _MISSING)
+
+    def test_reads_fall_through_to_shared_tier(self):
+        """Test that a local miss is served from the shared tier and copied locally"""
+        self.cache.set('key', 'value')
+        self.assertEqual(self.cache.get_with_tier('key'), ('value', 'local'))
+        self.cache.local.clear()
+        self.assertEqual(self.cache.get_with_tier('key'), ('value', 'shared'))
+        self.assertEqual(self.cache.get_with_tier('key'), ('value', 'local'))
+        self.cache.delete('key')
+        self.assertEqual(self.cache.get_with_tier('key', 'default'), ('default', None))
+
+    def test_namespace_bump_invalidates_keys(self):
+        """Test that bumping a namespace version hides every key written before it"""
+        rosters = NamespacedCache('test-roster')
+        rosters.set('teacher:1', [1, 2])
+        self.assertEqual(rosters.get('teacher:1'), [1, 2])
+        self.assertEqual(rosters.bump(), 2)
+        self.assertIsNone(rosters.get('teacher:1'))
+        self.assertEqual(rosters.get_or_set('teacher:1', lambda: [3]), [3])
+
+    def test_hit_and_miss_counters(self):
+        """Test that namespace lookups are counted per tier"""
+        content = NamespacedCache('test-content')
+        content.get('page')
+        content.set('page', 'html')
+        content.get('page')
+        self.cache.local.clear()
+        content.get('page')
+        self.assertEqual(
+            cache_stats.totals(['test-content'])['test-content'],
+            {'local_hit': 1, 'shared_hit': 1, 'miss': 1},
+        )
+
+    def test_roster_invalidated_on_enrolment(self):
+        """Test that enrolling a student invalidates cached rosters"""
+        teacher = User.objects.create_user(username='rosterteacher', password='x', role='teacher')
+        student = User.objects.create_user(username='rosterstudent', password='x', role='student')
+        clazz = Class.objects.create(name='Roster', teacher=teacher, subject='maths', year_ks=2)
+        self.assertEqual(teacher_roster_ids(teacher), [])
+        ClassStudent.objects.create(student=student, clazz=clazz)
+        self.assertEqual(teacher_roster_ids(teacher), [student.pk])
+
+    def test_rosters_filter_with_any_of(self):
+        """Test that AnyOf filters on a roster, including an empty one"""
+        student = User.objects.create_user(username='anyofstudent', password='x', role='student')
+        User.objects.create_user(username='anyofother', password='x', role='student')
+        self.assertEqual(list(User.objects.filter(AnyOf(F('id'), [student.pk]))), [student])
+        self.assertFalse(User.objects.filter(AnyOf(F('id'), [])).exists())
+
+    def test_school_roster_without_school_is_empty(self):
+        """Test that a user without a school gets an empty roster"""
+        self.assertEqual(school_roster_ids(None), [])
+        self.assertEqual(school_roster_ids(''), [])
+
+
+class StaleWhileRevalidateTestCase(TestCase):
+    """Test serving cached analytics renders while one request refreshes them"""
+
+    def setUp(self):
+        self.override = override_settings(CACHES={
+            'default': {'BACKEND': 'core.cache.TwoTierCache', 'LOCATION': 'swr-shared'},
+            'swr-shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'swr-shared'},
+        })
+        self.override.enable()
+        self.factory = RequestFactory()
+        self.anonymous = AnonymousUser()
+        self.renders = []
+
+    def tearDown(self):
+        caches['default'].clear()
+        self.override.disable()
+
+    def cached_view(self, soft_ttl, delay=0):
+
+        @stale_while_revalidate(NamespacedCache('test-analytics'), soft_ttl=soft_ttl, hard_ttl=60, lock_timeout=5)
+        def view(request):
+            time.sleep(delay)
+            self.renders.append(request.path)
+            return HttpResponse(f'render {len(self.renders)}' + ''.join(str(m) for m in get_messages(request)))
+        return view
+
+    def get(self, view, message=None):
+        request = self.factory.get('/teacher/analytics/')
+        request.user = self.anonymous
+        if message:
+            request._messages = CookieStorage(request)
+            messages.success(request, message)
+        return view(request)
+
+    def test_fresh_render_is_served_from_cache(self):
+        """Test that requests within the soft TTL reuse the first render"""
+        view = self.cached_view(soft_ttl=60)
+        self.assertEqual(self.get(view).content, b'render 1')
+        self.assertEqual(self.get(view).content, b'render 1')
+        self.assertEqual(len(self.renders), 1)
+
+    def test_stale_render_served_while_refreshing(self):
+        """Test that a stale render is returned at once and refreshed by a single background job"""
+        view = self.cached_view(soft_ttl=0)
+        self.get(view)
+        with mock.patch('core.cache._start_refresh') as start_refresh:
+            self.assertEqual(self.get(view).content, b'render 1')
+            self.assertEqual(self.get(view).content, b'render 1')
+        self.assertEqual(start_refresh.call_count, 1)
+        start_refresh.call_args.args[0]()
+        self.assertEqual(self.get(view).content, b'render 2')
+
+    def test_refresh_renders_a_fresh_request(self):
+        """Test that the background render does not reuse the finished request's state"""
+        view = self.cached_view(soft_ttl=0)
+        for _ in range(2):
+            request = self.factory.get('/teacher/analytics/', HTTP_COOKIE=f'{settings.CSRF_COOKIE_NAME}=secret')
+            request.user = self.anonymous
+            request.session = {'finished': True}
+            with mock.patch('core.cache._start_refresh') as start_refresh:
+                view(request)
+        refresh_request = start_refresh.call_args.args[0].args[0]
+        self.assertIsNot(refresh_request, request)
+        self.assertEqual(refresh_request.get_full_path(), request.get_full_path())
+        self.assertIs(refresh_request.user, request.user)
+        self.assertEqual(refresh_request.COOKIES, {settings.CSRF_COOKIE_NAME: 'secret'})
+        self.assertNotIn('finished', refresh_request.session)
+
+    def test_cold_cache_renders_once(self):
+        """Test that concurrent requests for a cold key wait for one render instead of stampeding"""
+        view = self.cached_view(soft_ttl=60, delay=0.3)
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            responses = list(pool.map(lambda _: self.get(view), range(5)))
+        self.assertEqual({response.content for response in responses}, {b'render 1'})
+        self.assertEqual(len(self.renders), 1)
+
+    def test_renders_with_messages_are_not_stored(self):
+        """Test that flash messages are rendered fresh and never replayed from the cache"""
+        view = self.cached_view(soft_ttl=60)
+        self.assertEqual(self.get(view, message='Class saved').content, b'render 1Class saved')
+        self.assertEqual(self.get(view).content, b'render 2')
+        self.assertEqual(self.get(view, message='Class deleted').content, b'render 3Class deleted')
+        self.assertEqual(self.get(view).content, b'render 2')
+
+
+class AnonymousPageCacheTestCase(TestCase):
+    """Test the full-page cache for anonymous marketing pages"""
+
+    def setUp(self):
+        self.override = override_settings(CACHES={
+            'default': {'BACKEND': 'core.cache.TwoTierCache', 'LOCATION': 'page-shared'},
+            'page-shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'page-shared'},
+        })
+        self.override.enable()
+
+    def tearDown(self):
+        caches['default'].clear()
+        self.override.disable()
+
+    def test_anonymous_hit_skips_templates_and_database(self):
+        """Test that a cached page is served without rendering or queries"""
+        first = self.client.get(reverse('pricing'))
+        with mock.patch('core.views.render') as render, self.assertNumQueries(0):
+            second = self.client.get(reverse('pricing'))
+        render.assert_not_called()
+        self.assertEqual(second.content, first.content)
+        self.assertIn('Cookie', second['Vary'])
+
+    def test_logged_in_users_get_fresh_render(self):
+        """Test that a session cookie bypasses the cache"""
+        User.objects.create_user(username='pageteacher', password='testpass123', role='teacher')
+        self.client.get(reverse('home'))
+        self.client.login(username='pageteacher', password='testpass123')
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'pageteacher')
+
+    def test_renders_with_csrf_token_are_not_stored(self):
+        """Test that a page which issued a CSRF token is not shared between visitors"""
+
+        @cache_anonymous_page
+        def view(request):
+            return HttpResponse(get_token(request))
+
+        request = RequestFactory().get(reverse('contact'))
+        request.resolver_match = resolve(request.path)
+        view(request)
+        self.assertIsNone(content_cache.get(anonymous_page_key(request.path)))
+
+    def test_purge_and_warm_command(self):
+        """Test that page_cache --purge --warm refills every configured page"""
+        out = StringIO()
+        call_command('page_cache', 'about', '--purge', '--warm', stdout=out)
+        self.assertIn('cached for 3600s', out.getvalue())
+        self.assertIsNotNone(content_cache.get(anonymous_page_key(reverse('about'))))
+
+
+class HttpCachePolicyTestCase(TestCase):
+    """Test Cache-Control, Vary and Surrogate-Key headers and edge purges"""
+
+    def test_anonymous_marketing_page_is_public(self):
+        """Test that anonymous visitors get a publicly cacheable page with surrogate keys"""
+        response = self.client.get(reverse('pricing'))
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('s-maxage=3600', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+        self.assertEqual(response['Surrogate-Key'], 'page-pricing')
+
+    def test_logged_in_page_is_private(self):
+        """Test that a visitor with a session never gets a shared-cacheable response"""
+        User.objects.create_user(username='edgeteacher', password='testpass123', role='teacher')
+        self.client.login(username='edgeteacher', password='testpass123')
+        response = self.client.get(reverse('pricing'))
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+        self.assertFalse(response.has_header('Surrogate-Key'))
+
+    def test_uncached_urls_are_untouched(self):
+        """Test that URLs without a policy get no Cache-Control header"""
+        response = self.client.get(reverse('teacher_login'))
+        self.assertFalse(response.has_header('Surrogate-Key'))
+        self.assertNotIn('public', response.get('Cache-Control', ''))
+
+    def test_only_published_content_gets_keys(self):
+        """Test that detail pages of drafts are not given surrogate keys"""
+        author = User.objects.create_user(username='newsauthor', password='x', role='teacher')
+        news = NewsAnnouncement.objects.create(title='Term dates', author=author, content='...', status='published')
+        draft = NewsAnnouncement.objects.create(title='Draft', author=author, content='...')
+        for item, expected in ((news, ['news', f'news-{news.pk}']), (draft, None)):
+            request = RequestFactory().get(reverse('teacher_news_detail', args=[item.slug]))
+            request.resolver_match = resolve(request.path)
+            self.assertEqual(surrogate_keys_for(request), expected)
+
+    def test_save_purges_edge_copies(self):
+        """Test that saving a resource purges its page and upload keys after commit"""
+        author = User.objects.create_user(username='resourceauthor', password='x', role='teacher')
+        with self.assertLogs('core.performance', 'INFO') as logs, self.captureOnCommitCallbacks(execute=True):
+            resource = TeachingResource.objects.create(
+                title='Fractions', author=author, content='...', image='teaching_resources/images/f.png',
+            )
+        self.assertTrue(logs.output[-1].endswith(f'purge: resource-{resource.pk} {media_key(resource.image.name)}'))
+
+    def test_http_purge_is_sent_off_the_request_thread(self):
+        """Test that HttpPurger returns at once and sends the PURGE from a background thread"""
+        sent = threading.Event()
+        threads = []
+
+        def request(method, url, **kwargs):
+            threads.append((method, kwargs['headers']['Surrogate-Key'], threading.current_thread()))
+            sent.set()
+            return mock.Mock()
+
+        with override_settings(SURROGATE_PURGE_URL='http://edge.invalid/'), \
+                mock.patch('core.http_cache.requests.request', side_effect=request):
+            HttpPurger().purge(['resource-1'])
+            self.assertTrue(sent.wait(5))
+        self.assertEqual(threads[0][:2], ('PURGE', 'resource-1'))
+        self.assertIsNot(threads[0][2], threading.current_thread())
+
+
+class TemplateWarmupTestCase(TestCase):
+    """Test template precompilation, the cached loader check and the render benchmark"""
+
+    def test_warm_up_fills_cached_loader(self):
+        """Test that every core template is compiled into the cached loader"""
+        engine = django_engines()[0]
+        loader = cached_loaders(engine)[0]
+        loader.reset()
+        with self.assertLogs('core.performance', 'INFO'):
+            compiled = warm_templates()
+        names = core_template_names()
+        self.assertIn('core/base_teacher.html', names)
+        self.assertEqual(compiled, len(names))
+        self.assertGreaterEqual(len(loader.get_template_cache), len(names))
+
+    def test_uncached_loader_fails_check_in_production(self):
+        """Test that core.E001 is raised when the cached loader is configured away"""
+        templates = [{
+            'BACKEND': 'core.timing.TimedDjangoTemplates',
+            'OPTIONS': {'loaders': ['django.template.loaders.app_directories.Loader']},
+        }]
+        with override_settings(TEMPLATES=templates, DEBUG=False):
+            self.assertEqual([error.id for error in check_cached_template_loader(None)], ['core.E001'])
+        self.assertEqual(check_cached_template_loader(None), [])
+
+    def test_benchmark_command(self):
+        """Test that benchmark_templates reports compile and render times"""
+        out = StringIO()
+        call_command('benchmark_templates', '--only', 'base_teacher', '--iterations', '3', stdout=out)
+        self.assertIn('core/base_teacher.html', out.getvalue())
+        self.assertNotIn('Error', out.getvalue())
+
+
+class Jinja2TemplatesTestCase(TestCase):
+    """Test the optional Jinja2 versions of the hot list and dashboard templates"""
+
+    def setUp(self):
+        if importlib.util.find_spec('jinja2') is None:
+            self.skipTest('Jinja2 is not installed')
+        self.admin = User.objects.create_user(username='jinjaadmin', password='x', role='school_admin', school='Jinja School')
+        teacher = User.objects.create_user(username='jinjateacher', password='x', role='teacher', school='Jinja School')
+        Class.objects.create(name='Jinja Maths', teacher=teacher, subject='maths', year_ks=2)
+
+    def render_both(self, name):
+        request = RequestFactory().get('/')
+        request.user = self.admin
+        return [
+            engine.render(sample_context(name, self.admin), request)
+            for engine in (django_engines()[0].get_template(name), engines['jinja2'].get_template_unfiltered(name))
+        ]
+
+    def test_jinja2_matches_django_output(self):
+        """Test that the Jinja2 versions render the same HTML as the Django templates"""
+        for name in ('core/school_admin_staff.html', 'core/school_admin_analytics.html'):
+            django_html, jinja2_html = self.render_both(name)
+            normalise = lambda html: [line.strip() for line in html.splitlines() if line.strip()]
+            self.assertEqual(normalise(jinja2_html), normalise(django_html), name)
+            self.assertIn('jinjateacher', jinja2_html)
+
+    def test_only_listed_templates_use_jinja2(self):
+        """Test that JINJA2_TEMPLATES selects the engine per template"""
+        self.assertEqual(get_template('core/school_admin_staff.html').backend.name, 'timing')
+        with override_settings(JINJA2_TEMPLATES=['core/school_admin_staff.html']):
+            self.assertEqual(get_template('core/school_admin_staff.html').backend.name, 'jinja2')
+            self.assertEqual(get_template('core/school_admin_classes.html').backend.name, 'timing')
+
+
+class TemporarySettingsMixin:
+    """Temporary directories and settings overrides, undone after each test"""
+
+    def temporary_directory(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return directory.name
+
+    def override(self, **options):
+        override = override_settings(**options)
+        override.enable()
+        self.addCleanup(override.disable)
+
+
+class StaticRootMixin(TemporarySettingsMixin):
+    """
+    A temporary static source directory (self.source) and STATIC_ROOT
+    (self.root); collectstatic() runs the configured storage over just the
+    files written with write_static().
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.source = self.temporary_directory()
+        self.root = self.temporary_directory()
+        self.override(
+            STATICFILES_DIRS=[self.source],
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+            STATIC_ROOT=self.root,
+        )
+
+    def static_path(self, name):
+        return os.path.join(self.source, name)
+
+    def write_static(self, name, content):
+        os.makedirs(os.path.dirname(self.static_path(name)), exist_ok=True)
+        with open(self.static_path(name), 'wb' if isinstance(content, bytes) else 'w') as asset:
+            asset.write(content)
+
+    def collectstatic(self):
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+
+class StaticAssetPipelineTestCase(StaticRootMixin, TestCase):
+    """Test collectstatic post-processing and how the results are served"""
+
+    def setUp(self):
+        super().setUp()
+        self.override(STATIC_IMAGE_VARIANT_MIN_BYTES=1024, WHITENOISE_MAX_AGE=60)
+        self.write_static('kindlewick/bundle.js', 'console.log("kindlewick");\n' * 200)
+        # Noise compresses badly as PNG, like the game's artwork
+        os.makedirs(self.static_path('kindlewick'), exist_ok=True)
+        Image.frombytes('RGB', (64, 64), os.urandom(64 * 64 * 3)).save(self.static_path('kindlewick/map.png'))
+        self.collectstatic()
+
+    def serve(self, url, **headers):
+        middleware = StaticFilesMiddleware(lambda request: HttpResponseNotFound())
+        return middleware(RequestFactory().get(url, **headers))
+
+    def test_report_lists_sizes_before_and_after(self):
+        """Test that the asset report records compressed and image variant sizes"""
+        with open(os.path.join(self.root, 'asset-report.json')) as report:
+            assets = json.load(report)['assets']
+        self.assertIn('br', assets['kindlewick/bundle.js'])
+        self.assertIn('gzip', assets['kindlewick/bundle.js'])
+        self.assertIn('webp', assets['kindlewick/map.png'])
+        self.assertLess(assets['kindlewick/map.png']['smallest'], assets['kindlewick/map.png']['original'])
+        out = StringIO()
+        call_command('static_asset_report', '--prefix', 'kindlewick/', stdout=out)
+        self.assertIn('2 files', out.getvalue())
+
+    def test_hashed_files_are_immutable(self):
+        """Test that hashed names get a far-future immutable Cache-Control and others a short one"""
+        hashed = self.serve(staticfiles_storage.url('kindlewick/bundle.js'), HTTP_ACCEPT_ENCODING='br')
+        self.assertIn('immutable', hashed['Cache-Control'])
+        self.assertEqual(hashed['Content-Encoding'], 'br')
+        self.assertEqual(self.serve('/static/kindlewick/bundle.js')['Cache-Control'], 'max-age=60, public')
+        variant = self.serve(staticfiles_storage.url('kindlewick/map.png'), HTTP_ACCEPT='image/webp')
+        self.assertEqual(variant['Content-Type'], 'image/webp')
+        self.assertIn('immutable', variant['Cache-Control'])
+
+    def test_missing_file_keeps_unhashed_url(self):
+        """Test that a template reference to a file missing from the manifest does not fail the page"""
+        with self.assertLogs('core.performance', 'WARNING'):
+            self.assertEqual(staticfiles_storage.url('core/css/missing.css'), '/static/core/css/missing.css')
+
+    def test_image_variants_are_negotiated(self):
+        """Test that browsers accepting WebP/AVIF get them instead of the PNG"""
+        modern = self.serve('/static/kindlewick/map.png', HTTP_ACCEPT='image/avif,image/webp,*/*')
+        self.assertIn(modern['Content-Type'], ('image/avif', 'image/webp'))
+        self.assertIn('Accept', modern['Vary'])
+        webp = self.serve('/static/kindlewick/map.png', HTTP_ACCEPT='image/webp,*/*')
+        self.assertEqual(webp['Content-Type'], 'image/webp')
+        legacy = self.serve('/static/kindlewick/map.png', HTTP_ACCEPT='*/*')
+        self.assertEqual(legacy['Content-Type'], 'image/png')
+        self.assertIn('Accept', legacy['Vary'])
+        refused = self.serve('/static/kindlewick/map.png', HTTP_ACCEPT='image/avif;q=0,image/webp;q=0,*/*')
+        self.assertEqual(refused['Content-Type'], 'image/png')
+
+    def test_variants_have_their_own_validators(self):
+        """Test that a WebP copy is revalidated against its own ETag, not the PNG's"""
+        png = self.serve('/static/kindlewick/map.png', HTTP_ACCEPT='*/*')
+        webp = self.serve('/static/kindlewick/map.png', HTTP_ACCEPT='image/webp')
+        self.assertNotEqual(webp['ETag'], png['ETag'])
+        self.assertEqual(int(webp['Content-Length']), os.path.getsize(os.path.join(self.root, 'kindlewick/map.png.webp')))
+        revalidated = self.serve('/static/kindlewick/map.png', HTTP_ACCEPT='image/webp', HTTP_IF_NONE_MATCH=webp['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertIn('Accept', revalidated['Vary'])
+        self.assertEqual(self.serve('/static/kindlewick/map.png', HTTP_IF_NONE_MATCH=webp['ETag']).status_code, 200)
+
+
+class TilePyramidTestCase(StaticRootMixin, TestCase):
+    """Test Deep Zoom tile pyramid generation and incremental rebuilds"""
+
+    def setUp(self):
+        super().setUp()
+        self.tiles = self.temporary_directory()
+        self.image_path = self.static_path('kindlewick/map.png')
+        os.makedirs(os.path.dirname(self.image_path))
+        Image.new('RGB', (600, 300), 'navy').save(self.image_path)
+        self.override(KINDLEWICK_TILE_SOURCES=['kindlewick/map.png'], KINDLEWICK_TILES_DIR=self.tiles)
+
+    def build(self):
+        out = StringIO()
+        call_command('build_tile_pyramids', stdout=out)
+        with open(os.path.join(self.tiles, 'map', 'manifest.json')) as manifest:
+            return json.load(manifest), out.getvalue()
+
+    def test_pyramid_levels_and_tiles(self):
+        """Test that each level halves the next and the full-size level is tiled with overlap"""
+        manifest, _ = self.build()
+        levels = manifest['levels']
+        self.assertEqual((levels[0]['width'], levels[0]['height']), (1, 1))
+        self.assertEqual(levels[-1], {'level': 10, 'width': 600, 'height': 300, 'columns': 3, 'rows': 2})
+        tile = os.path.join(self.tiles, 'map', manifest['tiles'].format(level=10, column=1, row=0))
+        with Image.open(tile) as image:
+            self.assertEqual(image.size, (258, 257))
+
+    def test_only_changed_images_are_retiled(self):
+        """Test that an unchanged image is skipped and a changed one replaces the old version"""
+        first, _ = self.build()
+        second, output = self.build()
+        self.assertIn('unchanged', output)
+        self.assertEqual(first['version'], second['version'])
+        Image.new('RGB', (600, 300), 'gold').save(self.image_path)
+        third, output = self.build()
+        self.assertNotIn('unchanged', output)
+        self.assertNotEqual(third['version'], first['version'])
+        self.assertEqual(sorted(os.listdir(os.path.join(self.tiles, 'map'))), [third['version'], 'manifest.json'])
+
+
+class KindlewickServiceWorkerTestCase(StaticRootMixin, TestCase):
+    """Test the service worker precache manifest built from staticfiles.json"""
+
+    def setUp(self):
+        super().setUp()
+        for name, content in (('app.js', 'start();'), ('map.png', 'png'), ('tiles/index.json', '{}')):
+            self.write_static(f'kindlewick/{name}', content)
+        self.override(KINDLEWICK_PRECACHE_PREFIXES=['kindlewick/'], KINDLEWICK_PRECACHE_EXCLUDE=['kindlewick/tiles/'])
+        self.collectstatic()
+
+    def test_manifest_lists_hashed_assets(self):
+        """Test that scripts are precached, images cached on use and tiles left out"""
+        assets = {asset['name']: asset for asset in precache_manifest()['assets']}
+        self.assertEqual(sorted(assets), ['kindlewick/app.js', 'kindlewick/map.png'])
+        self.assertEqual(assets['kindlewick/app.js']['url'], staticfiles_storage.url('kindlewick/app.js'))
+        self.assertEqual(assets['kindlewick/app.js']['size'], len('start();'))
+        self.assertTrue(assets['kindlewick/app.js']['precache'])
+        self.assertEqual(assets['kindlewick/map.png']['original_url'], '/static/kindlewick/map.png')
+        self.assertFalse(assets['kindlewick/map.png']['precache'])
+
+    def test_service_worker_view(self):
+        """Test that the worker embeds the manifest and is revalidated with its ETag"""
+        response = self.client.get(reverse('kindlewick_service_worker'))
+        self.assertEqual(response['Content-Type'], 'application/javascript')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertContains(response, staticfiles_storage.url('kindlewick/app.js'))
+        revalidated = self.client.get(reverse('kindlewick_service_worker'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_etag_follows_the_rendered_script(self):
+        """Test that a change to the script outside the manifest, such as the page URL, changes the ETag"""
+        etag = self.client.get(reverse('kindlewick_service_worker'))['ETag']
+        with mock.patch('core.views.reverse', return_value='/play/kindlewick/'):
+            response = self.client.get(reverse('kindlewick_service_worker'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '/play/kindlewick/')
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class PreloadTestCase(TestCase):
+    """Test Link: rel=preload headers and 103 Early Hints from {% preload %}"""
+
+    def setUp(self):
+        learned_links.clear()
+
+    def test_page_sends_preload_links(self):
+        """Test that the declared assets are sent as a Link header, also when the page is cached"""
+        for _ in range(2):
+            response = self.client.get(reverse('kindlewick'))
+            self.assertIn(f'<{static("kindlewick/app.js")}>; rel=preload; as=script', response['Link'])
+            self.assertIn('</static/kindlewick/wizardscastle.png>; rel=preload; as=image', response['Link'])
+
+    def test_early_hints_sent_before_view(self):
+        """Test that links learned from a render are sent through wsgi.early_hints on the next request"""
+        hints = []
+        self.client.get(reverse('about'), **{'wsgi.early_hints': hints.append})
+        self.assertEqual(hints, [])
+        response = self.client.get(reverse('about'), **{'wsgi.early_hints': hints.append})
+        self.assertEqual(hints, [[('Link', response['Link'])]])
+        self.assertIn('as=style', response['Link'])
+        with self.settings(EARLY_HINTS_ENABLED=False):
+            request = RequestFactory().get(reverse('about'), **{'wsgi.early_hints': hints.append})
+            request.resolver_match = resolve(reverse('about'))
+            PreloadMiddleware(lambda request: None).process_view(request, None, (), {})
+        self.assertEqual(len(hints), 1)
+
+
+class ImageDerivativesTestCase(TemporarySettingsMixin, TestCase):
+    """Test resized WebP/JPEG copies of uploads and the srcset tag"""
+
+    def setUp(self):
+        self.override(MEDIA_ROOT=self.temporary_directory(), IMAGE_DERIVATIVE_WORKERS=0)
+        content_cache.bump()
+        self.author = User.objects.create_user(username='imageauthor', password='x', role='teacher')
+
+    def upload(self, name='cat.png', size=(1200, 800)):
+        buffer = BytesIO()
+        Image.new('RGBA', size, (200, 80, 40, 128)).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_upload_builds_derivatives_after_commit(self):
+        """Test that saving a resource builds each width in WebP and JPEG once the transaction commits"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            resource = TeachingResource.objects.create(title='Cats', author=self.author, image=self.upload())
+        name = resource.image.name
+        self.assertIsNone(image_derivatives(name))
+        for callback in callbacks:
+            callback()
+        self.assertEqual(image_derivatives(name)['widths'], [320, 640, 960])
+        for width in (320, 640, 960):
+            for extension in ('webp', 'jpg'):
+                self.assertTrue(default_storage.exists(derivative_name(name, width, extension)))
+
+    def test_same_stem_with_other_extension_gets_its_own_copies(self):
+        """Test that cat.png and cat.jpg do not overwrite each other's derivatives"""
+        self.assertEqual(derivative_name('images/cat.png', 320, 'webp'), 'images/cat_png_320w.webp')
+        self.assertNotEqual(derivative_name('images/cat.jpg', 320, 'webp'), derivative_name('images/cat.png', 320, 'webp'))
+        self.assertNotEqual(derivatives_manifest_name('images/cat.jpg'), derivatives_manifest_name('images/cat.png'))
+
+    def test_small_images_are_not_upscaled(self):
+        """Test that an image narrower than every width gets one copy at its own size"""
+        resource = TeachingResource.objects.create(title='Icon', author=self.author, image=self.upload('icon.png', (100, 50)))
+        self.assertEqual(build_derivatives(resource.image.name)['widths'], [100])
+
+    def test_responsive_image_tag(self):
+        """Test that the tag falls back to the original and then emits WebP and JPEG srcsets"""
+        resource = TeachingResource.objects.create(title='Dogs', author=self.author, image=self.upload('dog.png'))
+        template = Template('{% load images %}{% responsive_image resource.image alt=resource.title %}')
+        html = template.render(Context({'resource': resource}))
+        self.assertIn(f'src="{resource.image.url}"', html)
+        self.assertNotIn('srcset', html)
+        build_derivatives(resource.image.name)
+        html = template.render(Context({'resource': resource}))
+        storage = resource.image.storage
+        self.assertIn(f'<source type="image/webp" srcset="{storage.url(derivative_name(resource.image.name, 320, "webp"))} 320w,', html)
+        self.assertIn(f'{storage.url(derivative_name(resource.image.name, 960, "jpg"))} 960w', html)
+        self.assertIn('width="320" height="213" alt="Dogs"', html)
+
+    def test_backfill_command(self):
+        """Test that build_image_derivatives builds missing derivatives and skips built ones"""
+        ForumPost.objects.create(title='Photo', author=self.author, content='...', image=self.upload('photo.png'))
+        out = StringIO()
+        call_command('build_image_derivatives', stdout=out)
+        self.assertIn('Built 1, already built 0', out.getvalue())
+        call_command('build_image_derivatives', stdout=out)
+        self.assertIn('Built 0, already built 1', out.getvalue())
+
+
+class ResourceUploadTestCase(TemporarySettingsMixin, TestCase):
+    """Test chunked, resumable uploads of a resource's file"""
+
+    def setUp(self):
+        self.override(MEDIA_ROOT=self.temporary_directory(), RESOURCE_UPLOAD_CHUNK_BYTES=4)
+        self.author = User.objects.create_user(username='uploadauthor', password='x', role='teacher')
+        self.resource = TeachingResource.objects.create(title='Slides', author=self.author)
+        self.client.force_login(self.author)
+        self.content = b'0123456789'
+
+    def sha256(self, data):
+        return hashlib.sha256(data).hexdigest()
+
+    def start(self, **overrides):
+        data = {'filename': 'slides.pptx', 'size': len(self.content), 'sha256': self.sha256(self.content), **overrides}
+        return self.client.post(
+            reverse('api_resource_upload_start', kwargs={'slug': self.resource.slug}), data, content_type='application/json'
+        )
+
+    def send(self, upload_id, offset, chunk, checksum=None):
+        return self.client.patch(
+            reverse('api_resource_upload', kwargs={'upload_id': upload_id}), chunk,
+            content_type='application/octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset), HTTP_CHUNK_SHA256=checksum or self.sha256(chunk),
+        )
+
+    def test_chunks_are_assembled_into_the_resource_file(self):
+        """Test that chunks sent in order are moved into place as resource.file"""
+        upload_id = self.start().json()['id']
+        for offset in range(0, len(self.content), 4):
+            response = self.send(upload_id, offset, self.content[offset:offset + 4])
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['offset'], 10)
+        response = self.client.post(reverse('api_resource_upload', kwargs={'upload_id': upload_id}))
+        self.assertEqual(response.json()['status'], 'complete')
+        self.resource.refresh_from_db()
+        self.assertEqual(self.resource.file.name, 'teaching_resources/slides.pptx')
+        with self.resource.file.open('rb') as assembled:
+            self.assertEqual(assembled.read(), self.content)
+
+    def test_resume_and_bad_chunks(self):
+        """Test that a corrupt or out-of-order chunk is rejected without moving the offset"""
+        upload_id = self.start().json()['id']
+        self.send(upload_id, 0, b'0123')
+        response = self.send(upload_id, 4, b'4567', checksum=self.sha256(b'wrong'))
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.json()['offset'], 4)
+        self.assertEqual(self.send(upload_id, 0, b'0123').status_code, 409)
+        self.assertEqual(self.send(upload_id, 4, b'45678').status_code, 413)
+        response = self.client.get(reverse('api_resource_upload', kwargs={'upload_id': upload_id}))
+        self.assertEqual(response.json()['offset'], 4)
+
+    def test_final_checksum_mismatch_fails_the_upload(self):
+        """Test that a file not matching the declared SHA-256 is never attached"""
+        upload_id = self.start(sha256=self.sha256(b'something else')).json()['id']
+        for offset in range(0, len(self.content), 4):
+            self.send(upload_id, offset, self.content[offset:offset + 4])
+        response = self.client.post(reverse('api_resource_upload', kwargs={'upload_id': upload_id}))
+        self.assertEqual(response.status_code, 422)
+        self.resource.refresh_from_db()
+        self.assertFalse(self.resource.file)
+
+    def test_start_is_validated(self):
+        """Test that only the author may upload, and only supported types"""
+        self.assertEqual(self.start(filename='run.exe').status_code, 400)
+        self.assertEqual(self.start(sha256='abc').status_code, 400)
+        self.client.force_login(User.objects.create_user(username='otherteacher', password='x', role='teacher'))
+        self.assertEqual(self.start().status_code, 403)
+
+    def test_clear_stale_uploads(self):
+        """Test that idle uploads and their partial files are removed"""
+        upload = ResourceUpload.objects.get(pk=self.start().json()['id'])
+        self.assertEqual(clear_stale_uploads(), 0)
+        ResourceUpload.objects.filter(pk=upload.pk).update(updated_at=timezone.now() - timedelta(days=2))
+        self.assertEqual(clear_stale_uploads(), 1)
+        self.assertFalse(os.path.exists(partial_path(upload)))
+
+    def test_only_one_chunk_claims_an_offset(self):
+        """Test that a chunk sent for an offset another request has just moved past is discarded"""
+        upload_id = self.start().json()['id']
+        stale = ResourceUpload.objects.get(pk=upload_id)
+        self.send(upload_id, 0, b'0123')
+        with self.assertRaises(UploadError) as raised:
+            append_chunk(stale, 0, BytesIO(b'abcd'), 4, self.sha256(b'abcd'))
+        self.assertEqual(raised.exception.status_code, 409)
+        self.assertEqual(stale.offset, 4)
+        with open(partial_path(stale), 'rb') as part:
+            self.assertEqual(part.read(), b'0123')
+        self.assertEqual(os.listdir(os.path.dirname(partial_path(stale))), [f'{upload_id}.part'])
+
+    def test_failed_copy_gives_the_offset_back(self):
+        """Test that a chunk claimed but not written to the partial file can be resent"""
+        upload = ResourceUpload.objects.get(pk=self.start().json()['id'])
+        with mock.patch('core.uploads.shutil.copyfileobj', side_effect=OSError('No space left on device')):
+            with self.assertRaises(OSError):
+                append_chunk(upload, 0, BytesIO(b'0123'), 4, self.sha256(b'0123'))
+        upload.refresh_from_db()
+        self.assertEqual(upload.offset, 0)
+        self.assertEqual(self.send(upload.pk, 0, b'0123').json()['offset'], 4)
+
+    def test_finish_waits_for_the_last_chunk_to_be_written(self):
+        """Test that assembling refuses, without failing the upload, while the partial file is short"""
+        upload_id = self.start().json()['id']
+        self.send(upload_id, 0, b'0123')
+        ResourceUpload.objects.filter(pk=upload_id).update(offset=len(self.content))
+        response = self.client.post(reverse('api_resource_upload', kwargs={'upload_id': upload_id}))
+        self.assertEqual(response.status_code, 409)
+        upload = ResourceUpload.objects.get(pk=upload_id)
+        self.assertEqual(upload.status, 'uploading')
+        self.assertTrue(os.path.exists(partial_path(upload)))
+
+
+class DeduplicatedStorageTestCase(TemporarySettingsMixin, TestCase):
+    """Test content-addressed media storage with reference counting"""
+
+    def setUp(self):
+        self.media_root = self.temporary_directory()
+        self.override(MEDIA_ROOT=self.media_root, IMAGE_DERIVATIVE_WORKERS=0)
+        self.storage = default_storage
+        self.author = User.objects.create_user(username='dedupeauthor', password='x', role='teacher')
+
+    def test_identical_uploads_share_one_blob(self):
+        """Test that the same content saved twice is stored once and freed with its last reference"""
+        first = self.storage.save('teaching_resources/sheet.pdf', ContentFile(b'%PDF worksheet'))
+        second = self.storage.save('teaching_resources/sheet.pdf', ContentFile(b'%PDF worksheet'))
+        self.assertNotEqual(first, second)
+        digest = hashlib.sha256(b'%PDF worksheet').hexdigest()
+        blob = self.storage.path(self.storage.blob_name(digest, first))
+        self.assertTrue(os.path.samefile(blob, self.storage.path(second)))
+        self.assertEqual(os.stat(blob).st_nlink, 3)
+        self.assertEqual(self.storage.url(first), f'/media/blobs/files/{digest[:2]}/{digest}/sheet.pdf')
+        with self.storage.open(second) as stored:
+            self.assertEqual(stored.read(), b'%PDF worksheet')
+
+        self.storage.delete(first)
+        self.assertTrue(os.path.exists(blob))
+        self.storage.delete(second)
+        self.assertFalse(os.path.exists(blob))
+        self.assertFalse(os.path.lexists(self.storage.path(self.storage.alias_name(digest, first))))
+
+    def test_blob_url_is_a_real_file_named_like_the_upload(self):
+        """Test that url() is stable, memoised, and served by a plain MEDIA_URL -> MEDIA_ROOT mapping"""
+        name = self.storage.save('teaching_resources/Unit 3 worksheet.PDF', ContentFile(b'%PDF unit 3'))
+        url = self.storage.url(name)
+        digest = self.storage.content_hash(name)
+        self.assertTrue(url.endswith(f'/{digest}/Unit%203%20worksheet.PDF'))
+        with mock.patch('builtins.open', side_effect=AssertionError('url() read the hash record again')):
+            self.assertEqual(self.storage.url(name), url)
+        _content_hashes.clear()
+        self.assertEqual(self.storage.url(name), url)
+        self.assertEqual(list(self.storage.orphaned_blobs()), [])
+
+        path = unquote(url).removeprefix('/media/')
+        response = serve(RequestFactory().get(url), path, document_root=self.media_root)
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF unit 3')
+
+        self.storage.delete(name)
+        self.assertIsNone(self.storage.content_hash(name))
+        self.assertEqual(self.storage.url(name), '/media/teaching_resources/Unit%203%20worksheet.PDF')
+
+    def test_file_fields_keep_their_names(self):
+        """Test that FileFields store the usual upload_to names"""
+        resource = TeachingResource.objects.create(
+            title='Deck', author=self.author, file=SimpleUploadedFile('deck.pptx', b'slides'),
+        )
+        self.assertEqual(resource.file.name, 'teaching_resources/deck.pptx')
+        self.assertEqual(resource.file.size, 6)
+
+    def test_dedupe_media_command(self):
+        """Test that dedupe_media links existing duplicates to one blob and frees the copies"""
+        for name in ('forum_posts/a.png', 'forum_posts/b.png', 'help/c.png'):
+            os.makedirs(os.path.dirname(os.path.join(self.media_root, name)), exist_ok=True)
+            with open(os.path.join(self.media_root, name), 'wb') as legacy:
+                legacy.write(b'same image')
+        out = StringIO()
+        call_command('dedupe_media', '--dry-run', stdout=out)
+        self.assertIn('3 files checked, would free 20 bytes', out.getvalue())
+        call_command('dedupe_media', stdout=out)
+        self.assertIn('3 files checked, freed 20 bytes', out.getvalue())
+        self.assertTrue(os.path.samefile(self.storage.path('forum_posts/a.png'), self.storage.path('help/c.png')))
+        call_command('dedupe_media', stdout=out)
+        self.assertIn('0 files checked, freed 0 bytes', out.getvalue())
+
+
+# ============================================================================
+# QUERY COUNT GUARDS
+# ============================================================================
+
+class QueryGuard:
+    """
+    Upper bound on the queries one URL may run. `kwargs` maps URL kwargs to
+    keys of the fixture built by QueryCountGuardTestCase.build_school, e.g.
+    QueryGuard('api_kindlewick_session_detail', 'student', 4, {'session_id': 'session_id'}).
+    `status` is the response status the GET must return at both sizes.
+    """
+
+    def __init__(self, url_name, role, max_queries, kwargs=None, path=None, status=200):
+        self.url_name = url_name
+        self.role = role
+        self.max_queries = max_queries
+        self.kwargs = kwargs or {}
+        self.path = path
+        self.status = status
+
+    @property
+    def name(self):
+        return self.url_name or self.path
+
+    def url(self, fixture):
+        if self.path:
+            return self.path
+        return reverse(self.url_name, kwargs={key: fixture[value] for key, value in self.kwargs.items()})
+
+
+# One line per URL in core/urls.py; test_every_url_is_guarded enforces it
+QUERY_GUARDS = [
+    QueryGuard('home', None, 0),
+    QueryGuard('about', None, 0),
+    QueryGuard('kindlewick', 'student', 0),
+    QueryGuard('kindlewick_service_worker', None, 0),
+    QueryGuard('wonderworld', 'student', 2),
+    QueryGuard('questopia', 'student', 2),
+    QueryGuard('pricing', None, 0),
+    QueryGuard('teacher_hub', None, 0),
+    QueryGuard('contact', None, 0),
+    QueryGuard('signup', None, 1),
+    QueryGuard('student_signup', None, 0),
+    QueryGuard('student_signup_guided', None, 0),
+    QueryGuard('student_dashboard', 'student', 2),
+    QueryGuard('teacher_login', None, 0),
+    QueryGuard('logout', 'teacher', 4, status=302),
+    QueryGuard('teacher_dashboard', 'teacher', 2),
+    QueryGuard('teacher_analytics', 'teacher', 2),
+    QueryGuard('add_class', 'teacher', 2),
+    QueryGuard('teacher_news', 'teacher', 2),
+    QueryGuard('teacher_help', 'teacher', 2),
+    QueryGuard('teacher_resources', 'teacher', 2),
+    QueryGuard('teacher_forum', 'teacher', 2),
+    QueryGuard('api_current_user', 'student', 3),
+    QueryGuard('api_kindlewick_progress', 'student', 3),
+    QueryGuard('api_kindlewick_sessions', 'student', 3),
+    QueryGuard('api_kindlewick_session_detail', 'student', 4, {'session_id': 'session_id'}),
+    # Includes loading the roster on a cold roster cache
+    QueryGuard('api_kindlewick_teacher_progress', 'teacher', 4),
+    QueryGuard('api_kindlewick_teacher_sessions', 'teacher', 4),
+    QueryGuard('api_kindlewick_school_admin_progress', 'school_admin', 4),
+    QueryGuard('api_kindlewick_school_admin_sessions', 'school_admin', 4),
+    QueryGuard('api_resource_upload_start', 'teacher', 3, {'slug': 'resource_slug'}, status=405),
+    QueryGuard('api_resource_upload', 'teacher', 5, {'upload_id': 'upload_id'}),
+    QueryGuard('school_admin_dashboard', 'school_admin', 2),
+    QueryGuard('school_admin_staff', 'school_admin', 2),
+    QueryGuard('school_admin_classes', 'school_admin', 2),
+    QueryGuard('school_admin_analytics', 'school_admin', 2),
+    QueryGuard('school_admin_activity_log', 'school_admin', 2),
+]
+
+# URLs whose views answer 500 before doing any work (stub views without a
+# template, or without the URL's kwargs in their signature). Each moves into
+# QUERY_GUARDS once its view is implemented.
+KNOWN_BROKEN_URLS = {
+    '/api/hello/',
+    'create_student',
+    'class_detail',
+    'class_analytics',
+    'student_analytics',
+    'remove_student',
+    'transfer_student',
+    'teacher_news_detail',
+    'teacher_help_detail',
+    'teacher_resource_detail',
+    'teacher_resource_edit',
+    'teacher_resource_delete',
+    'teacher_resource_comment_delete',
+    'teacher_forum_detail',
+    'teacher_forum_edit',
+    'teacher_forum_delete',
+    'teacher_forum_reply_edit',
+    'teacher_forum_reply_delete',
+    'profile',
+    'account_settings',
+    'get_avatar',
+    'save_avatar',
+    'randomize_avatar',
+}
+
+
+class QueryCountGuardTestCase(TestCase):
+    """
+    Request every URL as a member of a 5-student school and a 200-student
+    school. Each must stay under its QueryGuard bound at both sizes and must
+    not run more queries for the larger class, which catches O(N) loops.
+    Set QUERY_COUNT_REPORT to a file path to append the counts to a history
+    that `manage.py query_count_report` prints.
+    """
+
+    SIZES = {'small': 5, 'large': 200}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixtures = {size: cls.build_school(size, students) for size, students in cls.SIZES.items()}
+
+    @classmethod
+    def build_school(cls, label, student_count):
+        school = f'Guard School {label}'
+        password = make_password('testpass123')
+        teacher = User.objects.create(username=f'guard_{label}_teacher', password=password, role='teacher', school=school)
+        admin = User.objects.create(username=f'guard_{label}_admin', password=password, role='school_admin', school=school)
+        clazz = Class.objects.create(name=f'Guard {label}', teacher=teacher, subject='maths', year_ks=2)
+        User.objects.bulk_create([
+            User(username=f'guard_{label}_student{i}', password=password, role='student', school=school)
+            for i in range(student_count)
+        ])
+        students = list(User.objects.filter(username__startswith=f'guard_{label}_student').order_by('id'))
+        ClassStudent.objects.bulk_create([ClassStudent(student=student, clazz=clazz) for student in students])
+        Avatar.objects.bulk_create([Avatar(user=student) for student in students])
+        KindlewickGameProgress.objects.bulk_create([
+            KindlewickGameProgress(user=student, game_type='map', current_level=2, score=10)
+            for student in students
+        ])
+        sessions = KindlewickGameSession.objects.bulk_create([
+            KindlewickGameSession(user=student, game_type='map', level=level, score=level * 10)
+            for student in students
+            for level in (1, 2)
+        ])
+        resource = TeachingResource.objects.create(
+            title=f'Guard resource {label}', slug=f'guard-resource-{label}', author=teacher,
+            status='published', published_at=timezone.now(),
+        )
+        resource.likes.add(*students[:3])
+        comment = ResourceComment.objects.create(resource=resource, author=teacher, content='Comment')
+        post = ForumPost.objects.create(title=f'Guard post {label}', author=teacher, content='Post')
+        reply = ForumReply.objects.create(post=post, author=teacher, content='Reply')
+        news = NewsAnnouncement.objects.create(
+            title=f'Guard news {label}', slug=f'guard-news-{label}', author=teacher, content='News', status='published',
+        )
+        help_tutorial = HelpTutorial.objects.create(
+            title=f'Guard help {label}', slug=f'guard-help-{label}', author=teacher, content='Help', status='published',
+        )
+        upload = ResourceUpload.objects.create(resource=resource, user=teacher, filename='guard.pdf', size=10, sha256='0' * 64)
+        return {
+            'users': {'teacher': teacher, 'school_admin': admin, 'student': students[0]},
+            'class_id': clazz.id,
+            'student_id': students[0].id,
+            'session_id': next(session.id for session in sessions if session.user_id == students[0].id),
+            'resource_slug': resource.slug,
+            'comment_id': comment.id,
+            'post_id': post.id,
+            'reply_id': reply.id,
+            'news_slug': news.slug,
+            'help_slug': help_tutorial.slug,
+            'upload_id': upload.pk,
+        }
+
+    def count_queries(self, guard, fixture):
+        """Return the response status and query count of a GET of the guarded URL"""
+        client = Client(raise_request_exception=False)
+        if guard.role:
+            client.force_login(fixture['users'][guard.role])
+        with record_queries() as recorder:
+            response = client.get(guard.url(fixture))
+        return response.status_code, recorder.count
+
+    def test_every_url_is_guarded(self):
+        """Test that each pattern in core/urls.py has a QueryGuard or is listed as known broken"""
+        guarded = {guard.name for guard in QUERY_GUARDS}
+        self.assertFalse(guarded & KNOWN_BROKEN_URLS)
+        names = set()
+        for pattern in urlpatterns:
+            name = pattern.name or f'/{pattern.pattern}'
+            names.add(name)
+            self.assertIn(name, guarded | KNOWN_BROKEN_URLS, f'Add a QueryGuard for {name} to QUERY_GUARDS')
+        self.assertLessEqual(KNOWN_BROKEN_URLS, names)
+
+    def test_query_counts(self):
+        """Test statuses and query bounds at both data sizes, and that counts do not grow with class size"""
+        counts = {}
+        for guard in QUERY_GUARDS:
+            results = {size: self.count_queries(guard, fixture) for size, fixture in self.fixtures.items()}
+            counts[guard.name] = {size: count for size, (status, count) in results.items()}
+            with self.subTest(url=guard.name, **counts[guard.name]):
+                for size, (status, count) in results.items():
+                    self.assertEqual(status, guard.status, f'{guard.name} answered {status} for the {size} school')
+                self.assertLessEqual(max(counts[guard.name].values()), guard.max_queries)
+                self.assertLessEqual(counts[guard.name]['large'], counts[guard.name]['small'])
+
+        report = os.environ.get('QUERY_COUNT_REPORT')
+        if report:
+            append_query_counts(report, counts, label=os.environ.get('QUERY_COUNT_LABEL', ''))
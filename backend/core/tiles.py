@@ -0,0 +1,77 @@
+import hashlib
+import math
+from pathlib import Path
+
+from PIL import Image
+
+from .storage import file_sha256
+
+# --format choice -> (Pillow format, save options)
+TILE_FORMATS = {
+    'webp': ('WEBP', {'quality': 85, 'method': 6}),
+    'png': ('PNG', {'optimize': True}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True}),
+}
+
+
+def pyramid_version(source_sha256, tile_size, overlap, tile_format):
+    """Directory name for one build: changes with the image or the tiling options"""
+    return hashlib.sha256(f'{source_sha256}:{tile_size}:{overlap}:{tile_format}'.encode()).hexdigest()[:12]
+
+
+def pyramid_levels(width, height):
+    """
+    Deep Zoom levels as (level, width, height): the last level is the full
+    image, each level below halves the one above, down to 1x1 at level 0
+    """
+    max_level = math.ceil(math.log2(max(width, height, 1)))
+    return [
+        (level, max(1, math.ceil(width / 2 ** (max_level - level))), max(1, math.ceil(height / 2 ** (max_level - level))))
+        for level in range(max_level + 1)
+    ]
+
+
+def build_pyramid(source, output_dir, tile_size=256, overlap=1, tile_format='webp'):
+    """
+    Slice an image into a Deep Zoom tile pyramid under
+    output_dir/<version>/<level>/<column>_<row>.<format> and return its
+    manifest. Tiles overlap their neighbours by `overlap` pixels on each
+    inner edge, as Deep Zoom viewers expect.
+    """
+    source_sha256 = file_sha256(source)
+    version = pyramid_version(source_sha256, tile_size, overlap, tile_format)
+    image_format, options = TILE_FORMATS[tile_format]
+    levels = []
+    with Image.open(source) as image:
+        has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+        scaled = image.convert('RGBA' if has_alpha and tile_format != 'jpeg' else 'RGB')
+        width, height = scaled.size
+        # Largest level first, so each level is downscaled from the one above
+        for level, level_width, level_height in reversed(pyramid_levels(width, height)):
+            if scaled.size != (level_width, level_height):
+                scaled = scaled.resize((level_width, level_height), Image.Resampling.LANCZOS)
+            columns, rows = math.ceil(level_width / tile_size), math.ceil(level_height / tile_size)
+            level_dir = Path(output_dir) / version / str(level)
+            level_dir.mkdir(parents=True, exist_ok=True)
+            for column in range(columns):
+                for row in range(rows):
+                    box = (
+                        max(0, column * tile_size - overlap),
+                        max(0, row * tile_size - overlap),
+                        min(level_width, (column + 1) * tile_size + overlap),
+                        min(level_height, (row + 1) * tile_size + overlap),
+                    )
+                    scaled.crop(box).save(level_dir / f'{column}_{row}.{tile_format}', image_format, **options)
+            levels.insert(0, {'level': level, 'width': level_width, 'height': level_height, 'columns': columns, 'rows': rows})
+    return {
+        'sha256': source_sha256,
+        'version': version,
+        'width': width,
+        'height': height,
+        'tile_size': tile_size,
+        'overlap': overlap,
+        'format': tile_format,
+        # Relative to the manifest's URL
+        'tiles': f'{version}/{{level}}/{{column}}_{{row}}.{tile_format}',
+        'levels': levels,
+    }
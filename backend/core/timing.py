@@ -0,0 +1,164 @@
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+from django.template.backends.django import DjangoTemplates
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+
+from .cache import TwoTierCache
+
+_current_timings = ContextVar('core_request_timings', default=None)
+
+
+class RequestTimings:
+    """Accumulated time per phase (db, cache, template, serialize) for one request"""
+
+    def __init__(self):
+        self.durations = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.active = set()
+
+    def add(self, phase, seconds):
+        self.durations[phase] += seconds
+        self.counts[phase] += 1
+
+    def server_timing(self, total=None):
+        """Format the phases as a Server-Timing header value (durations in ms)"""
+        metrics = [
+            f'{phase};dur={seconds * 1000:.1f};desc="{self.counts[phase]} calls"'
+            for phase, seconds in self.durations.items()
+        ]
+        if total is not None:
+            metrics.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(metrics)
+
+
+def current_timings():
+    return _current_timings.get()
+
+
+@contextmanager
+def collect_timings():
+    """Collect phase timings for everything executed inside the block"""
+    timings = RequestTimings()
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
+
+
+@contextmanager
+def timed(phase):
+    """
+    Add the block's duration to a phase. Nested blocks for the same phase
+    (e.g. get_many() calling get()) are only counted once, and the whole thing
+    is a no-op outside collect_timings().
+    """
+    timings = _current_timings.get()
+    if timings is None or phase in timings.active:
+        yield
+        return
+    timings.active.add(phase)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.active.discard(phase)
+        timings.add(phase, time.perf_counter() - start)
+
+
+def db_execute_timer(execute, sql, params, many, context):
+    """Database execute wrapper feeding the 'db' phase"""
+    with timed('db'):
+        return execute(sql, params, many, context)
+
+
+class TimedTemplate:
+    """Wrap a backend template so top-level renders feed the 'template' phase"""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        with timed('template'):
+            return self.template.render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    Django template backend that times rendering. Django only sends the
+    template_rendered signal under the test runner, so production timing has
+    to happen at the backend instead.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+class TimedCacheMixin:
+    """Feed cache backend calls into the 'cache' phase"""
+
+    def get(self, *args, **kwargs):
+        with timed('cache'):
+            return super().get(*args, **kwargs)
+
+    def set(self, *args, **kwargs):
+        with timed('cache'):
+            return super().set(*args, **kwargs)
+
+    def add(self, *args, **kwargs):
+        with timed('cache'):
+            return super().add(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with timed('cache'):
+            return super().delete(*args, **kwargs)
+
+    def get_many(self, *args, **kwargs):
+        with timed('cache'):
+            return super().get_many(*args, **kwargs)
+
+    def set_many(self, *args, **kwargs):
+        with timed('cache'):
+            return super().set_many(*args, **kwargs)
+
+
+class TimedLocMemCache(TimedCacheMixin, LocMemCache):
+    pass
+
+
+class TimedFileBasedCache(TimedCacheMixin, FileBasedCache):
+    pass
+
+
+class TimedRedisCache(TimedCacheMixin, RedisCache):
+    pass
+
+
+class TimedTwoTierCache(TimedCacheMixin, TwoTierCache):
+    def get_with_tier(self, *args, **kwargs):
+        with timed('cache'):
+            return super().get_with_tier(*args, **kwargs)
+
+
+class TimedJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed('serialize'):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class TimedBrowsableAPIRenderer(BrowsableAPIRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed('serialize'):
+            return super().render(data, accepted_media_type, renderer_context)
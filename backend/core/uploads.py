@@ -0,0 +1,186 @@
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from .models import ResourceUpload
+from .queries import performance_logger
+from .storage import file_sha256
+
+PARTIAL_DIR = 'uploads/partial'
+READ_BYTES = 64 * 1024
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class PartFile(File):
+    """An assembled upload; storages move it into place, like a TemporaryUploadedFile"""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+class UploadError(Exception):
+    """A rejected upload request; status_code is the HTTP status to answer with"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def partial_path(upload):
+    """Filesystem path the upload's chunks are appended to"""
+    return default_storage.path(f'{PARTIAL_DIR}/{upload.pk}.part')
+
+
+def start_upload(resource, user, filename, size, sha256):
+    """
+    Begin a chunked upload of `resource.file`, after checking the declared
+    name, size and whole-file SHA-256 against the RESOURCE_UPLOAD_* limits.
+    """
+    filename = os.path.basename(str(filename or ''))
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in settings.RESOURCE_UPLOAD_EXTENSIONS:
+        raise UploadError(f'Unsupported file type {extension or "(none)"}')
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError('size must be an integer')
+    if size <= 0:
+        raise UploadError('size must be positive')
+    if size > settings.RESOURCE_UPLOAD_MAX_BYTES:
+        raise UploadError('File is too large', status_code=413)
+    sha256 = str(sha256 or '').lower()
+    if not SHA256_RE.match(sha256):
+        raise UploadError('sha256 must be 64 hex digits')
+
+    upload = ResourceUpload.objects.create(resource=resource, user=user, filename=filename, size=size, sha256=sha256)
+    os.makedirs(os.path.dirname(partial_path(upload)), exist_ok=True)
+    open(partial_path(upload), 'wb').close()
+    return upload
+
+
+def append_chunk(upload, offset, stream, length, checksum):
+    """
+    Append `length` bytes read from `stream` at `offset`, which must equal the
+    bytes already received (a client resuming after a dropped connection asks
+    for the upload first to learn it). A chunk whose SHA-256 does not match
+    `checksum` is discarded, leaving the offset where it was.
+
+    No transaction or row lock is held while a slow client sends the chunk:
+    it is streamed to a file of its own, claimed with an UPDATE conditional on
+    the offset not having moved, and only then copied into the partial file.
+    If the copy fails, the claim is undone.
+    """
+    if upload.status != 'uploading':
+        raise UploadError(f'Upload is {upload.status}', status_code=409)
+    try:
+        offset, length = int(offset), int(length)
+    except (TypeError, ValueError):
+        raise UploadError('Upload-Offset and Content-Length are required')
+    if offset != upload.offset:
+        raise UploadError(f'Expected offset {upload.offset}', status_code=409)
+    if length <= 0:
+        raise UploadError('Empty chunk')
+    if length > settings.RESOURCE_UPLOAD_CHUNK_BYTES:
+        raise UploadError('Chunk is too large', status_code=413)
+    if offset + length > upload.size:
+        raise UploadError('Chunk runs past the declared size', status_code=413)
+    checksum = str(checksum or '').lower()
+    if not SHA256_RE.match(checksum):
+        raise UploadError('Chunk-SHA256 must be 64 hex digits')
+
+    fd, chunk_path = tempfile.mkstemp(suffix='.chunk', dir=os.path.dirname(partial_path(upload)))
+    try:
+        with os.fdopen(fd, 'w+b') as chunk:
+            digest = hashlib.sha256()
+            received = 0
+            while received < length:
+                block = stream.read(min(READ_BYTES, length - received))
+                if not block:
+                    break
+                digest.update(block)
+                chunk.write(block)
+                received += len(block)
+            if received != length:
+                raise UploadError('Chunk was cut short')
+            if digest.hexdigest() != checksum:
+                raise UploadError('Chunk checksum mismatch', status_code=422)
+
+            # Another request for the same offset may have won meanwhile
+            now = timezone.now()
+            claimed = ResourceUpload.objects.filter(pk=upload.pk, status='uploading', offset=offset).update(
+                offset=offset + length, updated_at=now
+            )
+            if not claimed:
+                upload.refresh_from_db(fields=['status', 'offset', 'updated_at'])
+                raise UploadError(f'Expected offset {upload.offset}', status_code=409)
+
+            try:
+                chunk.seek(0)
+                with open(partial_path(upload), 'r+b') as part:
+                    part.seek(offset)
+                    shutil.copyfileobj(chunk, part, READ_BYTES)
+            except BaseException:
+                # Give the offset back, so the client resends this chunk
+                ResourceUpload.objects.filter(pk=upload.pk, offset=offset + length).update(offset=offset)
+                raise
+    finally:
+        os.remove(chunk_path)
+
+    upload.offset, upload.updated_at = offset + length, now
+    return upload
+
+
+def finish_upload(upload):
+    """
+    Check the assembled file against the SHA-256 declared at the start and
+    move it into place as the resource's file (a rename, not a copy). A
+    mismatch fails the upload.
+    """
+    if upload.status != 'uploading':
+        raise UploadError(f'Upload is {upload.status}', status_code=409)
+    if upload.offset != upload.size:
+        raise UploadError(f'Received {upload.offset} of {upload.size} bytes', status_code=409)
+    path = partial_path(upload)
+    if os.path.getsize(path) < upload.size:
+        # The last chunk is claimed but still being copied in
+        raise UploadError('The last chunk is still being written; retry', status_code=409)
+    if file_sha256(path) != upload.sha256:
+        os.remove(path)
+        upload.status = 'failed'
+        upload.save(update_fields=['status', 'updated_at'])
+        raise UploadError('File checksum mismatch', status_code=422)
+
+    resource = upload.resource
+    with PartFile(open(path, 'rb'), name=upload.filename) as part:
+        resource.file.save(upload.filename, part, save=False)
+    resource.save(update_fields=['file', 'updated_at'])
+    upload.status = 'complete'
+    upload.save(update_fields=['status', 'updated_at'])
+    performance_logger.info('Assembled %d-byte upload %s as %s', upload.size, upload.pk, resource.file.name)
+    return resource
+
+
+def abort_upload(upload):
+    if os.path.exists(partial_path(upload)):
+        os.remove(partial_path(upload))
+    upload.delete()
+
+
+def clear_stale_uploads(hours=24):
+    """Abort uploads that have not received a chunk for `hours`. Returns how many."""
+    cutoff = timezone.now() - timedelta(hours=hours)
+    stale = ResourceUpload.objects.filter(status__in=['uploading', 'failed'], updated_at__lt=cutoff)
+    count = 0
+    for upload in stale:
+        abort_upload(upload)
+        count += 1
+    return count
@@ -19,7 +19,7 @@ from .views import (
     current_user_api, kindlewick_progress_list, kindlewick_sessions, kindlewick_session_detail,
     kindlewick_teacher_progress, kindlewick_teacher_sessions,
     kindlewick_school_admin_progress, kindlewick_school_admin_sessions,
-    custom_logout_view
+    custom_logout_view, kindlewick_service_worker, resource_upload_start, resource_upload_detail
 )
 
 handler404 = 'core.views.custom_404_view'
@@ -28,6 +28,7 @@ urlpatterns = [
     path("", home_page_view, name="home"),
     path("about/", about_page_view, name="about"),
     path("kindlewick/", kindlewick_page_view, name="kindlewick"),
+    path("kindlewick/sw.js", kindlewick_service_worker, name="kindlewick_service_worker"),
     path("wonderworld/", wonderworld_page_view, name="wonderworld"),
     path("questopia/", questopia_page_view, name="questopia"),
     path("pricing/", pricing_page_view, name="pricing"),
@@ -86,6 +87,8 @@ urlpatterns = [
     path("api/kindlewick/teacher/sessions/", kindlewick_teacher_sessions, name="api_kindlewick_teacher_sessions"),
     path("api/kindlewick/school-admin/progress/", kindlewick_school_admin_progress, name="api_kindlewick_school_admin_progress"),
     path("api/kindlewick/school-admin/sessions/", kindlewick_school_admin_sessions, name="api_kindlewick_school_admin_sessions"),
+    path("api/resources/<slug:slug>/uploads/", resource_upload_start, name="api_resource_upload_start"),
+    path("api/uploads/<uuid:upload_id>/", resource_upload_detail, name="api_resource_upload"),
     # School Admin URLs
     path("school-admin/", school_admin_dashboard_view, name="school_admin_dashboard"),
     path("school-admin/staff/", school_admin_staff_view, name="school_admin_staff"),
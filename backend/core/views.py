@@ -24,6 +24,7 @@ from .models import (
 import string
 import random
 import json
+from contextlib import nullcontext
 
 
 class CustomSignupForm(SignupForm):
@@ -180,10 +181,19 @@ from rest_framework import status
 from .serializers import (
     UserSerializer, AvatarSerializer, KindlewickGameProgressSerializer, 
     KindlewickGameSessionSerializer, KindlewickGameProgressAdminSerializer,
-    KindlewickGameSessionAdminSerializer
+    KindlewickGameSessionAdminSerializer, ResourceUploadSerializer
 )
-from .models import KindlewickGameProgress, KindlewickGameSession, User
+from .models import KindlewickGameProgress, KindlewickGameSession, ResourceUpload, TeachingResource, User
+from .replicas import use_replica
+from .cache import analytics_cache, cache_anonymous_page, roster_cache, stale_while_revalidate
+from .lookups import AnyOf
+from .service_worker import precache_manifest
+from .uploads import UploadError, abort_upload, append_chunk, finish_upload, start_upload
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, set_response_etag
+import hashlib
 
 
 @api_view(['GET'])
@@ -337,6 +347,100 @@ def kindlewick_session_detail(request, session_id):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def resource_upload_start(request, slug):
+    """Start a chunked upload of a resource's file; see core.uploads"""
+    resource = get_object_or_404(TeachingResource, slug=slug)
+    if resource.author_id != request.user.pk:
+        return Response({'error': 'Only the author can upload files'}, status=status.HTTP_403_FORBIDDEN)
+    try:
+        upload = start_upload(
+            resource, request.user, request.data.get('filename'), request.data.get('size'), request.data.get('sha256')
+        )
+    except UploadError as exc:
+        return Response({'error': exc.message}, status=exc.status_code)
+    serializer = ResourceUploadSerializer(upload)
+    return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+@api_view(['GET', 'PATCH', 'POST', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def resource_upload_detail(request, upload_id):
+    """
+    GET: progress (resume from `offset`). PATCH: append one chunk, sent as the
+    raw body with Upload-Offset and Chunk-SHA256 headers. POST: assemble the
+    file and attach it to the resource. DELETE: abandon the upload.
+    """
+    uploads = ResourceUpload.objects.select_related('resource').filter(user=request.user)
+    # A chunk is read from the client outside any transaction (append_chunk
+    # advances the offset with a conditional UPDATE); only assembling and
+    # abandoning the upload take a row lock
+    locking = request.method in ('POST', 'DELETE')
+    with transaction.atomic() if locking else nullcontext():
+        try:
+            if locking:
+                uploads = uploads.select_for_update()
+            upload = uploads.get(pk=upload_id)
+        except ResourceUpload.DoesNotExist:
+            return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            if request.method == 'PATCH':
+                append_chunk(
+                    upload, request.headers.get('Upload-Offset'), request.stream,
+                    request.headers.get('Content-Length'), request.headers.get('Chunk-SHA256'),
+                )
+            elif request.method == 'POST':
+                finish_upload(upload)
+            elif request.method == 'DELETE':
+                abort_upload(upload)
+                return Response(status=status.HTTP_204_NO_CONTENT)
+        except UploadError as exc:
+            return Response({'error': exc.message, 'offset': upload.offset}, status=exc.status_code)
+
+    serializer = ResourceUploadSerializer(upload)
+    return Response(serializer.data)
+
+
+def teacher_roster_ids(teacher, class_id=None, student_id=None):
+    """
+    Ids of the students in a teacher's classes, cached in the roster namespace.
+    Loaded from the primary even under @use_replica, so a lagging replica
+    cannot put a stale roster in the cache. Filter with AnyOf, which binds a
+    school-sized roster as one array parameter rather than one per id.
+    """
+    def load():
+        students = User.objects.using(DEFAULT_DB_ALIAS).filter(enrolled_classes__clazz__teacher=teacher)
+        if class_id:
+            students = students.filter(enrolled_classes__clazz_id=class_id)
+        if student_id:
+            students = students.filter(id=student_id)
+        return sorted(set(students.values_list('id', flat=True)))
+    return roster_cache.get_or_set(f'teacher:{teacher.pk}:{class_id}:{student_id}', load)
+
+
+def school_roster_ids(school, teacher_id=None, class_id=None, student_id=None):
+    """Ids of the students in a school's classes, cached like teacher_roster_ids."""
+    if not school:
+        return []
+
+    def load():
+        students = User.objects.using(DEFAULT_DB_ALIAS).filter(enrolled_classes__clazz__teacher__school=school)
+        if teacher_id:
+            students = students.filter(enrolled_classes__clazz__teacher_id=teacher_id)
+        if class_id:
+            students = students.filter(enrolled_classes__clazz_id=class_id)
+        if student_id:
+            students = students.filter(id=student_id)
+        return sorted(set(students.values_list('id', flat=True)))
+    # School is free text, so hash it into a key-safe token
+    school_key = hashlib.md5(school.encode(), usedforsecurity=False).hexdigest()
+    return roster_cache.get_or_set(f'school:{school_key}:{teacher_id}:{class_id}:{student_id}', load)
+
+
+@use_replica
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def kindlewick_teacher_progress(request):
@@ -348,17 +452,17 @@ def kindlewick_teacher_progress(request):
     student_id = request.query_params.get('student_id')
     limit = int(request.query_params.get('limit', 200))
 
-    students = User.objects.filter(enrolled_classes__clazz__teacher=request.user).distinct()
-    if class_id:
-        students = students.filter(enrolled_classes__clazz_id=class_id)
-    if student_id:
-        students = students.filter(id=student_id)
+    students = teacher_roster_ids(request.user, class_id, student_id)
 
-    progress = KindlewickGameProgress.objects.filter(user__in=students).select_related('user').order_by('-last_played')[:limit]
+    progress = (
+        KindlewickGameProgress.objects.filter(AnyOf(F('user_id'), students))
+        .select_related('user').order_by('-last_played')[:limit]
+    )
     serializer = KindlewickGameProgressAdminSerializer(progress, many=True)
     return Response(serializer.data)
 
 
+@use_replica
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def kindlewick_teacher_sessions(request):
@@ -370,17 +474,17 @@ def kindlewick_teacher_sessions(request):
     student_id = request.query_params.get('student_id')
     limit = int(request.query_params.get('limit', 200))
 
-    students = User.objects.filter(enrolled_classes__clazz__teacher=request.user).distinct()
-    if class_id:
-        students = students.filter(enrolled_classes__clazz_id=class_id)
-    if student_id:
-        students = students.filter(id=student_id)
+    students = teacher_roster_ids(request.user, class_id, student_id)
 
-    sessions = KindlewickGameSession.objects.filter(user__in=students).select_related('user').order_by('-created_at')[:limit]
+    sessions = (
+        KindlewickGameSession.objects.filter(AnyOf(F('user_id'), students))
+        .select_related('user').order_by('-created_at')[:limit]
+    )
     serializer = KindlewickGameSessionAdminSerializer(sessions, many=True)
     return Response(serializer.data)
 
 
+@use_replica
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def kindlewick_school_admin_progress(request):
@@ -396,19 +500,17 @@ def kindlewick_school_admin_progress(request):
     teacher_id = request.query_params.get('teacher_id')
     limit = int(request.query_params.get('limit', 300))
 
-    students = User.objects.filter(enrolled_classes__clazz__teacher__school=request.user.school).distinct()
-    if teacher_id:
-        students = students.filter(enrolled_classes__clazz__teacher_id=teacher_id)
-    if class_id:
-        students = students.filter(enrolled_classes__clazz_id=class_id)
-    if student_id:
-        students = students.filter(id=student_id)
+    students = school_roster_ids(request.user.school, teacher_id, class_id, student_id)
 
-    progress = KindlewickGameProgress.objects.filter(user__in=students).select_related('user').order_by('-last_played')[:limit]
+    progress = (
+        KindlewickGameProgress.objects.filter(AnyOf(F('user_id'), students))
+        .select_related('user').order_by('-last_played')[:limit]
+    )
     serializer = KindlewickGameProgressAdminSerializer(progress, many=True)
     return Response(serializer.data)
 
 
+@use_replica
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def kindlewick_school_admin_sessions(request):
@@ -424,15 +526,12 @@ def kindlewick_school_admin_sessions(request):
     teacher_id = request.query_params.get('teacher_id')
     limit = int(request.query_params.get('limit', 300))
 
-    students = User.objects.filter(enrolled_classes__clazz__teacher__school=request.user.school).distinct()
-    if teacher_id:
-        students = students.filter(enrolled_classes__clazz__teacher_id=teacher_id)
-    if class_id:
-        students = students.filter(enrolled_classes__clazz_id=class_id)
-    if student_id:
-        students = students.filter(id=student_id)
+    students = school_roster_ids(request.user.school, teacher_id, class_id, student_id)
 
-    sessions = KindlewickGameSession.objects.filter(user__in=students).select_related('user').order_by('-created_at')[:limit]
+    sessions = (
+        KindlewickGameSession.objects.filter(AnyOf(F('user_id'), students))
+        .select_related('user').order_by('-created_at')[:limit]
+    )
     serializer = KindlewickGameSessionAdminSerializer(sessions, many=True)
     return Response(serializer.data)
 
@@ -444,22 +543,42 @@ def custom_logout_view(request):
     logout(request)
     return redirect('home')
 
+@cache_anonymous_page
 def home_page_view(request):
     return render(request, "core/home.html")
 
+@cache_anonymous_page
 def about_page_view(request):
     return render(request, "core/about.html")
 
+@cache_anonymous_page
 def kindlewick_page_view(request):
     return render(request, "core/kindlewick.html")
+
+def kindlewick_service_worker(request):
+    """Service worker that serves the Kindlewick bundle and images cache-first"""
+    response = render(request, "core/kindlewick_sw.js", {
+        'manifest_json': json.dumps(precache_manifest()),
+        'page_url': reverse('kindlewick'),
+    }, content_type='application/javascript')
+    # Browsers revalidate the worker on each visit; an ETag of the rendered
+    # script, so template and manifest changes both count, makes that a 304
+    response['Cache-Control'] = 'no-cache'
+    set_response_etag(response)
+    return get_conditional_response(request, etag=response['ETag'], response=response)
+@cache_anonymous_page
 def questopia_page_view(request):
     return render(request, "core/questopia.html")
+@cache_anonymous_page
 def pricing_page_view(request):
     return render(request, "core/pricing.html")
+@cache_anonymous_page
 def teacher_hub_view(request):
     return render(request, "core/teacher_hub.html")
+@cache_anonymous_page
 def contact_page_view(request):
     return render(request, "core/contact.html")
+@cache_anonymous_page
 def wonderworld_page_view(request):
     return render(request, "core/wonderworld.html")
 def hello(request):
@@ -527,10 +646,22 @@ def save_user_avatar(request):
     return render(request, "core/save_user_avatar.html")
 def randomize_avatar(request):
     return render(request, "core/randomize_avatar.html")
+# Analytics pages may be a few minutes stale; see ANALYTICS_CACHE_SOFT_TTL
+analytics_page = stale_while_revalidate(
+    analytics_cache,
+    soft_ttl=settings.ANALYTICS_CACHE_SOFT_TTL,
+    hard_ttl=settings.ANALYTICS_CACHE_HARD_TTL,
+)
+@analytics_page
+@use_replica
 def teacher_analytics_view(request):
     return render(request, "core/teacher_analytics.html")
+@analytics_page
+@use_replica
 def class_analytics_view(request):
     return render(request, "core/class_analytics.html")
+@analytics_page
+@use_replica
 def student_analytics_view(request):
     return render(request, "core/student_analytics.html")
 def school_admin_dashboard_view(request):
@@ -539,6 +670,8 @@ def school_admin_staff_view(request):
     return render(request, "core/school_admin_staff.html")
 def school_admin_classes_view(request):
     return render(request, "core/school_admin_classes.html")
+@analytics_page
+@use_replica
 def school_admin_analytics_view(request):
     return render(request, "core/school_admin_analytics.html")
 def school_admin_activity_log_view(request):
@@ -0,0 +1,352 @@
+#!/usr/bin/env python
+"""
+Classroom burst load simulator.
+
+Models the 9am rush: every class in a school is told to log in at roughly the
+same moment, and each student logs in, loads /kindlewick/, fetches
+/api/user/current/ and their progress, starts a game session, sends periodic
+score updates and finally completes the session.
+
+Accounts come from `manage.py seed_scale`, which names students
+seed<seed>_s<school>_c<class>_p<pupil>, e.g.
+
+    python backend/manage.py seed_scale --schools 1 --students-per-class 30
+    python backend/manage.py runserver
+    python scripts/classroom_burst.py --classes 20 --students-per-class 30
+
+Only the standard library is needed. Pass --database-url (or set
+DATABASE_URL) for a PostgreSQL database to also sample connection usage from
+pg_stat_activity; that part needs psycopg.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+
+class Response:
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body or b'null')
+
+
+class Session:
+    """Minimal HTTP/1.1 client with a cookie jar, one connection per request"""
+
+    def __init__(self, base_url, timeout):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.ssl = parts.scheme == 'https'
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.cookies = {}
+
+    async def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        headers.setdefault('Host', f'{self.host}:{self.port}')
+        headers.setdefault('Connection', 'close')
+        headers.setdefault('User-Agent', 'classroom-burst/1.0')
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{name}={value}' for name, value in self.cookies.items())
+        if body is not None:
+            headers['Content-Length'] = str(len(body))
+        head = f'{method} {path} HTTP/1.1\r\n' + ''.join(f'{k}: {v}\r\n' for k, v in headers.items()) + '\r\n'
+
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port, ssl=self.ssl or None), self.timeout)
+        try:
+            writer.write(head.encode('latin-1') + (body or b''))
+            await writer.drain()
+            raw = await asyncio.wait_for(reader.read(), self.timeout)
+        finally:
+            writer.close()
+        return self._parse(raw)
+
+    def _parse(self, raw):
+        head, _, body = raw.partition(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        status = int(lines[0].split()[1])
+        headers = defaultdict(list)
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()].append(value.strip())
+        for value in headers.get('set-cookie', []):
+            cookie = SimpleCookie()
+            cookie.load(value)
+            for name, morsel in cookie.items():
+                self.cookies[name] = morsel.value
+        if 'chunked' in ','.join(headers.get('transfer-encoding', [])).lower():
+            body = self._dechunk(body)
+        return Response(status, headers, body)
+
+    @staticmethod
+    def _dechunk(data):
+        body = b''
+        while data:
+            size_line, _, data = data.partition(b'\r\n')
+            size = int(size_line.split(b';')[0], 16)
+            if size == 0:
+                break
+            body, data = body + data[:size], data[size + 2:]
+        return body
+
+    def csrf_headers(self):
+        return {'X-CSRFToken': self.cookies.get('csrftoken', ''), 'Referer': self.base_url + '/'}
+
+
+class Stats:
+    """Latencies and errors per step, plus per-second throughput and in-flight requests"""
+
+    def __init__(self, max_open):
+        # Caps open connections; only held while a request is on the wire
+        self.limit = asyncio.Semaphore(max_open)
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.error_samples = defaultdict(set)
+        self.per_second = defaultdict(int)
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.db_samples = []
+        self.max_connections = None
+        self.started = time.monotonic()
+
+    async def timed(self, step, coroutine, expect=(200,)):
+        async with self.limit:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            start = time.monotonic()
+            try:
+                response = await coroutine
+            except (OSError, asyncio.TimeoutError, ValueError, IndexError) as exc:
+                self.errors[step] += 1
+                self.error_samples[step].add(type(exc).__name__)
+                return None
+            finally:
+                self.in_flight -= 1
+                elapsed = time.monotonic() - start
+                self.latencies[step].append(elapsed * 1000)
+                self.per_second[int(time.monotonic() - self.started)] += 1
+        if response.status not in expect:
+            self.errors[step] += 1
+            self.error_samples[step].add(str(response.status))
+            return None
+        return response
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(math.ceil(p / 100 * len(ordered)), 1) - 1]
+
+
+async def student_journey(args, username, delay, rng, stats):
+    await asyncio.sleep(delay)
+    session = Session(args.base_url, args.timeout)
+
+    # Login through the allauth form: fetch the CSRF cookie, then post credentials
+    if not await stats.timed('login_page', session.request('GET', '/teacher/login/')):
+        return
+    form = urlencode({
+        'login': username,
+        'password': args.password,
+        'csrfmiddlewaretoken': session.cookies.get('csrftoken', ''),
+    }).encode()
+    login = await stats.timed('login', session.request('POST', '/teacher/login/', form, {
+        'Content-Type': 'application/x-www-form-urlencoded', 'Referer': args.base_url + '/teacher/login/',
+    }), expect=(302,))
+    if not login or 'sessionid' not in session.cookies:
+        return
+
+    # Bootstrap: the game page and the calls its JavaScript makes on load
+    await stats.timed('kindlewick_page', session.request('GET', '/kindlewick/'))
+    await stats.timed('current_user', session.request('GET', '/api/user/current/'))
+    await stats.timed('progress', session.request('GET', '/api/kindlewick/progress/'))
+
+    json_headers = {'Content-Type': 'application/json', **session.csrf_headers()}
+    for _ in range(args.games):
+        await asyncio.sleep(rng.uniform(1, 5))
+        created = await stats.timed('session_create', session.request(
+            'POST', '/api/kindlewick/sessions/',
+            json.dumps({'game_type': rng.choice(args.game_types), 'level': rng.randint(1, 5)}).encode(),
+            json_headers,
+        ), expect=(201,))
+        if not created:
+            return
+        session_id = created.json()['id']
+        score = 0
+        for _ in range(args.updates):
+            await asyncio.sleep(rng.uniform(0.5, 1.5) * args.update_interval)
+            score += rng.randint(5, 25)
+            await stats.timed('session_update', session.request(
+                'PUT', f'/api/kindlewick/sessions/{session_id}/',
+                json.dumps({'score': score, 'playtime': int(time.monotonic() - stats.started)}).encode(),
+                json_headers,
+            ))
+        await stats.timed('session_complete', session.request(
+            'PUT', f'/api/kindlewick/sessions/{session_id}/',
+            json.dumps({'score': score, 'completed': True, 'tokens_earned': score // 20}).encode(),
+            json_headers,
+        ))
+
+
+def arrival_delays(args, rng):
+    """
+    Each class is told to log in at a random point in the first half of the
+    ramp; its students then trickle in over the following seconds, most of
+    them quickly (exponential delays).
+    """
+    plan = []
+    for c in range(args.classes):
+        class_start = rng.uniform(0, args.ramp / 2)
+        for p in range(args.students_per_class):
+            username = args.username_pattern.format(seed=args.seed, school=args.school, clazz=c, pupil=p)
+            delay = min(class_start + rng.expovariate(1 / args.class_spread), args.ramp)
+            plan.append((username, delay))
+    return plan
+
+
+async def sample_database(args, stats, stop):
+    try:
+        import psycopg
+    except ImportError:
+        print('psycopg is not installed; skipping database connection sampling', file=sys.stderr)
+        return
+    connection = await asyncio.to_thread(psycopg.connect, args.database_url, autocommit=True)
+
+    def sample():
+        with connection.cursor() as cursor:
+            if stats.max_connections is None:
+                cursor.execute('SHOW max_connections')
+                stats.max_connections = int(cursor.fetchone()[0])
+            cursor.execute(
+                "SELECT count(*), count(*) FILTER (WHERE state = 'active'), "
+                "count(*) FILTER (WHERE wait_event_type = 'Lock') "
+                "FROM pg_stat_activity WHERE datname = current_database()"
+            )
+            return cursor.fetchone()
+
+    try:
+        while not stop.is_set():
+            total, active, waiting = await asyncio.to_thread(sample)
+            stats.db_samples.append({'t': round(time.monotonic() - stats.started, 1), 'total': total, 'active': active, 'lock_waits': waiting})
+            try:
+                await asyncio.wait_for(stop.wait(), args.db_sample_interval)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        connection.close()
+
+
+def report(args, stats, duration):
+    summary = {'duration_s': round(duration, 1), 'students': args.classes * args.students_per_class, 'steps': {}}
+    print(f"\n{'step':<18} {'count':>7} {'errors':>7} {'err %':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    print('-' * 78)
+    for step, values in stats.latencies.items():
+        errors = stats.errors[step]
+        row = {
+            'count': len(values),
+            'errors': errors,
+            'error_rate': round(errors / len(values), 4) if values else 0,
+            'error_types': sorted(stats.error_samples[step]),
+            'p50_ms': round(percentile(values, 50), 1),
+            'p95_ms': round(percentile(values, 95), 1),
+            'p99_ms': round(percentile(values, 99), 1),
+            'max_ms': round(max(values), 1) if values else 0,
+        }
+        summary['steps'][step] = row
+        print(
+            f"{step:<18} {row['count']:>7} {errors:>7} {row['error_rate'] * 100:>5.1f}% "
+            f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['max_ms']:>8.1f}"
+        )
+        if row['error_types']:
+            print(f"{'':<18} errors: {', '.join(row['error_types'])}")
+
+    total = sum(len(values) for values in stats.latencies.values())
+    summary['requests'] = total
+    summary['peak_requests_per_s'] = max(stats.per_second.values(), default=0)
+    summary['peak_in_flight'] = stats.peak_in_flight
+    print(f'\n{total} requests in {duration:.1f}s, peak {summary["peak_requests_per_s"]} req/s, '
+          f'peak {stats.peak_in_flight} in flight')
+
+    if stats.db_samples:
+        peak = max(stats.db_samples, key=lambda sample: sample['total'])
+        summary['database'] = {
+            'max_connections': stats.max_connections,
+            'peak_connections': peak['total'],
+            'peak_active': max(sample['active'] for sample in stats.db_samples),
+            'peak_lock_waits': max(sample['lock_waits'] for sample in stats.db_samples),
+            'saturation': round(peak['total'] / stats.max_connections, 3) if stats.max_connections else None,
+            'samples': stats.db_samples,
+        }
+        print(f"Database connections: peak {peak['total']}/{stats.max_connections} "
+              f"({summary['database']['saturation'] * 100:.0f}% of max_connections), "
+              f"peak active {summary['database']['peak_active']}, peak lock waits {summary['database']['peak_lock_waits']}")
+    return summary
+
+
+async def main(args):
+    rng = random.Random(args.random_seed)
+    plan = arrival_delays(args, rng)
+    stats = Stats(args.max_open)
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_database(args, stats, stop)) if args.database_url.startswith('postgres') else None
+
+    print(f'Simulating {len(plan)} students over a {args.ramp:.0f}s ramp against {args.base_url}')
+    start = time.monotonic()
+    await asyncio.gather(*(
+        student_journey(args, username, delay, random.Random(f'{args.random_seed}:{username}'), stats)
+        for username, delay in plan
+    ))
+    duration = time.monotonic() - start
+    stop.set()
+    if sampler:
+        await sampler
+
+    summary = report(args, stats, duration)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump(summary, handle, indent=2)
+        print(f'Results written to {args.output}')
+    error_rate = sum(stats.errors.values()) / max(summary['requests'], 1)
+    return 1 if error_rate > args.max_error_rate else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--classes', type=int, default=10)
+    parser.add_argument('--students-per-class', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=1, help='seed_scale --seed the accounts were created with')
+    parser.add_argument('--school', type=int, default=0, help='seed_scale school index to use')
+    parser.add_argument('--username-pattern', default='seed{seed}_s{school}_c{clazz}_p{pupil}')
+    parser.add_argument('--password', default='password123')
+    parser.add_argument('--ramp', type=float, default=60, help='Seconds over which classes log in (default: 60)')
+    parser.add_argument('--class-spread', type=float, default=8, help='Mean seconds for a student to follow their class')
+    parser.add_argument('--games', type=int, default=1, help='Sessions each student plays')
+    parser.add_argument('--updates', type=int, default=3, help='Score updates per session')
+    parser.add_argument('--update-interval', type=float, default=10, help='Mean seconds between updates')
+    parser.add_argument('--game-types', nargs='+', default=['map', 'wizards_castle', 'prefixes_potions', 'grid_coordinator'])
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--max-open', type=int, default=2000, help='Cap on simultaneously open requests')
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL', ''))
+    parser.add_argument('--db-sample-interval', type=float, default=1.0)
+    parser.add_argument('--random-seed', type=int, default=9)
+    parser.add_argument('--output', help='Write the summary as JSON')
+    parser.add_argument('--max-error-rate', type=float, default=0.01, help='Exit non-zero above this error rate')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main(parse_args())))
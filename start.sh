@@ -6,4 +6,4 @@ ls -la /app/backend 2>/dev/null || echo "backend directory not found"
 echo "=== DEBUG: PYTHONPATH is: $PYTHONPATH ==="
 export PYTHONPATH=/app/backend:$PYTHONPATH
 python manage.py migrate
-exec gunicorn --bind 0.0.0.0:$PORT backend.wsgi:application
+exec gunicorn --bind 0.0.0.0:$PORT --workers ${WEB_CONCURRENCY:-2} --threads ${GUNICORN_THREADS:-1} backend.wsgi:application